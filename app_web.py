@@ -1,114 +1,355 @@
-from flask import Flask, render_template, request, redirect, url_for, jsonify
-import requests
+from flask import Flask, render_template, request, redirect, url_for, jsonify, Response, stream_with_context
 import concurrent.futures
+from datetime import date
+import heapq
+import json
+import logging
+import os
+from operator import itemgetter
+import configuration
+import creation_reservation
+import partitions
+import passerelle_http
+import traces
+from sante_services import surveillant
+from relais_evenements import relais
+from bus_evenements import reponse_sse
+from tarification import moteur
+import vue_reservations
  
 
 app = Flask(__name__)
+traces.instrumenter(app, 'app_web')
+journal = traces.journal(__name__)
 
-# URLs des services
-SERVICES = {
-    'chambres': 'http://localhost:5001',
-    'clients': 'http://localhost:5002', 
-    'reservations': 'http://localhost:5003'
-}
-
-def check_service_available(service_name, endpoint=""):
-    """Vérifie si un service est disponible"""
-    health_endpoints = {
-        'chambres': 'chambres',
-        'clients': 'clients', 
-        'reservations': 'health'
-    }
-    
-    endpoint = health_endpoints.get(service_name, endpoint)
-    url = f"{SERVICES[service_name]}/{endpoint}" if endpoint else SERVICES[service_name]
-    
-    print(f" TEST {service_name}: {url}")
-    
-    try:
-        response = requests.get(url, timeout=2)
-        
-        # Test plus permissif
-        if response.status_code == 200:
-            return True
-        else:
-            return False
-            
-    except requests.exceptions.ConnectTimeout:
-        return False
-    except requests.exceptions.ConnectionError:
-        return False
-    except Exception as e:
-        return False
-
-def get_service_data(service_name, endpoint=""):
-    """Récupère les données d'un service"""
-    default_endpoints = {
-        'chambres': 'chambres',
-        'clients': 'clients', 
-        'reservations': 'reservations'
-    }
-    
+# 'threads' (ThreadPoolExecutor par requête) ou 'async' (boucle asyncio partagée)
+MODE_PASSERELLE = os.environ.get('PASSERELLE_MODE', 'threads')
+
+def get_service_data(service_name, endpoint="", agence=None, fusion=None, **options_fusion):
+    """Récupère les données d'un service: sur le nœud de l'agence si elle est donnée, sur tous
+    les nœuds avec fusion=<clé de tri> (listes inter-agences, voir passerelle_http.get_fusionne)"""
     if not endpoint:
-        endpoint = default_endpoints.get(service_name, "")
-    
-    url = f"{SERVICES[service_name]}/{endpoint}" if endpoint else SERVICES[service_name]
+        endpoint = passerelle_http.ENDPOINTS_DEFAUT.get(service_name, "")
     
     try:
-        print(f"Récupération données {service_name} depuis {url}")
-        response = requests.get(url, timeout=5)  # Timeout plus long
-        if response.status_code == 200:
-            print(f"Données {service_name} récupérées avec succès")
-            return response.json()
+        if fusion:
+            status, donnees = passerelle_http.get_fusionne(service_name, endpoint, fusion, **options_fusion)
+        else:
+            status, donnees = passerelle_http.get_conditionnel(service_name, endpoint, agence=agence)
+        if status == 200:
+            return donnees
         else:
-            print(f"Erreur {service_name}: Status {response.status_code}")
+            traces.evenement(journal, logging.WARNING, "reponse en erreur",
+                             service=service_name, endpoint=endpoint, statut=status)
             return None
     except Exception as e:
-        print(f"Erreur récupération {service_name}: {e}")
+        traces.evenement(journal, logging.ERROR, "service injoignable",
+                         service=service_name, endpoint=endpoint, erreur=str(e))
         return None
 
-def mettre_a_jour_disponibilite_chambre(chambre_id, disponible):
-    """Met à jour la disponibilité d'une chambre dans MySQL"""
-    try:
-        response = requests.put(
-            f'http://localhost:5001/chambre/{chambre_id}/disponible',
-            json={"disponible": disponible}
+def recuperer_donnees_accueil(after=None, chambres_apres=None, agence=None):
+    """Récupère chambres (une page, éventuellement d'une seule agence), clients, réservations
+    actives et agences en parallèle"""
+    if MODE_PASSERELLE == 'async':
+        from passerelle_async import passerelle
+        donnees = passerelle.donnees_accueil(after=after, chambres_apres=chambres_apres, agence=agence)
+        return donnees['chambres'], donnees['clients'], donnees['reservations'], donnees['agences']
+
+    endpoint_chambres = passerelle_http.endpoint_chambres(chambres_apres, agence)
+    with concurrent.futures.ThreadPoolExecutor() as executor:
+        if agence is not None:
+            future_chambres = traces.soumettre(executor, get_service_data, 'chambres', endpoint_chambres, agence=agence)
+        else:
+            future_chambres = traces.soumettre(executor, get_service_data, 'chambres', endpoint_chambres,
+                                               fusion='id_chambre', limite=passerelle_http.TAILLE_PAGE)
+        future_clients = traces.soumettre(executor, get_service_data, 'clients')
+        future_reservations = traces.soumettre(executor, get_reservations_actives, after)
+        future_agences = traces.soumettre(executor, get_agences)
+        
+        return (
+            future_chambres.result(timeout=8),
+            future_clients.result(timeout=8),
+            future_reservations.result(timeout=8),
+            future_agences.result(timeout=8),
         )
-        return response.status_code == 200
+
+def get_agences():
+    """Agences: données de référence servies depuis le cache TTL de la passerelle"""
+    agences = passerelle_http.CACHE_AGENCES.get('agences')
+    if agences is None:
+        agences = get_service_data('chambres', 'agences')
+        if agences is not None:
+            passerelle_http.CACHE_AGENCES.set('agences', agences)
+    return agences
+
+def infos_chambre(chambre_id):
+    """Attributs statiques (prix, agence, type) depuis le catalogue en cache, sinon via /chambre/<id>"""
+    statique = passerelle_http.CACHE_CATALOGUE.get(chambre_id)
+    if statique is None:
+        chambre_resp = passerelle_http.requete_premier_noeud('GET', 'chambres', f"chambre/{chambre_id}")
+        if chambre_resp.status_code != 200:
+            return None
+        passerelle_http.memoriser_catalogue([chambre_resp.json()])
+        statique = passerelle_http.CACHE_CATALOGUE.get(chambre_id) or chambre_resp.json()
+    return statique
+
+def prix_chambre(chambre_id):
+    """Prix par nuit depuis le catalogue en cache, sinon via /chambre/<id>"""
+    statique = infos_chambre(chambre_id)
+    return statique.get('prix', 100) if statique is not None else None
+
+def get_reservations_actives(after=None, limit=vue_reservations.TAILLE_PAGE):
+    """Page de réservations actives enrichie par recherches groupées clients/chambres"""
+    endpoint = f"reservations/actives?limit={limit}"
+    if after:
+        endpoint += f"&after={after}"
+    page = get_service_data('reservations', endpoint, fusion='_id', inverse=True, limite=limit, champ='reservations')
+    if page is None:
+        return None
+
+    reservations = page.get('reservations', [])
+    clients_ids, chambres_ids = vue_reservations.ids_references(reservations)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+        future_clients = traces.soumettre(
+            executor, get_service_data, 'clients', vue_reservations.endpoint_jointure('clients', clients_ids)
+        ) if clients_ids else None
+        future_chambres = traces.soumettre(
+            executor, get_service_data, 'chambres', vue_reservations.endpoint_jointure('chambres', chambres_ids),
+            fusion='id_chambre'
+        ) if chambres_ids else None
+        clients = future_clients.result(timeout=8) if future_clients else []
+        chambres = future_chambres.result(timeout=8) if future_chambres else []
+
+    return {
+        "reservations": vue_reservations.enrichir(reservations, clients, chambres),
+        "next": page.get('next')
+    }
+
+@app.route('/api/reservations/actives', methods=['GET'])
+def api_reservations_actives():
+    """Vue JSON des réservations actives (?after=<id>&limit=N)"""
+    limit = min(max(request.args.get('limit', vue_reservations.TAILLE_PAGE, type=int), 1), 200)
+    vue = get_reservations_actives(request.args.get('after'), limit)
+    if vue is None:
+        return jsonify({"error": "Service réservations indisponible"}), 503
+    return jsonify(vue)
+
+FILTRES_EXPORT = ('statut', 'date_debut', 'date_fin', 'client_id', 'chambre_id')
+
+@app.route('/export/reservations', methods=['GET'])
+def export_reservations():
+    """Relaie l'export NDJSON du service réservations sans le mettre en mémoire.
+
+    Les flux de tous les nœuds sont ouverts avant de répondre: un nœud injoignable ou en erreur
+    donne un 502, pas un export tronqué. Une coupure en cours de flux se termine par une ligne
+    {"error": ...} que le client peut détecter."""
+    params = {cle: request.args[cle] for cle in FILTRES_EXPORT if request.args.get(cle)}
+
+    reponses = []
+    try:
+        for noeud in passerelle_http.noeuds('reservations'):
+            reponses.append(passerelle_http.ouvrir_ndjson('reservations', 'reservations/export', params, noeud=noeud))
+    except Exception as e:
+        for response in reponses:
+            response.close()
+        traces.evenement(journal, logging.ERROR, "export indisponible", erreur=str(e))
+        return jsonify({"error": f"Export indisponible: {e}"}), 502
+
+    def lignes():
+        # Un flux par nœud, fusionnés sur _id (ObjectId en hexadécimal: ordre chronologique)
+        flux = [passerelle_http.lignes_ndjson(response) for response in reponses]
+        try:
+            for reservation in flux[0] if len(flux) == 1 else heapq.merge(*flux, key=itemgetter('_id')):
+                yield json.dumps(reservation, ensure_ascii=False) + "\n"
+        except Exception as e:
+            traces.evenement(journal, logging.ERROR, "export interrompu", erreur=str(e))
+            yield json.dumps({"error": f"Export interrompu: {e}"}, ensure_ascii=False) + "\n"
+        finally:
+            for response in reponses:
+                response.close()
+
+    return Response(stream_with_context(lignes()), mimetype='application/x-ndjson')
+
+@app.route('/api/clients/recherche', methods=['GET'])
+def api_recherche_clients():
+    """Autocomplétion des clients (?q=&limit=), relayée au service clients"""
+    params = {cle: request.args[cle] for cle in ('q', 'limit') if request.args.get(cle)}
+    try:
+        response = passerelle_http.get('clients', 'clients/recherche', params=params)
+    except Exception:
+        return jsonify({"error": "Service clients indisponible"}), 503
+    return Response(response.content, status=response.status_code, mimetype='application/json')
+
+def chambres_agence(agence, champs="id_chambre,type_chambre,etage,prix", taille_page=1000):
+    """Toutes les chambres d'une agence, page par page (X-Next-After) sur le nœud de l'agence"""
+    chambres = []
+    after = None
+    while True:
+        params = {"limit": taille_page, "fields": champs}
+        if after is not None:
+            params["after"] = after
+        response = passerelle_http.get_compact('chambres', f"agences/{agence}/chambres", params=params, agence=agence)
+        response.raise_for_status()
+        chambres.extend(passerelle_http.decoder(response))
+        after = response.headers.get('X-Next-After')
+        if not after:
+            return chambres
+
+@app.route('/api/disponibilites', methods=['GET'])
+def api_disponibilites():
+    """Chambres d'une agence libres entre date_debut et date_fin"""
+    agence = request.args.get('agence', type=int)
+    date_debut = request.args.get('date_debut')
+    date_fin = request.args.get('date_fin')
+    if agence is None or not date_debut or not date_fin:
+        return jsonify({"error": "agence, date_debut et date_fin requis"}), 400
+
+    try:
+        chambres = chambres_agence(agence)
     except Exception as e:
-        return False
+        traces.evenement(journal, logging.ERROR, "service injoignable", service='chambres', agence=agence, erreur=str(e))
+        return jsonify({"error": "Service chambres indisponible"}), 503
+    if not chambres:
+        return jsonify([])
+
+    # Toutes les chambres de l'agence: la liste part dans le corps (une URL serait tronquée ou refusée)
+    try:
+        response = passerelle_http.post('reservations', 'disponibilites', agence=agence,
+                                        json={"chambres": [ch['id_chambre'] for ch in chambres],
+                                              "date_debut": date_debut, "date_fin": date_fin})
+    except Exception:
+        return jsonify({"error": "Service réservations indisponible"}), 503
+    if response.status_code != 200:
+        return jsonify(corps_reponse(response)), 503 if response.status_code >= 500 else response.status_code
+    libres = set(response.json().get('libres', []))
+    return jsonify([ch for ch in chambres if ch['id_chambre'] in libres])
+
+@app.route('/sante', methods=['GET'])
+def sante():
+    """Table d'état des services tenue par le surveillant (aucune sonde déclenchée)"""
+    return jsonify({
+        "services": surveillant.etat(),
+        "disjoncteurs": passerelle_http.stats_disjoncteurs(),
+    })
+
+@app.route('/evenements', methods=['GET'])
+def evenements():
+    """Flux SSE pour les navigateurs: deltas de réservations et de disponibilité"""
+    reponse = reponse_sse(relais.flux_sse(request.headers.get('Last-Event-ID')))
+    # Le tableau de bord (autre port) s'abonne aussi à ce flux
+    reponse.headers['Access-Control-Allow-Origin'] = '*'
+    return reponse
+
+@app.route('/evenements/stats', methods=['GET'])
+def evenements_stats():
+    return jsonify(relais.stats())
+
+CHAMPS_STATS = ("nuits", "revenu", "arrivees")
+
+def corps_reponse(response):
+    """Corps JSON d'une réponse de service, ou son texte (page d'erreur HTML, 502...)"""
+    try:
+        return response.json()
+    except Exception:
+        return {"error": response.text}
+
+def fusionner_stats(resultats):
+    """Additionne par axes les lignes /stats de plusieurs nœuds (une fois par source d'agrégats)"""
+    uniques = list({resultat.get('source') or id(resultat): resultat for resultat in resultats}.values())
+    par = uniques[0]['par']
+    lignes = {}
+    for resultat in uniques:
+        for ligne in resultat['lignes']:
+            cle = tuple(ligne.get(axe) for axe in par)
+            if cle not in lignes:
+                lignes[cle] = dict(ligne)
+                continue
+            for champ in CHAMPS_STATS:
+                lignes[cle][champ] = lignes[cle].get(champ, 0) + ligne.get(champ, 0)
+    for ligne in lignes.values():
+        ligne['revenu'] = round(ligne.get('revenu', 0), 2)
+    fusion = {cle: valeur for cle, valeur in uniques[0].items() if cle != 'source'}
+    fusion['lignes'] = sorted(lignes.values(), key=lambda ligne: tuple(str(ligne.get(axe)) for axe in par))
+    return fusion
+
+def stats_reservations(params, agence=None):
+    """/stats du nœud de l'agence, sinon de tous les nœuds réservations fusionnés. Renvoie (status, corps);
+    un nœud en échec est ignoré (compté dans noeuds_en_erreur), comme dans passerelle_http.get_fusionne"""
+    liste_noeuds = passerelle_http.noeuds('reservations')
+    if agence is not None or len(liste_noeuds) == 1:
+        response = passerelle_http.get('reservations', 'stats', params=params, agence=agence)
+        return response.status_code, corps_reponse(response)
+
+    def lire(noeud):
+        try:
+            response = passerelle_http.get('reservations', 'stats', params=params, noeud=noeud)
+            return response.status_code, corps_reponse(response)
+        except Exception as e:
+            traces.evenement(journal, logging.WARNING, "noeud injoignable", service='reservations',
+                             noeud=noeud, endpoint='stats', erreur=str(e))
+            return 503, {"error": "Service réservations indisponible"}
+
+    reponses = list(partitions.en_parallele(lire, liste_noeuds).values())
+    resultats = [corps for status, corps in reponses if status == 200]
+    if not resultats:
+        return reponses[0]
+    return 200, dict(fusionner_stats(resultats), noeuds_en_erreur=len(reponses) - len(resultats))
+
+@app.route('/api/stats', methods=['GET'])
+def api_stats():
+    """Occupation et revenu sur [debut, fin[ (?par=jour,agence,type_chambre), depuis les agrégats.
+
+    Sans ?agence, les agrégats de tous les nœuds réservations sont additionnés. Le taux
+    d'occupation rapporte les nuits occupées à la capacité (chambres x jours) de chaque
+    agence / type, lue sur tous les nœuds chambres.
+    """
+    params = {cle: request.args[cle] for cle in ('debut', 'fin', 'par', 'agence', 'type_chambre') if request.args.get(cle)}
+    try:
+        status, resultat = stats_reservations(params, request.args.get('agence', type=int))
+    except Exception:
+        return jsonify({"error": "Service réservations indisponible"}), 503
+    if status != 200:
+        return jsonify(resultat), status
+
+    capacite = get_service_data('chambres', 'chambres/capacite', fusion='id_agence')
+    if capacite is not None:
+        par = resultat['par']
+        jours = (date.fromisoformat(resultat['fin']) - date.fromisoformat(resultat['debut'])).days
+        for ligne in resultat['lignes']:
+            chambres = sum(
+                c['chambres'] for c in capacite
+                if ('agence' not in par or c['id_agence'] == ligne['agence'])
+                and ('type_chambre' not in par or c['type_chambre'] == ligne['type_chambre'])
+                and (request.args.get('agence') is None or str(c['id_agence']) == request.args['agence'])
+                and (not request.args.get('type_chambre') or c['type_chambre'] == request.args['type_chambre'])
+            )
+            nuits_possibles = chambres * (1 if 'jour' in par else jours)
+            ligne['chambres'] = chambres
+            ligne['taux_occupation'] = round(ligne['nuits'] / nuits_possibles, 4) if nuits_possibles else None
+    return jsonify(resultat)
+
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    """Compteurs hit/miss des caches de la passerelle"""
+    return jsonify(passerelle_http.stats_caches())
 
 @app.route('/')
 def accueil():
     """Page d'accueil avec vérification parallèle des services"""
     try:
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            future_chambres = executor.submit(get_service_data, 'chambres')
-            future_clients = executor.submit(get_service_data, 'clients')
-            future_reservations = executor.submit(get_service_data, 'reservations')
-            future_agences = executor.submit(get_service_data, 'chambres', 'agences')
-            
-            chambres_data = future_chambres.result(timeout=8)
-            clients_data = future_clients.result(timeout=8)
-            reservations_data = future_reservations.result(timeout=8)
-            agences_data_result = future_agences.result(timeout=8)
-
-        reservations_en_cours = []
-        if reservations_data:
-            clients_map = {}
-            chambres_map = {}
-            if clients_data:
-                for c in clients_data:
-                    clients_map[c.get('id_client')] = c
-            if chambres_data:
-                for ch in chambres_data:
-                    chambres_map[ch.get('id_chambre')] = ch
-            for reservation in reservations_data:
-                statut = reservation.get('statut')
-                if statut != 'annulée':
-                    reservation['client_info'] = clients_map.get(reservation.get('client_id'))
-                    reservation['chambre_info'] = chambres_map.get(reservation.get('chambre_id'))
-                    reservations_en_cours.append(reservation)
+        agence = request.args.get('agence', type=int)
+        chambres_data, clients_data, reservations_data, agences_data_result = recuperer_donnees_accueil(
+            request.args.get('after'), request.args.get('chambres_apres', type=int), agence
+        )
+
+        passerelle_http.memoriser_catalogue(chambres_data)
+
+        # Le filtrage des annulées et la jointure sont faits par la vue des réservations actives
+        reservations_en_cours = reservations_data['reservations'] if reservations_data else []
+        reservations_suivantes = reservations_data['next'] if reservations_data else None
+        # Page de chambres pleine: curseur de la suivante (liste par id_chambre, keyset)
+        chambres_suivantes = (chambres_data[-1]['id_chambre']
+                              if chambres_data and len(chambres_data) == passerelle_http.TAILLE_PAGE else None)
         
         # Créer un mapping agence_id → nom agence
         agences_map = {}
@@ -123,13 +364,19 @@ def accueil():
             'agences': agences_data_result is not None
         }
         
-        return render_template('accueil.html',
-            chambres=chambres_data if chambres_data is not None else [],
-            clients=clients_data if clients_data is not None else [],
-            reservations=reservations_en_cours,
-            agences_map=agences_map,
-            services_status=services_status
-        )
+        with traces.span('template', nom='accueil.html'):
+            page = render_template('accueil.html',
+                chambres=chambres_data if chambres_data is not None else [],
+                clients=clients_data if clients_data is not None else [],
+                reservations=reservations_en_cours,
+                reservations_suivantes=reservations_suivantes,
+                chambres_suivantes=chambres_suivantes,
+                agence_choisie=agence,
+                agences_map=agences_map,
+                services_status=services_status,
+                cle_idempotence=creation_reservation.nouvelle_cle()
+            )
+        return page
         
     except concurrent.futures.TimeoutError:
         return render_template('accueil.html',
@@ -145,96 +392,224 @@ def reserver():
         client_id = request.form['client_id']
         chambre_id = request.form['chambre_id'] 
         nuits = request.form['nuits']
+        date_arrivee = request.form.get('date_arrivee') or None
         
-        print(f"DEBUG: Données reçues - client:{client_id}, chambre:{chambre_id}, nuits:{nuits}")
-        
-        # Vérifier si le service réservations est disponible
-        if not check_service_available('reservations', 'health'):
-            return redirect(url_for('accueil') + '?error=Service réservations indisponible')
-        
+        traces.evenement(journal, logging.DEBUG, "formulaire reservation",
+                         client_id=client_id, chambre_id=chambre_id, nuits=nuits)
         
         # Préparer les données
         # Récupérer le prix de la chambre et calculer le total
-        chambre_resp = requests.get(f"{SERVICES['chambres']}/chambre/{int(chambre_id)}", timeout=5)
-        if chambre_resp.status_code != 200:
+        chambre = infos_chambre(int(chambre_id))
+        if chambre is None:
             return redirect(url_for('accueil') + '?error=Prix chambre introuvable')
-        chambre_info = chambre_resp.json()
-        prix_nuit = chambre_info.get('prix', 100)
-        total = float(prix_nuit) * int(nuits)
+
+        # État tenu par le surveillant de santé (nœud de l'agence de la chambre): aucune sonde
+        # sur le chemin de la réservation
+        if not surveillant.est_disponible('reservations', agence=chambre.get('id_agence')):
+            return redirect(url_for('accueil') + '?error=Service réservations indisponible')
+        total = prix_sejours([int(chambre_id)], [date_arrivee or date.today()], [int(nuits)])[0]
 
         data = {
             "client_id": int(client_id),
             "chambre_id": int(chambre_id),
             "nuits": int(nuits),
-            "prix_total": total
+            "date_arrivee": date_arrivee,
+            "prix_total": total,
+            # Agence et type servent aux agrégats d'occupation du service réservations
+            "id_agence": chambre.get('id_agence'),
+            "type_chambre": chambre.get('type_chambre')
         }
         
-        url = f"{SERVICES['reservations']}/reserver"
-        
-        response = requests.post(url, json=data, timeout=10)
+        # Création idempotente, rejouée sur erreur transitoire (voir creation_reservation.py)
+        try:
+            creation_reservation.creer_avec_reprises(data, request.form.get('cle_idempotence'))
+        except creation_reservation.EchecCreation as e:
+            return redirect(url_for('accueil') + f'?error={e.message}')
+        return redirect(url_for('accueil') + '?success=1')
+            
+    except Exception as e:
+        return redirect(url_for('accueil') + f'?error={str(e)}')
 
-        if response.status_code == 200:
-            ok = mettre_a_jour_disponibilite_chambre(int(chambre_id), False)
-            if not ok:
-                return redirect(url_for('accueil') + '?error=Chambre non mise en occupée')
-            return redirect(url_for('accueil') + '?success=1')
+def prix_chambres(chambres_ids):
+    """Prix par nuit de plusieurs chambres: catalogue en cache puis une seule recherche groupée"""
+    prix = {}
+    manquantes = []
+    for chambre_id in chambres_ids:
+        statique = passerelle_http.CACHE_CATALOGUE.get(chambre_id)
+        if statique is None:
+            manquantes.append(chambre_id)
         else:
+            prix[chambre_id] = statique.get('prix')
+    if manquantes:
+        ids = ",".join(str(i) for i in manquantes)
+        chambres = get_service_data('chambres', f"chambres?ids={ids}&fields=id_chambre,type_chambre,etage,prix,id_agence",
+                                    fusion='id_chambre') or []
+        passerelle_http.memoriser_catalogue(chambres)
+        for chambre in chambres:
+            prix[chambre['id_chambre']] = chambre.get('prix')
+    return prix
+
+def prix_sejours(chambres_ids, arrivees, nuits):
+    """Totaux tarifés (saison, agence, durée) de plusieurs séjours en un calcul vectorisé.
+    Les chambres absentes du catalogue tarifaire sont tarifées depuis le cache catalogue."""
+    totaux = [None] * len(chambres_ids)
+    try:
+        cotes = moteur.coter(chambres_ids, arrivees, nuits)
+        totaux = [None if total != total else float(total) for total in cotes.tolist()]
+    except Exception as e:
+        traces.evenement(journal, logging.WARNING, "catalogue tarifaire indisponible", erreur=str(e))
+    inconnues = [i for i, total in enumerate(totaux) if total is None]
+    if inconnues:
+        prix = prix_chambres(sorted({chambres_ids[i] for i in inconnues}))
+        connues = [i for i in inconnues if prix.get(chambres_ids[i]) is not None]
+        if connues:
+            agences = [(passerelle_http.CACHE_CATALOGUE.get(chambres_ids[i]) or {}).get('id_agence') for i in connues]
+            cotes = moteur.coter_prix([float(prix[chambres_ids[i]]) for i in connues],
+                                      [-1 if agence is None else agence for agence in agences],
+                                      [arrivees[i] for i in connues], [nuits[i] for i in connues])
+            for i, total in zip(connues, cotes.tolist()):
+                totaux[i] = total
+    return totaux
+
+@app.route('/api/devis', methods=['GET'])
+def api_devis():
+    """Devis de toutes les chambres libres d'une agence pour [date_debut, date_fin[, du moins cher au plus cher"""
+    agence = request.args.get('agence', type=int)
+    date_debut = request.args.get('date_debut')
+    date_fin = request.args.get('date_fin')
+    if agence is None or not date_debut or not date_fin:
+        return jsonify({"error": "agence, date_debut et date_fin requis"}), 400
+    try:
+        nuits = (date.fromisoformat(date_fin) - date.fromisoformat(date_debut)).days
+    except ValueError:
+        return jsonify({"error": "dates invalides (AAAA-MM-JJ)"}), 400
+    if nuits < 1:
+        return jsonify({"error": "date_fin doit être postérieure à date_debut"}), 400
+
+    try:
+        ids = moteur.ids_agence(agence)
+    except Exception:
+        return jsonify({"error": "Service chambres indisponible"}), 503
+    if not ids:
+        return jsonify({"agence": agence, "nuits": nuits, "chambres": []})
+    # Toutes les chambres de l'agence: la liste part dans le corps (une URL serait tronquée ou refusée)
+    try:
+        response = passerelle_http.post('reservations', 'disponibilites', agence=agence,
+                                        json={"chambres": ids, "date_debut": date_debut, "date_fin": date_fin})
+    except Exception:
+        return jsonify({"error": "Service réservations indisponible"}), 503
+    if response.status_code != 200:
+        return jsonify(corps_reponse(response)), 503 if response.status_code >= 500 else response.status_code
+    resultat = response.json()
+    devis = moteur.devis_agence(agence, date_debut, date_fin, libres=resultat.get('libres', []),
+                                type_chambre=request.args.get('type_chambre'))
+    return jsonify({"agence": agence, "date_debut": date_debut, "date_fin": date_fin, "nuits": nuits, "chambres": devis})
+
+@app.route('/api/devis/regles', methods=['GET'])
+def api_devis_regles():
+    return jsonify(moteur.stats())
+
+@app.route('/reserver/lot', methods=['POST'])
+def reserver_lot():
+    """Réservation groupée (tour-opérateurs): un prix groupé, un insert par nœud.
+    Les chambres occupées sont mises à jour par la boîte d'envoi du service réservations"""
+    try:
+        demandes = (request.get_json(silent=True) or {}).get('reservations') or []
+        if not isinstance(demandes, list) or not demandes:
+            return jsonify({"success": False, "error": "liste 'reservations' requise"}), 400
+
+        # Chaque élément est validé seul: une demande invalide n'écarte qu'elle-même du lot
+        rapport = {}
+        valides = []
+        for index, demande in enumerate(demandes):
+            demande = demande if isinstance(demande, dict) else {}
             try:
-                error_data = response.json()
-                error_msg = error_data.get("error", "Erreur inconnue")
-            except:
-                error_msg = response.text
-            
-            return redirect(url_for('accueil') + f'?error={error_msg}')
-            
+                chambre_id = int(demande['chambre_id'])
+            except (KeyError, TypeError, ValueError):
+                rapport[index] = {"index": index, "success": False, "error": "chambre_id entier requis"}
+                continue
+            try:
+                nuits = int(demande.get('nuits', 1))
+                arrivee = date.fromisoformat(demande.get('date_arrivee') or date.today().isoformat())
+            except (TypeError, ValueError):
+                rapport[index] = {"index": index, "success": False, "error": "nuits entières et date_arrivee AAAA-MM-JJ requises"}
+                continue
+            if nuits < 1:
+                rapport[index] = {"index": index, "success": False, "error": "nuits doit être >= 1"}
+                continue
+            valides.append((index, demande, chambre_id, arrivee, nuits))
+
+        # Les éléments valides sont tarifés en un seul calcul vectorisé
+        totaux = prix_sejours([v[2] for v in valides], [v[3] for v in valides], [v[4] for v in valides]) if valides else []
+        a_envoyer = []
+        for (index, demande, chambre_id, arrivee, nuits), total in zip(valides, totaux):
+            if total is None:
+                rapport[index] = {"index": index, "success": False, "error": f"Chambre {chambre_id} introuvable"}
+                continue
+            statique = passerelle_http.CACHE_CATALOGUE.get(chambre_id) or {}
+            a_envoyer.append((index, {
+                "client_id": demande.get('client_id'),
+                "chambre_id": chambre_id,
+                "nuits": nuits,
+                "date_arrivee": arrivee.isoformat(),
+                "prix_total": total,
+                "id_agence": statique.get('id_agence'),
+                "type_chambre": statique.get('type_chambre')
+            }))
+
+        # Un lot par nœud de réservations (partition des agences)
+        par_noeud = {}
+        for index, donnees in a_envoyer:
+            par_noeud.setdefault(passerelle_http.noeud_agence('reservations', donnees['id_agence']), []).append((index, donnees))
+        for noeud, groupe in par_noeud.items():
+            response = passerelle_http.post('reservations', 'reserver/lot', noeud=noeud,
+                                            json={"reservations": [d for _, d in groupe]})
+            if response.status_code != 200:
+                try:
+                    erreur, code = response.json(), response.status_code
+                except Exception:
+                    erreur, code = {"success": False, "error": response.text}, 502
+                if len(par_noeud) == 1:
+                    return jsonify(erreur), code
+                for index, _ in groupe:
+                    rapport[index] = {"index": index, "success": False, "error": erreur.get('error', "Erreur du service")}
+                continue
+            for ligne in response.json().get('resultats', []):
+                index = groupe[ligne['index']][0]
+                rapport[index] = dict(ligne, index=index)
+
+        resultats = [rapport[index] for index in range(len(demandes))]
+        reussies = sum(1 for ligne in resultats if ligne['success'])
+        return jsonify({"success": reussies > 0, "reussies": reussies, "echecs": len(resultats) - reussies, "resultats": resultats})
     except Exception as e:
-        return redirect(url_for('accueil') + f'?error={str(e)}')
+        return jsonify({"success": False, "error": f"Erreur: {str(e)}"}), 500
 
 @app.route('/annuler/<reservation_id>', methods=['POST'])
 def annuler_reservation_complete(reservation_id):
-    """Orchestrateur: Appelle les 2 services"""
+    """Annule la réservation; la chambre est libérée ensuite par la boîte d'envoi du service réservations"""
     try:
-        
-        r = requests.put(f"{SERVICES['reservations']}/reservations/{reservation_id}/statut", json={"statut": "annulée"}, timeout=8)
+        # L'agence de la réservation est inconnue ici: le nœud qui la détient répond autre chose que 404
+        r = passerelle_http.requete_premier_noeud('PUT', 'reservations', f"reservations/{reservation_id}/statut",
+                                                  json={"statut": "annulée"})
         if r.status_code != 200:
             try:
                 return jsonify(r.json()), 500
             except Exception:
                 return jsonify({"success": False, "error": r.text}), 500
         result_reservation = r.json()
-        
-        # 2. RÉCUPÉRATION ID CHAMBRE 
-        chambre_id = result_reservation.get('chambre_id')
-        if not chambre_id:
-            try:
-                all_reservations = requests.get(f"{SERVICES['reservations']}/reservations", timeout=8).json() or []
-                for resa in all_reservations:
-                    if str(resa.get('_id')) == str(reservation_id):
-                        chambre_id = resa.get('chambre_id')
-                        break
-            except Exception:
-                pass
-            if not chambre_id:
-                return jsonify({"success": False, "error": "ID chambre manquant"}), 500
-        
-        # 3. APPEL SERVICE CHAMBRES - Libération chambre 
-        ok = mettre_a_jour_disponibilite_chambre(int(chambre_id), True)
-        if not ok:
-            return jsonify({"success": False, "error": "Échec libération chambre"}), 500
-        
-        # 4. SUCCÈS COMPLET 
-        message_final = f"🎉 Annulation terminée: Réservation annulée + Chambre libérée"
-        print(message_final)
-        
+
+        traces.evenement(journal, logging.INFO, "annulation enregistree",
+                         reservation_id=reservation_id, chambre_id=result_reservation.get('chambre_id'))
         return jsonify({
             "success": True,
-            "message": message_final,
+            "message": "🎉 Réservation annulée, la chambre sera libérée sous peu",
             "numero_reservation": result_reservation.get('numero_reservation')
         }), 200
-        
+
     except Exception as e:
         return jsonify({"success": False, "error": f"Erreur: {str(e)}"}), 500
 
 if __name__ == '__main__':
-    print(" Application Web → http://localhost:5000")
-    app.run(port=5000, debug=True)
+    # Développement seulement; en production: python serveur.py app_web
+    print(f" Application Web → http://localhost:{configuration.port('app_web')}")
+    app.run(port=configuration.port('app_web'), debug=configuration.DEBUG)
@@ -0,0 +1,325 @@
+"""Banc de charge reproductible des quatre applications sur des bases locales.
+
+Lance service_chambres, service_clients, service_reservations et app_web dans le
+même processus (serveurs WSGI threadés), avec SQLite à la place de MySQL et
+mongomock (ou le mongod local avec --mongod, base "banc_hotel") à la place de
+MongoDB. mongomock ne reproduit pas le coût des index: les chiffres de référence
+se prennent avec --mongod. Les bases sont peuplées selon un profil de volumétrie, puis les
+parcours "/", "/reserver" et "/annuler/<id>" sont joués à plusieurs niveaux de
+concurrence. Le rapport JSON (p50/p95/p99, débit, erreurs par endpoint) permet
+de comparer deux commits. --partitions N répartit les agences sur N partitions
+(une base SQLite et une collection par partition, voir partitions.py).
+
+    python benchmarks/banc_charge.py --profil petit --concurrence 1,10,50 --requetes 300
+    python benchmarks/banc_charge.py --profil realiste --mongod --sortie bench_output.json
+    python benchmarks/banc_charge.py --profil moyen --partitions 4
+"""
+import argparse
+import contextlib
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RACINE)
+sys.path.insert(0, os.path.join(RACINE, 'services'))
+
+import requests
+from werkzeug.serving import make_server
+
+from substituts import PoolSQLite
+
+# (chambres, clients, réservations)
+PROFILS = {
+    'petit': (200, 2000, 20000),
+    'moyen': (2000, 20000, 200000),
+    'realiste': (10000, 100000, 1000000),
+}
+PORTS = {'app_web': 5100, 'chambres': 5101, 'clients': 5102, 'reservations': 5103}
+TAILLE_LOT = 10000
+
+
+def nombre_agences(nb_chambres):
+    return max(1, nb_chambres // 100)
+
+
+def charger_services(utiliser_mongod, nb_partitions=1, nb_agences=1):
+    """Importe les services en branchant les substituts de bases"""
+    if not utiliser_mongod:
+        import mongomock
+        import pymongo
+        pymongo.MongoClient = mongomock.MongoClient
+
+    import partitions
+    if nb_partitions > 1:
+        # Table de routage posée avant l'import des services: agences réparties en tourniquet
+        noms = [f"p{i}" for i in range(nb_partitions)]
+        partitions.table = partitions.TableRoutage({
+            "defaut": noms[0],
+            "agences": {str(agence): noms[agence % nb_partitions] for agence in range(1, nb_agences + 1)},
+            "partitions": {nom: {} for nom in noms},
+        })
+
+    import service_chambres
+    import service_clients
+    import service_reservations
+
+    dossier = tempfile.mkdtemp(prefix="banc_hotel_")
+    service_chambres.pools = {nom: PoolSQLite(os.path.join(dossier, f"chambres_{nom}.db"))
+                              for nom in service_chambres.pools}
+    service_clients.pool = PoolSQLite(os.path.join(dossier, "clients.db"))
+
+    db = service_reservations.client['banc_hotel']
+    collections = {nom: db[partitions.table.config_mongo(nom)['collection']] for nom in service_reservations.collections}
+    for collection in collections.values():
+        collection.drop()
+        service_reservations.nuitees.collection_nuitees(collection).drop()
+    db['compteurs'].drop()
+    db['stats_occupation'].drop()
+    service_reservations.db = db
+    service_reservations.collections = collections
+    service_reservations.reservations_collection = collections[partitions.table.defaut]
+    service_reservations.compteurs_collection = db['compteurs']
+    service_reservations.stats_collection = db['stats_occupation']
+    if not utiliser_mongod:
+        # mongomock vérifie l'unicité par parcours complet (O(n) par insertion): sans
+        # intérêt pour mesurer les index, on n'y garde que les index non uniques
+        service_reservations.INDEX_RESERVATIONS = [
+            index for index in service_reservations.INDEX_RESERVATIONS if not index.get("unique")
+        ]
+    service_reservations.creer_index()
+    return service_chambres, service_clients, service_reservations
+
+
+def peupler(services, nb_chambres, nb_clients, nb_reservations):
+    service_chambres, service_clients, service_reservations = services
+    table = service_chambres.table
+    aleatoire = random.Random(42)
+    nb_agences = nombre_agences(nb_chambres)
+
+    # id_chambre explicites: uniques d'une partition à l'autre
+    agences_chambres = {i: aleatoire.randint(1, nb_agences) for i in range(1, nb_chambres + 1)}
+    for nom, pool in service_chambres.pools.items():
+        with pool.curseur(dictionary=False) as (conn, cursor):
+            cursor.executemany(
+                "INSERT INTO agence(localisation, nbre_chambres, nbre_etages) VALUES (%s, %s, %s)",
+                [(f"Agence {i}", 100, 5) for i in range(1, nb_agences + 1)]
+            )
+            ids = [i for i, agence in agences_chambres.items() if table.partition(agence) == nom]
+            for debut in range(0, len(ids), TAILLE_LOT):
+                cursor.executemany(
+                    "INSERT INTO chambre(id_chambre, type_chambre, etage, prix, disponible, id_agence) VALUES (%s, %s, %s, %s, %s, %s)",
+                    [(i, aleatoire.choice(("seul", "double", "suite")), aleatoire.randint(1, 5),
+                      aleatoire.choice((25000, 40000, 75000)), True, agences_chambres[i])
+                     for i in ids[debut:debut + TAILLE_LOT]]
+                )
+            conn.commit()
+
+    with service_clients.pool.curseur(dictionary=False) as (conn, cursor):
+        for debut in range(0, nb_clients, TAILLE_LOT):
+            cursor.executemany(
+                "INSERT INTO client(nom, prenom, email, telephone, date_inscription) VALUES (%s, %s, %s, %s, %s)",
+                [(f"Nom{i}", f"Prenom{i}", f"client{i}@exemple.tg", f"+228 90 {i % 100:02d} {i % 97:02d} {i % 89:02d}", "2024-01-15")
+                 for i in range(debut, min(debut + TAILLE_LOT, nb_clients))]
+            )
+        conn.commit()
+
+    # Historique: séjours passés, pour ne pas bloquer les réservations du banc
+    origine = date(2020, 1, 1)
+    for debut in range(0, nb_reservations, TAILLE_LOT):
+        documents = {}
+        for i in range(debut, min(debut + TAILLE_LOT, nb_reservations)):
+            arrivee = origine + timedelta(days=aleatoire.randint(0, 1500))
+            nuits = aleatoire.randint(1, 7)
+            chambre_id = aleatoire.randint(1, nb_chambres)
+            documents.setdefault(table.partition(agences_chambres[chambre_id]), []).append({
+                "client_id": aleatoire.randint(1, nb_clients),
+                "chambre_id": chambre_id,
+                "id_agence": agences_chambres[chambre_id],
+                "nuits": nuits,
+                "prix_total": 25000 * nuits,
+                "date_arrivee": arrivee.isoformat(),
+                "date_depart": (arrivee + timedelta(days=nuits)).isoformat(),
+                "date_reservation": f"{arrivee.isoformat()}T10:00:00",
+                "statut": aleatoire.choice(("en cours", "annulée", "terminée")),
+                "numero_reservation": f"HIST{i:07d}",
+            })
+        for nom, lot in documents.items():
+            service_reservations.collections[nom].insert_many(lot, ordered=False)
+    service_reservations.charger_calendrier()
+
+
+def demarrer_serveurs(services, utiliser_mongod=False):
+    """Serveurs HTTP des quatre applications et livreur de la boîte d'envoi, en threads"""
+    import app_web
+    import boite_envoi
+    import passerelle_http
+
+    applications = {'app_web': app_web.app}
+    for nom, module in zip(('chambres', 'clients', 'reservations'), services):
+        applications[nom] = module.app
+        passerelle_http.SERVICES[nom] = f"http://127.0.0.1:{PORTS[nom]}"
+
+    for nom, application in applications.items():
+        serveur = make_server('127.0.0.1', PORTS[nom], application, threaded=True)
+        threading.Thread(target=serveur.serve_forever, name=f"banc-{nom}", daemon=True).start()
+
+    # mongomock n'a pas d'index: chaque tour du livreur parcourt la collection en tenant le GIL
+    # pris aux requêtes mesurées. Il n'est alors lancé qu'après les mesures (voir main)
+    livreur = boite_envoi.Livreur(services[2].collections)
+    if utiliser_mongod:
+        threading.Thread(target=livreur.tourner, args=(threading.Event(),), name="banc-boite-envoi", daemon=True).start()
+    return livreur
+
+
+class Client:
+    """Session HTTP par thread vers app_web"""
+
+    def __init__(self):
+        self._local = threading.local()
+
+    @property
+    def session(self):
+        if not hasattr(self._local, 'session'):
+            self._local.session = requests.Session()
+        return self._local.session
+
+
+def mesurer(latences, erreurs, cle, appel):
+    debut = time.perf_counter()
+    try:
+        ok = appel()
+    except requests.exceptions.RequestException:
+        ok = False
+    latences.setdefault(cle, []).append(time.perf_counter() - debut)
+    if not ok:
+        erreurs[cle] = erreurs.get(cle, 0) + 1
+    return ok
+
+
+def scenario_accueil(client, latences, erreurs):
+    url = f"http://127.0.0.1:{PORTS['app_web']}/"
+    mesurer(latences, erreurs, "/", lambda: client.session.get(url, timeout=30).status_code == 200)
+
+
+def scenario_reservation(client, latences, erreurs, nb_chambres, nb_clients):
+    """Réserve une chambre à une date future puis annule, pour garder le parc disponible"""
+    base = f"http://127.0.0.1:{PORTS['app_web']}"
+    cle = uuid.uuid4().hex
+    formulaire = {
+        "client_id": random.randint(1, nb_clients),
+        "chambre_id": random.randint(1, nb_chambres),
+        "nuits": 1,
+        "date_arrivee": (date(2030, 1, 1) + timedelta(days=random.randint(0, 3650))).isoformat(),
+        "cle_idempotence": cle,
+    }
+
+    def reserver():
+        reponse = client.session.post(f"{base}/reserver", data=formulaire, allow_redirects=False, timeout=30)
+        return reponse.status_code == 302 and 'success=1' in reponse.headers.get('Location', '')
+
+    if not mesurer(latences, erreurs, "/reserver", reserver):
+        return
+    trouvee = client.session.get(f"http://127.0.0.1:{PORTS['reservations']}/reservations/cle/{cle}", timeout=30)
+    if trouvee.status_code != 200:
+        return
+    reservation_id = trouvee.json()['reservation_id']
+    mesurer(latences, erreurs, "/annuler/<id>",
+            lambda: client.session.post(f"{base}/annuler/{reservation_id}", timeout=30).status_code == 200)
+
+
+def percentile(valeurs, p):
+    return valeurs[min(len(valeurs) - 1, int(p * len(valeurs)))]
+
+
+def synthese(latences, erreurs, concurrence, duree):
+    lignes = []
+    for endpoint, valeurs in sorted(latences.items()):
+        valeurs.sort()
+        lignes.append({
+            "endpoint": endpoint,
+            "concurrence": concurrence,
+            "requetes": len(valeurs),
+            "erreurs": erreurs.get(endpoint, 0),
+            "debit_req_s": round(len(valeurs) / duree, 1),
+            "p50_ms": round(1000 * statistics.median(valeurs), 2),
+            "p95_ms": round(1000 * percentile(valeurs, 0.95), 2),
+            "p99_ms": round(1000 * percentile(valeurs, 0.99), 2),
+        })
+    return lignes
+
+
+def jouer(scenario, requetes, concurrence):
+    latences, erreurs = {}, {}
+    debut = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrence) as executor:
+        list(executor.map(lambda _: scenario(latences, erreurs), range(requetes)))
+    return synthese(latences, erreurs, concurrence, time.perf_counter() - debut)
+
+
+def commit_courant():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=RACINE, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--profil', choices=sorted(PROFILS), default='petit')
+    parser.add_argument('--concurrence', default='1,10,50', help="niveaux séparés par des virgules")
+    parser.add_argument('--requetes', type=int, default=200, help="requêtes par scénario et par niveau")
+    parser.add_argument('--mongod', action='store_true', help="utiliser le mongod local au lieu de mongomock")
+    parser.add_argument('--partitions', type=int, default=1, help="nombre de partitions d'agences")
+    parser.add_argument('--sortie', help="fichier JSON du rapport (sinon sortie standard)")
+    args = parser.parse_args()
+
+    nb_chambres, nb_clients, nb_reservations = PROFILS[args.profil]
+    niveaux = [int(n) for n in args.concurrence.split(',')]
+
+    journal = open(os.devnull, 'w')
+    with contextlib.redirect_stdout(journal):
+        services = charger_services(args.mongod, args.partitions, nombre_agences(nb_chambres))
+        debut = time.perf_counter()
+        peupler(services, nb_chambres, nb_clients, nb_reservations)
+        duree_peuplement = time.perf_counter() - debut
+        livreur = demarrer_serveurs(services, args.mongod)
+
+        client = Client()
+        resultats = []
+        for concurrence in niveaux:
+            resultats += jouer(lambda l, e: scenario_accueil(client, l, e), args.requetes, concurrence)
+            resultats += jouer(lambda l, e: scenario_reservation(client, l, e, nb_chambres, nb_clients),
+                               args.requetes, concurrence)
+        if not args.mongod:
+            while livreur.livrer_lot():
+                pass
+
+    rapport = {
+        "commit": commit_courant(),
+        "profil": args.profil,
+        "volumes": {"chambres": nb_chambres, "clients": nb_clients, "reservations": nb_reservations},
+        "mongo": "mongod" if args.mongod else "mongomock",
+        "partitions": args.partitions,
+        "peuplement_s": round(duree_peuplement, 2),
+        "resultats": resultats,
+        "boite_envoi": livreur.stats(),
+    }
+    texte = json.dumps(rapport, indent=2, ensure_ascii=False)
+    if args.sortie:
+        with open(args.sortie, 'w', encoding='utf-8') as fichier:
+            fichier.write(texte)
+    print(texte)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+"""Comparaison de charge de la page d'accueil: thread par requête vs passerelle asyncio.
+
+Démarre un faux backend aiohttp (latence réglable) à la place des trois services,
+puis simule N requêtes d'accueil concurrentes avec chacun des deux modes.
+
+    python benchmarks/comparaison_accueil.py --requetes 2000 --concurrence 100 --latence 0.02
+"""
+import argparse
+import asyncio
+import concurrent.futures
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiohttp import web
+
+import app_web
+import passerelle_http
+from passerelle_async import passerelle
+
+PORT_FAUX_BACKEND = 5901
+
+
+def demarrer_faux_backend(latence, lent=None, latence_lente=10.0):
+    """Sert les endpoints lus par la page d'accueil avec une latence fixe"""
+    def reservation(i):
+        return {
+            "_id": str(i), "numero_reservation": f"RES{1000 + i}", "client_id": 1, "chambre_id": 1,
+            "nuits": 2, "prix_total": 50000, "date_reservation": "2024-03-01T10:00:00", "statut": "en cours"
+        }
+
+    donnees = {
+        'chambres': [{"id_chambre": i, "prix": 25000, "disponible": True, "id_agence": 1} for i in range(25)],
+        'clients': [{"id_client": i, "nom": "Kossi", "prenom": "Abel"} for i in range(10)],
+        'reservations': [reservation(i) for i in range(20)],
+        'reservations/actives': {
+            "reservations": [reservation(i) for i in range(20)],
+            "next": None
+        },
+        'agences': [{"id_agence": 1, "localisation": "Aneho"}],
+        'health': {"status": "OK"},
+    }
+
+    def gestionnaire(nom):
+        async def repondre(request):
+            await asyncio.sleep(latence_lente if nom == lent else latence)
+            return web.json_response(donnees[nom])
+        return repondre
+
+    application = web.Application()
+    for nom in donnees:
+        application.router.add_get(f'/{nom}', gestionnaire(nom))
+
+    boucle = asyncio.new_event_loop()
+    pret = threading.Event()
+
+    def lancer():
+        asyncio.set_event_loop(boucle)
+        runner = web.AppRunner(application)
+        boucle.run_until_complete(runner.setup())
+        boucle.run_until_complete(web.TCPSite(runner, '127.0.0.1', PORT_FAUX_BACKEND).start())
+        pret.set()
+        boucle.run_forever()
+
+    threading.Thread(target=lancer, daemon=True).start()
+    pret.wait()
+    for service in passerelle_http.SERVICES:
+        passerelle_http.SERVICES[service] = f'http://127.0.0.1:{PORT_FAUX_BACKEND}'
+
+
+def mesurer(mode, requetes, concurrence):
+    app_web.MODE_PASSERELLE = mode
+    latences = []
+    pic_threads = threading.active_count()
+    arret = threading.Event()
+
+    def surveiller():
+        nonlocal pic_threads
+        while not arret.is_set():
+            pic_threads = max(pic_threads, threading.active_count())
+            time.sleep(0.005)
+
+    def une_page(_):
+        debut = time.perf_counter()
+        try:
+            resultat = app_web.recuperer_donnees_accueil()
+        except concurrent.futures.TimeoutError:
+            # Mode threads: accueil() affiche alors une page sans aucune donnée
+            resultat = (None, None, None, None)
+        latences.append(time.perf_counter() - debut)
+        return sum(1 for r in resultat if r is None)
+
+    moniteur = threading.Thread(target=surveiller, daemon=True)
+    moniteur.start()
+    debut = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrence) as clients:
+        partiels = sum(1 for manquants in clients.map(une_page, range(requetes)) if manquants)
+    duree = time.perf_counter() - debut
+    arret.set()
+    moniteur.join()
+
+    latences.sort()
+    return {
+        "mode": mode,
+        "requetes": requetes,
+        "concurrence": concurrence,
+        "debit_req_s": round(requetes / duree, 1),
+        "p50_ms": round(1000 * statistics.median(latences), 2),
+        "p99_ms": round(1000 * latences[int(0.99 * (len(latences) - 1))], 2),
+        "pic_threads": pic_threads,
+        "pages_incompletes": partiels,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requetes', type=int, default=1000)
+    parser.add_argument('--concurrence', type=int, default=50)
+    parser.add_argument('--latence', type=float, default=0.02, help="latence du faux backend (s)")
+    parser.add_argument('--service-lent', default=None, help="nom d'un endpoint qui dépasse le délai global")
+    args = parser.parse_args()
+
+    demarrer_faux_backend(args.latence, lent=args.service_lent)
+    resultats = [mesurer(mode, args.requetes, args.concurrence) for mode in ('threads', 'async')]
+    print(json.dumps(resultats, indent=2))
+    passerelle.fermer()
+
+
+if __name__ == '__main__':
+    main()
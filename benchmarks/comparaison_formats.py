@@ -0,0 +1,103 @@
+"""Octets transmis et temps d'encodage / décodage des formats d'échange pour N lignes.
+
+Compare l'ancien chemin (jsonify stdlib + boucle str(_id), response.json()) aux
+formats négociés de format_echange: JSON rapide, JSON en colonnes, MessagePack.
+
+    python benchmarks/comparaison_formats.py --lignes 10000 --repetitions 20
+"""
+import argparse
+import datetime
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bson.objectid import ObjectId
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+import format_echange
+
+
+def chambres(nombre):
+    aleatoire = random.Random(42)
+    return [
+        {"id_chambre": i, "type_chambre": aleatoire.choice(("seul", "double", "suite")), "etage": aleatoire.randint(1, 5),
+         "prix": aleatoire.choice((25000.0, 40000.0, 75000.0)), "disponible": True, "id_agence": aleatoire.randint(1, 20)}
+        for i in range(1, nombre + 1)
+    ]
+
+
+def reservations(nombre):
+    aleatoire = random.Random(42)
+    debut = datetime.date(2024, 1, 1)
+    lignes = []
+    for i in range(nombre):
+        arrivee = debut + datetime.timedelta(days=aleatoire.randint(0, 700))
+        nuits = aleatoire.randint(1, 7)
+        lignes.append({
+            "_id": ObjectId(), "client_id": aleatoire.randint(1, 100000), "chambre_id": aleatoire.randint(1, 10000),
+            "nuits": nuits, "prix_total": 25000.0 * nuits, "date_arrivee": arrivee.isoformat(),
+            "date_depart": (arrivee + datetime.timedelta(days=nuits)).isoformat(),
+            "date_reservation": datetime.datetime(2024, 1, 1, 10, 0) + datetime.timedelta(minutes=i),
+            "statut": aleatoire.choice(("en cours", "annulée", "terminée")), "numero_reservation": f"RES{i:07d}",
+            "id_agence": aleatoire.randint(1, 20), "type_chambre": aleatoire.choice(("seul", "double", "suite")),
+        })
+    return lignes
+
+
+def chronometrer(fonction, repetitions):
+    durees = []
+    for _ in range(repetitions):
+        debut = time.perf_counter()
+        fonction()
+        durees.append(time.perf_counter() - debut)
+    return 1000 * statistics.median(durees)
+
+
+def mesurer(nom, donnees, repetitions):
+    fournisseur_flask = DefaultJSONProvider(Flask(__name__))
+
+    def avant_encoder():
+        # Ancien chemin des services: str(_id) ligne par ligne puis json stdlib (clés triées)
+        lignes = [dict(ligne) for ligne in donnees]
+        for ligne in lignes:
+            if '_id' in ligne:
+                ligne['_id'] = str(ligne['_id'])
+        return fournisseur_flask.dumps(lignes).encode('utf-8')
+
+    corps_avant = avant_encoder()
+    resultats = [("avant (jsonify stdlib)", len(corps_avant),
+                  chronometrer(avant_encoder, repetitions), chronometrer(lambda: json.loads(corps_avant), repetitions))]
+    for type_mime in (format_echange.JSON, format_echange.COLONNES, format_echange.MSGPACK):
+        if type_mime not in format_echange.FORMATS:
+            continue
+        corps, type_obtenu = format_echange.encoder(donnees, type_mime)
+        resultats.append((
+            type_obtenu, len(corps),
+            chronometrer(lambda: format_echange.encoder(donnees, type_mime), repetitions),
+            chronometrer(lambda: format_echange.decoder(corps, type_obtenu), repetitions),
+        ))
+
+    print(f"\n{nom}: {len(donnees)} lignes (médiane de {repetitions} mesures)")
+    print(f"{'format':40} {'octets':>10} {'encodage ms':>12} {'décodage ms':>12}")
+    for format_nom, octets, encodage, decodage in resultats:
+        print(f"{format_nom:40} {octets:>10} {encodage:>12.2f} {decodage:>12.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Comparaison des formats d'échange")
+    parser.add_argument('--lignes', type=int, default=10000)
+    parser.add_argument('--repetitions', type=int, default=20)
+    args = parser.parse_args()
+    print(f"orjson: {'oui' if format_echange.orjson else 'non'}, msgpack: {'oui' if format_echange.msgpack else 'non'}")
+    mesurer("chambres", chambres(args.lignes), args.repetitions)
+    mesurer("réservations", reservations(args.lignes), args.repetitions)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""Test de charge: aucune double réservation d'une même chambre.
+
+Nécessite la pile lancée (services chambres et réservations sur 5001/5003).
+Des centaines de réservations concurrentes visent la même chambre, puis on vérifie
+qu'une seule a réussi et qu'un seul document "en cours" existe. Une seconde
+phase rejoue la même clé d'idempotence en parallèle: une seule réservation.
+
+    python benchmarks/stress_double_reservation.py --chambre 1 --requetes 500 --concurrence 100
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import creation_reservation
+import passerelle_http
+
+
+def tenter(donnees, cle=None):
+    try:
+        return creation_reservation.creer_avec_reprises(donnees, cle)
+    except creation_reservation.EchecCreation as e:
+        return {"success": False, "error": e.message, "code": e.code}
+
+
+def reservations_en_cours(chambre_id, date_arrivee):
+    lignes = passerelle_http.lire_ndjson('reservations', 'reservations/export',
+                                         {"chambre_id": chambre_id, "statut": "en cours"})
+    return [r for r in lignes if r.get('date_arrivee') == date_arrivee]
+
+
+def nettoyer(reservations):
+    for reservation in reservations:
+        passerelle_http.put('reservations', f"reservations/{reservation['_id']}/statut", json={"statut": "annulée"})
+
+
+def phase(nom, chambre_id, date_arrivee, requetes, concurrence, cle=None):
+    donnees = {"client_id": 1, "chambre_id": chambre_id, "nuits": 1, "date_arrivee": date_arrivee, "prix_total": 0}
+    debut = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrence) as executor:
+        resultats = list(executor.map(lambda _: tenter(donnees, cle), range(requetes)))
+    duree = time.perf_counter() - debut
+
+    reussies = [r for r in resultats if r.get('success')]
+    en_base = reservations_en_cours(chambre_id, date_arrivee)
+    ids_distincts = {r['reservation_id'] for r in reussies}
+    ok = len(en_base) == 1 and len(ids_distincts) == 1
+    print(f"{nom}: {requetes} requêtes en {duree:.2f}s ({requetes / duree:.0f} req/s), "
+          f"{len(reussies)} réponses OK, {len(ids_distincts)} réservation(s) distincte(s), "
+          f"{len(en_base)} en base -> {'OK' if ok else 'DOUBLE RÉSERVATION'}")
+    nettoyer(en_base)
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--chambre', type=int, default=1)
+    parser.add_argument('--requetes', type=int, default=500)
+    parser.add_argument('--concurrence', type=int, default=100)
+    parser.add_argument('--date-arrivee', default='2099-01-01', help="date isolant les réservations du test")
+    args = parser.parse_args()
+
+    ok = phase("Clés distinctes", args.chambre, args.date_arrivee, args.requetes, args.concurrence)
+    ok &= phase("Même clé rejouée", args.chambre, args.date_arrivee, args.requetes, args.concurrence,
+                cle=creation_reservation.nouvelle_cle())
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""Substituts locaux des bases pour le banc de charge.
+
+PoolSQLite offre la même interface que services/pool_mysql.PoolMySQL
+(connexion(), curseur(), ping(), stats()) sur un fichier SQLite, en traduisant les
+paramètres MySQL (%s) vers SQLite (?). Il remplace le pool des services
+chambres et clients pendant les mesures; la logique des routes reste inchangée.
+"""
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS agence(
+    id_agence INTEGER PRIMARY KEY AUTOINCREMENT,
+    localisation TEXT,
+    nbre_chambres INTEGER,
+    nbre_etages INTEGER
+);
+CREATE TABLE IF NOT EXISTS chambre(
+    id_chambre INTEGER PRIMARY KEY AUTOINCREMENT,
+    type_chambre TEXT,
+    etage INTEGER,
+    prix DOUBLE,
+    disponible BOOLEAN,
+    id_agence INTEGER REFERENCES agence(id_agence)
+);
+CREATE TABLE IF NOT EXISTS client(
+    id_client INTEGER PRIMARY KEY AUTOINCREMENT,
+    nom VARCHAR(100) NOT NULL,
+    prenom VARCHAR(100) NOT NULL,
+    email VARCHAR(150),
+    telephone VARCHAR(20),
+    date_inscription DATE
+);
+"""
+
+
+class CurseurSQLite:
+    def __init__(self, curseur, dictionary):
+        self._curseur = curseur
+        self._dictionary = dictionary
+
+    def _ligne(self, ligne):
+        if ligne is None or not self._dictionary:
+            return ligne
+        return {description[0]: valeur for description, valeur in zip(self._curseur.description, ligne)}
+
+    def execute(self, requete, params=()):
+        self._curseur.execute(requete.replace('%s', '?'), params)
+
+    def executemany(self, requete, lignes):
+        self._curseur.executemany(requete.replace('%s', '?'), lignes)
+
+    def fetchone(self):
+        return self._ligne(self._curseur.fetchone())
+
+    def fetchall(self):
+        return [self._ligne(ligne) for ligne in self._curseur.fetchall()]
+
+    def __iter__(self):
+        for ligne in self._curseur:
+            yield self._ligne(ligne)
+
+    @property
+    def rowcount(self):
+        return self._curseur.rowcount
+
+    def close(self):
+        self._curseur.close()
+
+
+class PoolSQLite:
+    """Une connexion SQLite par thread sur un fichier partagé (WAL)"""
+
+    def __init__(self, chemin):
+        self.chemin = chemin
+        self._local = threading.local()
+        self._nb_emprunts = 0
+        with self.connexion() as conn:
+            conn.executescript(SCHEMA)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.commit()
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.chemin, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def connexion(self):
+        conn = self._conn()
+        self._nb_emprunts += 1
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+
+    @contextmanager
+    def curseur(self, dictionary=True):
+        with self.connexion() as conn:
+            cursor = CurseurSQLite(conn.cursor(), dictionary)
+            try:
+                yield conn, cursor
+            finally:
+                cursor.close()
+
+    def ping(self):
+        debut = time.perf_counter()
+        with self.curseur(dictionary=False) as (conn, cursor):
+            cursor.execute("SELECT 1")
+            cursor.fetchall()
+        return time.perf_counter() - debut
+
+    def stats(self):
+        return {"substitut": "sqlite", "chemin": self.chemin, "emprunts": self._nb_emprunts}
+
+    def fermer(self):
+        pass
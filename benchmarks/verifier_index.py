@@ -0,0 +1,28 @@
+"""Vérifie que les requêtes critiques de service_reservations utilisent un index.
+
+Nécessite un mongod local (mongodb://localhost:27017). Code de sortie 1 si une
+requête retombe sur un COLLSCAN.
+
+    python benchmarks/verifier_index.py
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'services'))
+
+import service_reservations
+
+
+def main():
+    service_reservations.creer_index()
+    echecs = 0
+    for nom, etapes in service_reservations.verifier_plans().items():
+        statut = "COLLSCAN" if "COLLSCAN" in etapes else "OK"
+        if statut != "OK":
+            echecs += 1
+        print(f"{statut:9} {nom:22} {' <- '.join(etapes)}")
+    sys.exit(1 if echecs else 0)
+
+
+if __name__ == '__main__':
+    main()
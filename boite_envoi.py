@@ -0,0 +1,229 @@
+"""Boîte d'envoi (outbox) des effets du service réservations sur le service chambres.
+
+Chaque écriture qui change l'occupation d'une chambre (réservation créée, annulée,
+terminée) dépose, par la même écriture et dans le même document MongoDB, un
+événement en attente:
+
+    {"_id": ..., "chambre_id": 12, "id_agence": 3, ...,
+     "boite_envoi": [{"_id": ObjectId(...), "disponible": false, "cree_le": "..."}]}
+
+insert_one et find_one_and_update portent sur un seul document: la réservation et
+son événement sont écrits ensemble ou pas du tout, sans transaction multi-documents.
+La requête de l'utilisateur rend la main après cette seule écriture locale.
+
+Le livreur (processus à part, python boite_envoi.py) lit les événements en attente
+des partitions locales dans l'ordre de leur _id. Un événement signale seulement que
+l'occupation de la chambre a changé: son état est recalculé au moment de la livraison
+(occupée tant qu'une réservation "en cours" la vise, quelle que soit celle qui a été
+annulée ou terminée). Les chambres sont regroupées par (agence, disponible) en
+PUT /chambres/disponible puis les événements livrés sont retirés. Une chambre en échec est reprise avec un délai
+exponentiel et ses événements suivants attendent, hors de la requête de lecture pour ne
+pas bloquer les autres chambres: l'ordre est tenu par chambre.
+Livraison au moins une fois: le PUT fixe un état, le rejouer est sans effet.
+Un seul livreur par partition, sinon l'ordre par chambre n'est plus garanti.
+
+    python boite_envoi.py                  # boucle (PARTITIONS_LOCALES, BOITE_ENVOI_LOT, BOITE_ENVOI_INTERVALLE)
+    python boite_envoi.py --une-fois       # vide la boîte d'envoi puis s'arrête
+"""
+import argparse
+import logging
+import os
+import signal
+import threading
+import time
+from datetime import datetime
+
+from bson.objectid import ObjectId
+from pymongo import ASCENDING
+
+import configuration
+import traces
+
+CHAMP = 'boite_envoi'
+# Index clairsemé: seules les réservations avec des événements en attente y figurent
+INDEX = {"keys": [(f"{CHAMP}._id", ASCENDING)], "name": CHAMP, "sparse": True}
+FILTRE_EN_ATTENTE = {f"{CHAMP}._id": {"$exists": True}}
+# Projection des lectures publiques: la boîte d'envoi reste interne au service
+SANS_BOITE_ENVOI = {CHAMP: 0}
+
+TAILLE_LOT = int(os.environ.get('BOITE_ENVOI_LOT', 500))
+INTERVALLE = float(os.environ.get('BOITE_ENVOI_INTERVALLE', 0.5))
+DELAI_REPRISE_MAX = 60.0
+
+journal = traces.journal(__name__)
+
+
+def evenement(disponible):
+    """Événement en attente sur la chambre de la réservation. `disponible` garde l'effet de
+    l'écriture pour le suivi; chambre_id, id_agence et l'état livré sont lus à la livraison"""
+    return {"_id": ObjectId(), "disponible": disponible, "cree_le": datetime.now().isoformat()}
+
+
+def en_attente(collections):
+    """{partition: {"reservations": n, "plus_ancien": date}} (index boite_envoi)"""
+    resultat = {}
+    for nom, collection in collections.items():
+        premier = next(collection.find(FILTRE_EN_ATTENTE, {CHAMP: 1}).sort(f"{CHAMP}._id", ASCENDING).limit(1), None)
+        resultat[nom] = {
+            "reservations": collection.count_documents(FILTRE_EN_ATTENTE),
+            "plus_ancien": min(e['cree_le'] for e in premier[CHAMP]) if premier else None,
+        }
+    return resultat
+
+
+def envoyer_chambres(ids, disponible, agence):
+    """Livraison par la passerelle HTTP (session et disjoncteur du nœud de l'agence)"""
+    import passerelle_http
+
+    response = passerelle_http.put('chambres', 'chambres/disponible', agence=agence,
+                                   json={"ids": ids, "disponible": disponible, "id_agence": agence})
+    return response.status_code == 200
+
+
+class Livreur:
+    def __init__(self, collections, envoyer=envoyer_chambres, taille_lot=TAILLE_LOT):
+        self.collections = collections
+        self.envoyer = envoyer
+        self.taille_lot = taille_lot
+        # chambre_id -> (échecs consécutifs, prochain essai en temps monotone)
+        self._reprises = {}
+        self.livres = 0
+        self.echecs = 0
+        self.tours = 0
+
+    def en_reprise(self, maintenant):
+        """Chambres dont le prochain essai n'est pas encore venu"""
+        return [chambre_id for chambre_id, (_, prochain) in self._reprises.items() if prochain > maintenant]
+
+    def lire(self, nom, exclues=()):
+        """[(événement, réservation)] en attente d'une partition, dans l'ordre des événements.
+
+        Les chambres exclues (en reprise) sont écartées par la requête: elles n'occupent pas
+        le lot et ne retardent pas les autres chambres. Lot plein: seuls les événements jusqu'au
+        dernier document lu sont gardés, tous leurs prédécesseurs d'une même chambre sont alors dans le lot"""
+        filtre = dict(FILTRE_EN_ATTENTE, chambre_id={"$nin": list(exclues)}) if exclues else FILTRE_EN_ATTENTE
+        documents = list(self.collections[nom].find(filtre, {CHAMP: 1, "chambre_id": 1, "id_agence": 1})
+                         .sort(f"{CHAMP}._id", ASCENDING).limit(self.taille_lot))
+        borne = min(e['_id'] for e in documents[-1][CHAMP]) if len(documents) == self.taille_lot else None
+        lus = [(e, document) for document in documents for e in document[CHAMP] if borne is None or e['_id'] <= borne]
+        lus.sort(key=lambda lu: lu[0]['_id'])
+        return lus
+
+    def chambres_occupees(self, nom, chambres):
+        """Parmi chambres, celles qu'une réservation en cours de la partition occupe encore"""
+        return set(self.collections[nom].distinct("chambre_id", {"chambre_id": {"$in": chambres}, "statut": "en cours"}))
+
+    def livrer_lot(self):
+        """Un tour de livraison sur toutes les partitions; renvoie le nombre d'événements livrés"""
+        self.tours += 1
+        maintenant = time.monotonic()
+        exclues = self.en_reprise(maintenant)
+        par_chambre = {}
+        for nom in self.collections:
+            for e, document in self.lire(nom, exclues):
+                par_chambre.setdefault(document['chambre_id'], []).append((nom, document, e))
+
+        par_partition = {}
+        for chambre_id, evenements in par_chambre.items():
+            par_partition.setdefault(evenements[-1][0], []).append(chambre_id)
+        occupees = set()
+        for nom, chambres in par_partition.items():
+            occupees |= self.chambres_occupees(nom, chambres)
+
+        groupes = {}
+        for chambre_id, evenements in par_chambre.items():
+            _, document, _ = evenements[-1]
+            groupes.setdefault((document.get('id_agence'), chambre_id not in occupees), []).append(chambre_id)
+
+        livres = []
+        for (agence, disponible), chambres in groupes.items():
+            chambres.sort()
+            try:
+                ok = self.envoyer(chambres, disponible, agence)
+            except Exception as e:
+                traces.evenement(journal, logging.WARNING, "livraison boite d'envoi en echec",
+                                 agence=agence, chambres=len(chambres), erreur=str(e))
+                ok = False
+            for chambre_id in chambres:
+                if ok:
+                    self._reprises.pop(chambre_id, None)
+                    livres.extend(par_chambre[chambre_id])
+                else:
+                    echecs = self._reprises.get(chambre_id, (0, 0.0))[0] + 1
+                    self._reprises[chambre_id] = (echecs, maintenant + min(DELAI_REPRISE_MAX, 0.5 * 2 ** echecs))
+            if not ok:
+                self.echecs += 1
+        self.acquitter(livres)
+        self.livres += len(livres)
+        return len(livres)
+
+    def acquitter(self, livres):
+        """Retire les événements livrés (deux écritures par partition); le champ disparaît
+        des réservations dont la boîte d'envoi est vide"""
+        par_partition = {}
+        for nom, document, e in livres:
+            documents, evenements = par_partition.setdefault(nom, (set(), []))
+            documents.add(document['_id'])
+            evenements.append(e['_id'])
+        for nom, (documents, evenements) in par_partition.items():
+            collection = self.collections[nom]
+            collection.update_many({"_id": {"$in": list(documents)}}, {"$pull": {CHAMP: {"_id": {"$in": evenements}}}})
+            collection.update_many({"_id": {"$in": list(documents)}, CHAMP: {"$size": 0}}, {"$unset": {CHAMP: ""}})
+
+    def tourner(self, arret, intervalle=INTERVALLE):
+        """Boucle jusqu'à arret.set(): enchaîne les lots tant qu'il y a à livrer"""
+        while not arret.is_set():
+            try:
+                livres = self.livrer_lot()
+            except Exception as e:
+                traces.evenement(journal, logging.ERROR, "tour de la boite d'envoi en echec", erreur=str(e))
+                livres = 0
+            if not livres:
+                arret.wait(intervalle)
+
+    def stats(self):
+        return {
+            "livres": self.livres,
+            "echecs": self.echecs,
+            "tours": self.tours,
+            "chambres_en_reprise": len(self._reprises),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Livreur de la boîte d'envoi des réservations")
+    parser.add_argument('--une-fois', action='store_true', help="vide la boîte d'envoi puis s'arrête")
+    parser.add_argument('--lot', type=int, default=TAILLE_LOT, help="réservations lues par partition et par tour")
+    parser.add_argument('--intervalle', type=float, default=INTERVALLE, help="attente quand rien n'est à livrer (s)")
+    args = parser.parse_args()
+
+    from pymongo import MongoClient
+    import partitions
+
+    clients = {}
+    collections = {}
+    for nom in partitions.table.locales:
+        config = partitions.table.config_mongo(nom)
+        if config['uri'] not in clients:
+            clients[config['uri']] = MongoClient(config['uri'])
+        collections[nom] = clients[config['uri']][config['base']][config['collection']]
+    configuration.a_l_arret(lambda: [client.close() for client in clients.values()])
+
+    livreur = Livreur(collections, taille_lot=args.lot)
+    try:
+        if args.une_fois:
+            while livreur.livrer_lot():
+                pass
+        else:
+            arret = threading.Event()
+            signal.signal(signal.SIGTERM, lambda *_: arret.set())
+            signal.signal(signal.SIGINT, lambda *_: arret.set())
+            print(f"Boîte d'envoi -> partitions {', '.join(collections)}")
+            livreur.tourner(arret, args.intervalle)
+    finally:
+        configuration.arreter()
+    print(f"Boîte d'envoi: {livreur.stats()}")
+
+
+if __name__ == '__main__':
+    main()
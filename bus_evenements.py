@@ -0,0 +1,145 @@
+"""Bus d'événements en mémoire et flux Server-Sent Events.
+
+Chaque service publie ses changements (réservation créée ou changée de statut,
+disponibilité de chambres) sur son bus et les diffuse sur GET /evenements.
+La passerelle relaie ces flux vers son propre bus, auquel les navigateurs
+s'abonnent avec EventSource: ils reçoivent des deltas au lieu de recharger la page.
+
+Les identifiants d'événements sont "<époque>-<n>", l'époque changeant à chaque
+démarrage du processus: un Last-Event-ID d'une autre époque, ou trop ancien pour
+le tampon de rejeu, vaut un événement "resynchroniser" (le client recharge).
+"""
+import collections
+import json
+import queue
+import threading
+import uuid
+
+INTERVALLE_BATTEMENT = 15.0
+
+
+class Abonnement:
+    """File bornée d'un abonné; un abonné trop lent est marqué perdu et doit se resynchroniser"""
+
+    def __init__(self, taille_max):
+        self.file = queue.Queue(maxsize=taille_max)
+        self.perdu = False
+
+    def pousser(self, evenement):
+        try:
+            self.file.put_nowait(evenement)
+        except queue.Full:
+            self.perdu = True
+
+
+class BusEvenements:
+    def __init__(self, nom, taille_tampon=1000, taille_file=1000):
+        self.nom = nom
+        self.epoque = uuid.uuid4().hex[:8]
+        self.taille_file = taille_file
+        self._verrou = threading.Lock()
+        self._compteur = 0
+        self._tampon = collections.deque(maxlen=taille_tampon)
+        self._abonnes = set()
+        self.nb_publies = 0
+
+    def publier(self, type_evenement, donnees):
+        with self._verrou:
+            self._compteur += 1
+            evenement = (f"{self.epoque}-{self._compteur}", type_evenement, donnees)
+            self._tampon.append(evenement)
+            self.nb_publies += 1
+            abonnes = list(self._abonnes)
+        for abonnement in abonnes:
+            abonnement.pousser(evenement)
+        return evenement[0]
+
+    def _a_rejouer(self, dernier_id):
+        """Événements publiés après dernier_id, ou None s'il est inconnu (autre époque, trop ancien)"""
+        epoque, _, numero = (dernier_id or "").partition('-')
+        if epoque != self.epoque or not numero.isdigit():
+            return None
+        numero = int(numero)
+        if numero == self._compteur:
+            return []
+        if not self._tampon or int(self._tampon[0][0].split('-')[1]) > numero + 1:
+            return None
+        return [e for e in self._tampon if int(e[0].split('-')[1]) > numero]
+
+    def abonner(self, dernier_id=None):
+        """Renvoie (abonnement, événements à rejouer ou None si resynchronisation nécessaire)"""
+        abonnement = Abonnement(self.taille_file)
+        with self._verrou:
+            rejeu = self._a_rejouer(dernier_id) if dernier_id else []
+            self._abonnes.add(abonnement)
+        return abonnement, rejeu
+
+    def desabonner(self, abonnement):
+        with self._verrou:
+            self._abonnes.discard(abonnement)
+
+    def flux_sse(self, dernier_id=None, battement=INTERVALLE_BATTEMENT):
+        """Générateur de texte SSE pour une réponse Flask en streaming"""
+        abonnement, rejeu = self.abonner(dernier_id)
+        try:
+            yield f"retry: 3000\n: bus {self.nom}\n\n"
+            if rejeu is None:
+                yield format_sse(f"{self.epoque}-{self._compteur}", "resynchroniser", {})
+            else:
+                for evenement in rejeu:
+                    yield format_sse(*evenement)
+            while not abonnement.perdu:
+                try:
+                    evenement = abonnement.file.get(timeout=battement)
+                except queue.Empty:
+                    yield ": battement\n\n"
+                    continue
+                yield format_sse(*evenement)
+            yield format_sse(f"{self.epoque}-{self._compteur}", "resynchroniser", {})
+        finally:
+            self.desabonner(abonnement)
+
+    def stats(self):
+        with self._verrou:
+            return {
+                "bus": self.nom,
+                "epoque": self.epoque,
+                "publies": self.nb_publies,
+                "abonnes": len(self._abonnes),
+                "tampon": len(self._tampon),
+            }
+
+
+def format_sse(identifiant, type_evenement, donnees):
+    return f"id: {identifiant}\nevent: {type_evenement}\ndata: {json.dumps(donnees, ensure_ascii=False, default=str)}\n\n"
+
+
+def lire_sse(lignes):
+    """Découpe un flux SSE (lignes texte) en (id, type, données)"""
+    identifiant, type_evenement, data = None, "message", []
+    for ligne in lignes:
+        if not ligne:
+            if data:
+                yield identifiant, type_evenement, json.loads("\n".join(data))
+            identifiant, type_evenement, data = None, "message", []
+        elif ligne.startswith(':'):
+            continue
+        else:
+            champ, _, valeur = ligne.partition(':')
+            valeur = valeur[1:] if valeur.startswith(' ') else valeur
+            if champ == 'id':
+                identifiant = valeur
+            elif champ == 'event':
+                type_evenement = valeur
+            elif champ == 'data':
+                data.append(valeur)
+
+
+def reponse_sse(flux):
+    """Réponse Flask en streaming, sans mise en tampon par un proxy"""
+    from flask import Response, stream_with_context
+    return Response(stream_with_context(flux), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+    })
+
@@ -0,0 +1,71 @@
+import threading
+import time
+from collections import OrderedDict
+
+MANQUANT = object()
+
+
+class CacheTTL:
+    """Cache en mémoire avec expiration (TTL) et éviction LRU"""
+
+    def __init__(self, nom, taille_max=1024, ttl=60):
+        self.nom = nom
+        self.taille_max = taille_max
+        self.ttl = ttl
+        self._entrees = OrderedDict()
+        self._verrou = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, cle, defaut=None):
+        with self._verrou:
+            entree = self._entrees.get(cle, MANQUANT)
+            if entree is MANQUANT or entree[1] < time.monotonic():
+                if entree is not MANQUANT:
+                    del self._entrees[cle]
+                self.misses += 1
+                return defaut
+            self._entrees.move_to_end(cle)
+            self.hits += 1
+            return entree[0]
+
+    def set(self, cle, valeur, ttl=None):
+        expiration = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._verrou:
+            self._entrees[cle] = (valeur, expiration)
+            self._entrees.move_to_end(cle)
+            while len(self._entrees) > self.taille_max:
+                self._entrees.popitem(last=False)
+                self.evictions += 1
+
+    def invalider(self, cle=None):
+        """Supprime une entrée, ou tout le cache si cle est None"""
+        with self._verrou:
+            if cle is None:
+                self.invalidations += len(self._entrees)
+                self._entrees.clear()
+            elif self._entrees.pop(cle, MANQUANT) is not MANQUANT:
+                self.invalidations += 1
+
+    def invalider_prefixe(self, prefixe):
+        with self._verrou:
+            for cle in [c for c in self._entrees if isinstance(c, str) and c.startswith(prefixe)]:
+                del self._entrees[cle]
+                self.invalidations += 1
+
+    def stats(self):
+        with self._verrou:
+            total = self.hits + self.misses
+            return {
+                "nom": self.nom,
+                "entrees": len(self._entrees),
+                "taille_max": self.taille_max,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "taux_hit": round(self.hits / total, 3) if total else 0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
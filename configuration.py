@@ -0,0 +1,68 @@
+"""Configuration par variables d'environnement (valeurs par défaut: poste de développement).
+
+    SERVICE_CHAMBRES_URL, SERVICE_CLIENTS_URL, SERVICE_RESERVATIONS_URL   URLs vues par la passerelle
+    MYSQL_HOST, MYSQL_PORT, MYSQL_USER, MYSQL_PASSWORD                    serveur MySQL
+    MYSQL_BASE_CHAMBRES, MYSQL_BASE_CLIENTS                               bases des services
+    MONGO_URI, MONGO_BASE                                                 MongoDB du service réservations
+    PORT_APP_WEB, PORT_CHAMBRES, PORT_CLIENTS, PORT_RESERVATIONS, PORT_DASHBOARD
+    FLASK_DEBUG=1                                                         débogueur Werkzeug (développement seulement)
+
+Tâches d'arrêt: chaque module qui tient des ressources (pools, clients, threads de
+fond) les enregistre avec a_l_arret(); le serveur de production les exécute à
+l'arrêt propre de chaque worker.
+"""
+import logging
+import os
+
+import traces
+
+PORTS_DEFAUT = {
+    'app_web': 5000,
+    'chambres': 5001,
+    'clients': 5002,
+    'reservations': 5003,
+    'dashboard': 5005,
+}
+
+SERVICES = {
+    nom: os.environ.get(f'SERVICE_{nom.upper()}_URL', f'http://localhost:{PORTS_DEFAUT[nom]}').rstrip('/')
+    for nom in ('chambres', 'clients', 'reservations')
+}
+
+MONGO_URI = os.environ.get('MONGO_URI', 'mongodb://localhost:27017/')
+MONGO_BASE = os.environ.get('MONGO_BASE', 'hotel_reservations')
+
+DEBUG = os.environ.get('FLASK_DEBUG') == '1'
+
+_taches_arret = []
+
+
+def port(nom):
+    return int(os.environ.get(f'PORT_{nom.upper()}', PORTS_DEFAUT[nom]))
+
+
+def config_mysql(service):
+    """Paramètres mysql.connector de la base d'un service ('chambres', 'clients')"""
+    return {
+        'host': os.environ.get('MYSQL_HOST', 'localhost'),
+        'port': int(os.environ.get('MYSQL_PORT', 3306)),
+        'user': os.environ.get('MYSQL_USER', 'root'),
+        'password': os.environ.get('MYSQL_PASSWORD', ''),
+        'database': os.environ.get(f'MYSQL_BASE_{service.upper()}', f'service_{service}'),
+    }
+
+
+def a_l_arret(tache):
+    """Enregistre une tâche de libération (appelée sans argument, dans l'ordre inverse)"""
+    _taches_arret.append(tache)
+    return tache
+
+
+def arreter():
+    """Exécute les tâches d'arrêt; une tâche en échec n'empêche pas les suivantes"""
+    while _taches_arret:
+        tache = _taches_arret.pop()
+        try:
+            tache()
+        except Exception as e:
+            traces.evenement(traces.journal(__name__), logging.WARNING, "tache d'arret en echec", erreur=str(e))
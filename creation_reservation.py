@@ -0,0 +1,52 @@
+"""Réservation côté passerelle: création idempotente, rejouée sur erreur transitoire.
+
+Une seule écriture, côté service réservations: son calendrier refuse les séjours qui
+se chevauchent (409) et la même écriture dépose l'occupation de la chambre dans sa
+boîte d'envoi (voir boite_envoi.py). Rien à bloquer ni à compenser ici."""
+import time
+import uuid
+
+import requests
+
+import passerelle_http
+
+TENTATIVES_CREATION = 3
+
+
+class EchecCreation(Exception):
+    def __init__(self, message, code=500):
+        super().__init__(message)
+        self.message = message
+        self.code = code
+
+
+def nouvelle_cle():
+    return uuid.uuid4().hex
+
+
+def message_erreur(response):
+    try:
+        return response.json().get("error", "Erreur inconnue")
+    except ValueError:
+        return response.text
+
+
+def creer_avec_reprises(donnees, cle=None):
+    """POST /reserver sur le nœud de l'agence, rejoué sur erreur transitoire: la clé
+    d'idempotence (générée si absente) garantit une seule réservation"""
+    donnees = dict(donnees, cle_idempotence=cle or nouvelle_cle())
+    derniere_erreur = None
+    for tentative in range(TENTATIVES_CREATION):
+        try:
+            response = passerelle_http.post('reservations', 'reserver', agence=donnees.get('id_agence'), json=donnees)
+        except requests.exceptions.RequestException as e:
+            derniere_erreur = EchecCreation(f"Service réservations injoignable: {e}", 503)
+        else:
+            if response.status_code == 200:
+                return response.json()
+            if response.status_code < 500:
+                # Refus métier (400/409): inutile de réessayer
+                raise EchecCreation(message_erreur(response), response.status_code)
+            derniere_erreur = EchecCreation(message_erreur(response), 502)
+        time.sleep(0.1 * 2 ** tentative)
+    raise derniere_erreur
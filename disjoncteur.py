@@ -0,0 +1,83 @@
+import threading
+import time
+
+import requests
+
+FERME = 'ferme'
+OUVERT = 'ouvert'
+SEMI_OUVERT = 'semi-ouvert'
+
+
+class CircuitOuvert(requests.exceptions.ConnectionError):
+    """Appel refusé sans réseau: le disjoncteur du service est ouvert"""
+
+
+class Disjoncteur:
+    """Disjoncteur par service: fermé -> ouvert après N échecs consécutifs,
+    semi-ouvert après le délai (un seul appel d'essai), refermé au premier succès"""
+
+    def __init__(self, nom, seuil_echecs=5, delai_ouverture=10.0):
+        self.nom = nom
+        self.seuil_echecs = seuil_echecs
+        self.delai_ouverture = delai_ouverture
+        self._verrou = threading.Lock()
+        self._etat = FERME
+        self._echecs = 0
+        self._ouvert_depuis = 0.0
+        self._essai_en_cours = False
+        self.nb_refus = 0
+        self.nb_ouvertures = 0
+
+    @property
+    def etat(self):
+        with self._verrou:
+            if self._etat == OUVERT and time.monotonic() - self._ouvert_depuis >= self.delai_ouverture:
+                return SEMI_OUVERT
+            return self._etat
+
+    def autoriser(self):
+        """True si l'appel peut partir; en semi-ouvert, un seul appel d'essai à la fois"""
+        with self._verrou:
+            if self._etat == FERME:
+                return True
+            if self._etat == OUVERT:
+                if time.monotonic() - self._ouvert_depuis < self.delai_ouverture:
+                    self.nb_refus += 1
+                    return False
+                self._etat = SEMI_OUVERT
+            if self._essai_en_cours:
+                self.nb_refus += 1
+                return False
+            self._essai_en_cours = True
+            return True
+
+    def verifier(self):
+        if not self.autoriser():
+            raise CircuitOuvert(f"Service {self.nom} indisponible (disjoncteur ouvert)")
+
+    def succes(self):
+        with self._verrou:
+            self._etat = FERME
+            self._echecs = 0
+            self._essai_en_cours = False
+
+    def echec(self):
+        with self._verrou:
+            self._echecs += 1
+            self._essai_en_cours = False
+            if self._etat == SEMI_OUVERT or self._echecs >= self.seuil_echecs:
+                if self._etat != OUVERT:
+                    self.nb_ouvertures += 1
+                self._etat = OUVERT
+                self._ouvert_depuis = time.monotonic()
+
+    def stats(self):
+        etat = self.etat
+        with self._verrou:
+            return {
+                "service": self.nom,
+                "etat": etat,
+                "echecs_consecutifs": self._echecs,
+                "ouvertures": self.nb_ouvertures,
+                "refus": self.nb_refus,
+            }
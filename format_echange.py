@@ -0,0 +1,153 @@
+"""Format des échanges passerelle <-> services, négocié par l'en-tête Accept.
+
+- application/json (défaut): JSON encodé par orjson s'il est installé; ObjectId,
+  date/datetime (ISO 8601) et Decimal sont convertis par l'encodeur, sans boucle
+  str(_id) dans les routes;
+- application/x-msgpack: MessagePack (si msgpack est installé);
+- application/vnd.hotel.colonnes+json: JSON en colonnes.
+
+MessagePack et le format en colonnes compactent les listes de lignes homogènes
+(mêmes clés) en {"$colonnes": [...], "$lignes": [[...], ...]}: chaque nom de
+colonne n'est transmis qu'une fois. deployer() rétablit les dicts côté passerelle.
+
+La passerelle demande FORMAT_ECHANGE (json, colonnes ou msgpack). Par défaut JSON si
+orjson est installé: c'est le moins coûteux en CPU à encoder et décoder (voir
+benchmarks/comparaison_formats.py), le bon choix sur un même hôte ou un réseau local.
+colonnes ou msgpack divisent les octets par 2 à 4 quand le réseau est le goulot.
+"""
+import datetime
+import decimal
+import json
+import os
+
+from flask import has_request_context, request
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    from bson.objectid import ObjectId
+except ImportError:
+    ObjectId = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+JSON = 'application/json'
+MSGPACK = 'application/x-msgpack'
+COLONNES = 'application/vnd.hotel.colonnes+json'
+FORMATS = (JSON, COLONNES) + ((MSGPACK,) if msgpack is not None else ())
+PREFERES = {'json': JSON, 'colonnes': COLONNES, 'msgpack': MSGPACK}
+# Format demandé par la passerelle (sans orjson, le JSON en colonnes s'encode plus vite)
+FORMAT_PREFERE = PREFERES.get(os.environ.get('FORMAT_ECHANGE') or ('json' if orjson is not None else 'colonnes'), JSON)
+if FORMAT_PREFERE == MSGPACK and msgpack is None:
+    FORMAT_PREFERE = COLONNES
+ACCEPT_COMPACT = JSON if FORMAT_PREFERE == JSON else f"{FORMAT_PREFERE}, {JSON};q=0.5"
+
+CLE_COLONNES, CLE_LIGNES = '$colonnes', '$lignes'
+CONTENEURS = (dict, list, tuple)
+
+
+def defaut(obj):
+    """Types non JSON des services: ObjectId, dates, Decimal"""
+    if ObjectId is not None and isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, (datetime.datetime, datetime.date, datetime.time)):
+        return obj.isoformat()
+    if isinstance(obj, decimal.Decimal):
+        return float(obj)
+    if isinstance(obj, (set, frozenset, tuple)):
+        return list(obj)
+    raise TypeError(f"Type non sérialisable: {type(obj).__name__}")
+
+
+def dumps_json(obj):
+    """JSON en bytes"""
+    if orjson is not None:
+        return orjson.dumps(obj, default=defaut, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, default=defaut, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def loads_json(donnees):
+    if orjson is not None:
+        return orjson.loads(donnees)
+    return json.loads(donnees)
+
+
+def compacter(obj):
+    """Remplace récursivement les listes de dicts aux mêmes clés par colonnes + lignes"""
+    if isinstance(obj, dict):
+        return {cle: compacter(valeur) for cle, valeur in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        if len(obj) > 1 and isinstance(obj[0], dict):
+            cles = obj[0].keys()
+            if all(isinstance(ligne, dict) and ligne.keys() == cles for ligne in obj):
+                colonnes = list(cles)
+                lignes = [[ligne[c] for c in colonnes] for ligne in obj]
+                # Valeurs scalaires (cas courant): pas de parcours récursif cellule par cellule
+                if any(isinstance(valeur, CONTENEURS) for valeur in lignes[0]):
+                    lignes = [[compacter(valeur) for valeur in ligne] for ligne in lignes]
+                return {CLE_COLONNES: colonnes, CLE_LIGNES: lignes}
+        return [compacter(valeur) for valeur in obj]
+    return obj
+
+
+def deployer(obj):
+    """Inverse de compacter()"""
+    if isinstance(obj, dict):
+        if CLE_COLONNES in obj and CLE_LIGNES in obj and len(obj) == 2:
+            colonnes, lignes = obj[CLE_COLONNES], obj[CLE_LIGNES]
+            if lignes and any(isinstance(valeur, (dict, list)) for valeur in lignes[0]):
+                return [dict(zip(colonnes, (deployer(v) for v in ligne))) for ligne in lignes]
+            return [dict(zip(colonnes, ligne)) for ligne in lignes]
+        return {cle: deployer(valeur) for cle, valeur in obj.items()}
+    if isinstance(obj, list):
+        return [deployer(valeur) for valeur in obj]
+    return obj
+
+
+def encoder(obj, format_demande=JSON):
+    """(corps en bytes, type MIME)"""
+    if format_demande == MSGPACK and msgpack is not None:
+        return msgpack.packb(compacter(obj), default=defaut, use_bin_type=True), MSGPACK
+    if format_demande == COLONNES:
+        return dumps_json(compacter(obj)), COLONNES
+    return dumps_json(obj), JSON
+
+
+def decoder(corps, type_contenu):
+    """Données Python d'un corps reçu, selon son Content-Type"""
+    type_contenu = (type_contenu or '').split(';')[0].strip()
+    if type_contenu == MSGPACK:
+        return deployer(msgpack.unpackb(corps, raw=False))
+    if type_contenu == COLONNES:
+        return deployer(loads_json(corps))
+    return loads_json(corps)
+
+
+def format_negocie(accept_mimetypes):
+    """Meilleur format disponible pour l'en-tête Accept de la requête (JSON par défaut)"""
+    return accept_mimetypes.best_match(FORMATS, default=JSON) or JSON
+
+
+class FournisseurEchange(DefaultJSONProvider):
+    """Fournisseur JSON de Flask: jsonify() répond dans le format négocié"""
+
+    def dumps(self, obj, **kwargs):
+        return dumps_json(obj).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return loads_json(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        format_demande = format_negocie(request.accept_mimetypes) if has_request_context() else JSON
+        corps, type_mime = encoder(obj, format_demande)
+        reponse = self._app.response_class(corps, mimetype=type_mime)
+        reponse.vary.add('Accept')
+        return reponse
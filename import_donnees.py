@@ -0,0 +1,521 @@
+"""Import en masse et génération de jeux de données (migration d'un parc hôtelier).
+
+    python import_donnees.py generer --dossier donnees --agences 50 --chambres 100000 --clients 1000000 --reservations 5000000
+    python import_donnees.py charger --dossier donnees --reprise donnees/reprise.json
+    python import_donnees.py charger --chambres chambres.csv --reservations historique.ndjson.gz
+
+Fichiers: CSV avec en-tête (colonnes des tables de scripts.sql) ou NDJSON (.ndjson,
+.jsonl), éventuellement compressés (.gz). Dans --dossier: agences, chambres, clients,
+reservations suivis de l'extension.
+
+Chargement:
+- fichiers lus par lots de --lot lignes (mémoire constante), chaque lot inséré en un
+  INSERT multi-lignes (executemany de mysql.connector) ou un insert_many non ordonné;
+  --load-data envoie les CSV non compressés par LOAD DATA LOCAL INFILE (local_infile=1
+  côté serveur), sauf les chambres réparties sur plusieurs partitions;
+- agences d'abord (clé étrangère des chambres, répliquées dans chaque base chambres),
+  puis chambres, clients et réservations en parallèle, chacune sur ses connexions;
+- chambres et réservations vont à la partition de leur agence (partitions.py);
+  une réservation sans id_agence le reçoit du fichier des chambres s'il est fourni;
+- reprise: --reprise note après chaque lot les lignes validées par table; relancer
+  la même commande repart du dernier lot noté. Un lot rejoué après un arrêt brutal
+  est absorbé par les clés (INSERT IGNORE, index uniques _id / numero_reservation):
+  les identifiants sont alors obligatoires dans les fichiers;
+- le compteur des numéros de réservation est porté au plus grand numéro importé.
+
+Après un import de réservations: redémarrer le service (calendrier des séjours) et
+recalculer les agrégats (python services/analytique.py --recalculer).
+"""
+import argparse
+import csv
+import gzip
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from itertools import islice
+
+RACINE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, RACINE)
+sys.path.insert(0, os.path.join(RACINE, 'services'))
+
+from bson.objectid import ObjectId
+
+import configuration
+import partitions
+from disponibilites import depart_depuis
+from format_echange import dumps_json, loads_json
+
+# Colonnes importables (les colonnes générées, comme client.telephone_normalise, en sont exclues)
+COLONNES = {
+    'agence': ('id_agence', 'localisation', 'nbre_chambres', 'nbre_etages'),
+    'chambre': ('id_chambre', 'type_chambre', 'etage', 'prix', 'disponible', 'id_agence'),
+    'client': ('id_client', 'nom', 'prenom', 'email', 'telephone', 'date_inscription'),
+}
+IDENTIFIANTS = {'agence': 'id_agence', 'chambre': 'id_chambre', 'client': 'id_client'}
+FICHIERS = {'agence': 'agences', 'chambre': 'chambres', 'client': 'clients', 'reservations': 'reservations'}
+EXTENSIONS = ('.csv', '.ndjson', '.jsonl')
+VRAI = ('1', 'true', 'vrai', 'oui')
+TAILLE_LOT = 5000
+
+CHAMPS_ENTIERS = ('client_id', 'chambre_id', 'nuits', 'id_agence')
+NUMERO = re.compile(r'RES(\d+)$')
+
+
+class ErreurImport(Exception):
+    pass
+
+
+# ------------------------------------------------------------------ lecture
+
+def ouvrir(chemin, mode='r'):
+    if chemin.endswith('.gz'):
+        return gzip.open(chemin, mode + 't', encoding='utf-8', newline='')
+    return open(chemin, mode, encoding='utf-8', newline='')
+
+
+def format_fichier(chemin):
+    nom = chemin[:-3] if chemin.endswith('.gz') else chemin
+    extension = os.path.splitext(nom)[1]
+    if extension not in EXTENSIONS:
+        raise ErreurImport(f"{chemin}: extension attendue parmi {', '.join(EXTENSIONS)} (+ .gz)")
+    return 'csv' if extension == '.csv' else 'ndjson'
+
+
+def lire_lignes(chemin):
+    """Un dict par ligne de données, en flux (CSV: chaîne vide -> None)"""
+    with ouvrir(chemin) as fichier:
+        if format_fichier(chemin) == 'csv':
+            for ligne in csv.DictReader(fichier):
+                yield {cle: (valeur if valeur != '' else None) for cle, valeur in ligne.items()}
+        else:
+            for ligne in fichier:
+                if ligne.strip():
+                    yield loads_json(ligne)
+
+
+def par_lots(lignes, taille, debut=0):
+    """(lignes lues après ce lot, lot), en sautant les `debut` premières lignes"""
+    lignes = islice(lignes, debut, None)
+    position = debut
+    while True:
+        lot = list(islice(lignes, taille))
+        if not lot:
+            return
+        position += len(lot)
+        yield position, lot
+
+
+def entete_csv(chemin):
+    """Noms des champs d'un CSV, dans l'ordre du fichier"""
+    with ouvrir(chemin) as fichier:
+        return next(csv.reader(fichier), [])
+
+
+def premiere_ligne(chemin):
+    return next(lire_lignes(chemin), None)
+
+
+def trouver_fichier(dossier, table):
+    for extension in EXTENSIONS:
+        for suffixe in ('', '.gz'):
+            chemin = os.path.join(dossier, FICHIERS[table] + extension + suffixe)
+            if os.path.exists(chemin):
+                return chemin
+    return None
+
+
+# ------------------------------------------------------------------ reprise
+
+class Reprise:
+    """Lignes validées par table, réécrites de façon atomique après chaque lot"""
+
+    def __init__(self, chemin=None):
+        self.chemin = chemin
+        self._verrou = threading.Lock()
+        self.etat = {}
+        if chemin and os.path.exists(chemin):
+            with open(chemin, encoding='utf-8') as fichier:
+                self.etat = json.load(fichier)
+
+    def position(self, table, fichier):
+        """(lignes déjà validées, table terminée) pour ce fichier; (0, False) si autre fichier"""
+        etat = self.etat.get(table)
+        if not etat or etat['fichier'] != os.path.abspath(fichier):
+            return 0, False
+        return etat['lignes'], etat['termine']
+
+    def noter(self, table, fichier, lignes, termine=False):
+        with self._verrou:
+            self.etat[table] = {"fichier": os.path.abspath(fichier), "lignes": lignes, "termine": termine}
+            if self.chemin:
+                temporaire = self.chemin + '.tmp'
+                with open(temporaire, 'w', encoding='utf-8') as sortie:
+                    json.dump(self.etat, sortie, indent=2)
+                os.replace(temporaire, self.chemin)
+
+
+# ------------------------------------------------------------------ MySQL
+
+def ouvrir_pools(load_data=False):
+    """{'chambres': {partition: pool}, 'clients': pool}, toutes partitions confondues"""
+    from pool_mysql import PoolMySQL
+
+    options = {'allow_local_infile': True} if load_data else {}
+    pools = {
+        'chambres': {nom: PoolMySQL(dict(partitions.table.config_mysql('chambres', nom), **options), taille=2)
+                     for nom in partitions.table.partitions},
+        'clients': PoolMySQL(dict(configuration.config_mysql('clients'), **options), taille=2),
+    }
+    configuration.a_l_arret(lambda: [pool.fermer() for pool in [*pools['chambres'].values(), pools['clients']]])
+    return pools
+
+
+def colonnes_fichier(table, ligne, reprise):
+    """Colonnes de la table présentes dans le fichier, dans l'ordre du schéma"""
+    inconnues = set(ligne) - set(COLONNES[table])
+    if inconnues:
+        raise ErreurImport(f"{table}: colonnes inconnues {sorted(inconnues)}")
+    if reprise and IDENTIFIANTS[table] not in ligne:
+        raise ErreurImport(f"{table}: {IDENTIFIANTS[table]} requis pour un import avec reprise")
+    return [colonne for colonne in COLONNES[table] if colonne in ligne]
+
+
+def valeurs(ligne, colonnes):
+    if 'disponible' in ligne and isinstance(ligne['disponible'], str):
+        ligne['disponible'] = ligne['disponible'].strip().lower() in VRAI
+    return tuple(ligne.get(colonne) for colonne in colonnes)
+
+
+def inserer_mysql(pool, table, colonnes, lignes):
+    """Un INSERT multi-lignes (réécriture de executemany), clés déjà présentes ignorées"""
+    requete = (f"INSERT IGNORE INTO {table} ({', '.join(colonnes)}) "
+               f"VALUES ({', '.join(['%s'] * len(colonnes))})")
+    with pool.curseur(dictionary=False) as (conn, cursor):
+        cursor.executemany(requete, [valeurs(ligne, colonnes) for ligne in lignes])
+        conn.commit()
+
+
+def load_data(pool, table, colonnes, chemin):
+    """LOAD DATA LOCAL INFILE du CSV entier (vide -> NULL, booléens texte convertis).
+    Les champs sont associés par position: les variables suivent l'en-tête du fichier"""
+    champs = entete_csv(chemin)
+    if sorted(champs) != sorted(colonnes):
+        raise ErreurImport(f"{table}: en-tête {champs} différent des colonnes {colonnes}")
+    affectations = []
+    for colonne in colonnes:
+        if colonne == 'disponible':
+            affectations.append(f"disponible = LOWER(NULLIF(@disponible, '')) IN ({', '.join(repr(v) for v in VRAI)})")
+        else:
+            affectations.append(f"{colonne} = NULLIF(@{colonne}, '')")
+    requete = (f"LOAD DATA LOCAL INFILE %s IGNORE INTO TABLE {table} CHARACTER SET utf8mb4 "
+               "FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '\"' LINES TERMINATED BY '\\n' IGNORE 1 LINES "
+               f"({', '.join('@' + champ for champ in champs)}) SET {', '.join(affectations)}")
+    with pool.curseur(dictionary=False) as (conn, cursor):
+        cursor.execute(requete, (os.path.abspath(chemin),))
+        lignes = cursor.rowcount
+        conn.commit()
+    return lignes
+
+
+def charger_table_mysql(table, chemin, pools, reprise, taille_lot, avec_load_data=False):
+    """Charge agences (toutes les bases chambres), chambres (base de leur partition) ou clients"""
+    premiere = premiere_ligne(chemin)
+    if premiere is None:
+        return 0
+    colonnes = colonnes_fichier(table, premiere, reprise.chemin)
+    cibles = pools['clients'] if table == 'client' else pools['chambres']
+
+    debut, termine = reprise.position(table, chemin)
+    if termine:
+        return 0
+    routage = table == 'chambre' and len(cibles) > 1
+    if avec_load_data and format_fichier(chemin) == 'csv' and not chemin.endswith('.gz') and not routage:
+        # LOAD DATA ne se découpe pas en lots: fichier entier, rejouable grâce à IGNORE
+        lignes = 0
+        for pool in (cibles.values() if isinstance(cibles, dict) else [cibles]):
+            lignes = load_data(pool, table, colonnes, chemin)
+        reprise.noter(table, chemin, lignes, termine=True)
+        return lignes
+
+    position = debut
+    for position, lot in par_lots(lire_lignes(chemin), taille_lot, debut):
+        if table == 'client':
+            inserer_mysql(cibles, table, colonnes, lot)
+        elif table == 'agence':
+            for pool in cibles.values():
+                inserer_mysql(pool, table, colonnes, lot)
+        else:
+            par_partition = {}
+            for ligne in lot:
+                par_partition.setdefault(partitions.table.partition(ligne.get('id_agence')), []).append(ligne)
+            for nom, lignes in par_partition.items():
+                inserer_mysql(cibles[nom], table, colonnes, lignes)
+        reprise.noter(table, chemin, position)
+    reprise.noter(table, chemin, position, termine=True)
+    return position - debut
+
+
+# ------------------------------------------------------------------ MongoDB
+
+def ouvrir_mongo():
+    """(collections des réservations par partition, compteurs de la base principale)"""
+    from pymongo import ASCENDING, MongoClient
+
+    clients = {}
+    configuration.a_l_arret(lambda: [client.close() for client in clients.values()])
+
+    def client(uri):
+        if uri not in clients:
+            clients[uri] = MongoClient(uri)
+        return clients[uri]
+
+    collections = {}
+    for nom in partitions.table.partitions:
+        config = partitions.table.config_mongo(nom)
+        collections[nom] = client(config['uri'])[config['base']][config['collection']]
+        # Même index unique que le service: un lot rejoué n'insère pas de doublons
+        collections[nom].create_index([("numero_reservation", ASCENDING)], name="numero_reservation", unique=True)
+    compteurs = client(configuration.MONGO_URI)[configuration.MONGO_BASE]['compteurs']
+    return collections, compteurs
+
+
+def lire_catalogue(chemin):
+    """{id_chambre: (id_agence, type_chambre)} depuis le fichier des chambres"""
+    catalogue = {}
+    for ligne in lire_lignes(chemin):
+        agence = ligne.get('id_agence')
+        catalogue[int(ligne['id_chambre'])] = (int(agence) if agence is not None else None, ligne.get('type_chambre'))
+    return catalogue
+
+
+def document_reservation(ligne, catalogue=None):
+    """Document réservation au format du service (entiers, dates de séjour, statut)"""
+    document = {champ: valeur for champ, valeur in ligne.items() if valeur is not None}
+    for champ in CHAMPS_ENTIERS:
+        if champ in document:
+            document[champ] = int(document[champ])
+    if 'prix_total' in document:
+        document['prix_total'] = float(document['prix_total'])
+    if isinstance(document.get('_id'), str):
+        document['_id'] = ObjectId(document['_id'])
+    if catalogue and document.get('chambre_id') in catalogue and 'id_agence' not in document:
+        document['id_agence'], document['type_chambre'] = catalogue[document['chambre_id']]
+    document.setdefault('nuits', 1)
+    document.setdefault('statut', 'en cours')
+    if document.get('date_arrivee') and not document.get('date_depart'):
+        document['date_depart'] = depart_depuis(document['date_arrivee'], document['nuits'])
+    document.setdefault('date_reservation', document.get('date_arrivee') or datetime.now().isoformat())
+    return document
+
+
+def inserer_mongo(collection, documents):
+    """insert_many non ordonné; les doublons (lot rejoué) sont ignorés, les autres erreurs remontent"""
+    from pymongo.errors import BulkWriteError
+
+    try:
+        return len(collection.insert_many(documents, ordered=False).inserted_ids)
+    except BulkWriteError as e:
+        autres = [erreur for erreur in e.details.get('writeErrors', []) if erreur.get('code') != 11000]
+        if autres:
+            raise ErreurImport(f"reservations: {len(autres)} erreur(s), ex: {autres[0].get('errmsg')}")
+        return e.details.get('nInserted', 0)
+
+
+def charger_reservations(chemin, mongo, reprise, taille_lot, chemin_chambres=None):
+    collections, compteurs = mongo
+    premiere = premiere_ligne(chemin)
+    if premiere is None:
+        return 0
+    if reprise.chemin and '_id' not in premiere and 'numero_reservation' not in premiere:
+        raise ErreurImport("reservations: _id ou numero_reservation requis pour un import avec reprise")
+    debut, termine = reprise.position('reservations', chemin)
+    if termine:
+        return 0
+    catalogue = lire_catalogue(chemin_chambres) if chemin_chambres and 'id_agence' not in premiere else None
+
+    position = debut
+    for position, lot in par_lots(lire_lignes(chemin), taille_lot, debut):
+        par_partition = {}
+        numero_max = 0
+        for ligne in lot:
+            document = document_reservation(ligne, catalogue)
+            numero = NUMERO.match(str(document.get('numero_reservation', '')))
+            if numero:
+                numero_max = max(numero_max, int(numero.group(1)))
+            par_partition.setdefault(partitions.table.partition(document.get('id_agence')), []).append(document)
+        for nom, documents in par_partition.items():
+            inserer_mongo(collections[nom], documents)
+        if numero_max:
+            # Les numéros tirés ensuite par le service suivent les numéros importés
+            compteurs.update_one({"_id": "numero_reservation"}, {"$max": {"valeur": numero_max}}, upsert=True)
+        reprise.noter('reservations', chemin, position)
+    reprise.noter('reservations', chemin, position, termine=True)
+    return position - debut
+
+
+def charger(fichiers, reprise, taille_lot=TAILLE_LOT, avec_load_data=False, pools=None, mongo=None):
+    """Charge les fichiers {table: chemin}; renvoie {table: (lignes, secondes)}"""
+    if any(table in fichiers for table in COLONNES):
+        pools = pools or ouvrir_pools(avec_load_data)
+    if 'reservations' in fichiers:
+        mongo = mongo or ouvrir_mongo()
+
+    def charger_table(table):
+        debut = time.perf_counter()
+        if table == 'reservations':
+            lignes = charger_reservations(fichiers[table], mongo, reprise, taille_lot, fichiers.get('chambre'))
+        else:
+            lignes = charger_table_mysql(table, fichiers[table], pools, reprise, taille_lot, avec_load_data)
+        return lignes, time.perf_counter() - debut
+
+    resultats = {}
+    if 'agence' in fichiers:
+        resultats['agence'] = charger_table('agence')
+    suivantes = [table for table in ('chambre', 'client', 'reservations') if table in fichiers]
+    with ThreadPoolExecutor(max_workers=max(1, len(suivantes)), thread_name_prefix='import') as executeur:
+        futures = {table: executeur.submit(charger_table, table) for table in suivantes}
+        resultats.update((table, future.result()) for table, future in futures.items())
+    return resultats
+
+
+# ------------------------------------------------------------------ génération
+
+TYPES_CHAMBRE = ('seul', 'double', 'suite')
+PRIX_TYPE = {'seul': 25000, 'double': 40000, 'suite': 75000}
+VILLES = ('Lomé', 'Aneho', 'Baguida', 'Kpalimé', 'Atakpamé', 'Sokodé', 'Kara', 'Dapaong', 'Tsévié', 'Notsé')
+NOMS = ('Kossi', 'Mensah', 'Agbeto', 'Adjo', 'Gbeckley', 'Abalo', 'Dosseh', 'Folly', 'Gadri', 'Amegah',
+        'Lawson', 'Ayivi', 'Koudjo', 'Tchalla', 'Agbodjan', 'Akakpo', 'Djossou', 'Edoh', 'Houngbo', 'Sossou')
+PRENOMS = ('Abel', 'Jean', 'Afi', 'Koffi', 'Sena', 'Komlan', 'Mawulolo', 'Yawo', 'Akou', 'Essi',
+           'Kodjo', 'Ama', 'Kwami', 'Adjoa', 'Edem', 'Elom', 'Yao', 'Akossiwa', 'Selom', 'Dela')
+# Une réservation par chambre et par créneau de 8 jours: les séjours générés ne se chevauchent pas
+CRENEAU_JOURS = 8
+
+
+def chambre_generee(id_chambre, nb_agences):
+    """(id_agence, type, prix) d'une chambre générée, calculés sans rien garder en mémoire"""
+    type_chambre = TYPES_CHAMBRE[(id_chambre * 7) % 3]
+    return 1 + (id_chambre - 1) % nb_agences, type_chambre, PRIX_TYPE[type_chambre] + 1000 * (id_chambre % 5)
+
+
+def ecrire_csv(chemin, colonnes, lignes):
+    with ouvrir(chemin, 'w') as sortie:
+        ecrivain = csv.writer(sortie, lineterminator='\n')
+        ecrivain.writerow(colonnes)
+        ecrivain.writerows(lignes)
+
+
+def generer(dossier, nb_agences, nb_chambres, nb_clients, nb_reservations, graine=42):
+    """Écrit agences.csv, chambres.csv, clients.csv et reservations.ndjson (identifiants fournis)"""
+    os.makedirs(dossier, exist_ok=True)
+    aleatoire = random.Random(graine)
+    nb_agences = max(1, nb_agences)
+
+    ecrire_csv(os.path.join(dossier, 'agences.csv'), COLONNES['agence'],
+               ((i, f"{VILLES[(i - 1) % len(VILLES)]} {i}", -(-nb_chambres // nb_agences), 5)
+                for i in range(1, nb_agences + 1)))
+
+    def chambres():
+        for i in range(1, nb_chambres + 1):
+            id_agence, type_chambre, prix = chambre_generee(i, nb_agences)
+            yield i, type_chambre, aleatoire.randint(1, 5), prix, 1, id_agence
+
+    ecrire_csv(os.path.join(dossier, 'chambres.csv'), COLONNES['chambre'], chambres())
+
+    inscription = date(2020, 1, 1)
+
+    def clients():
+        for i in range(1, nb_clients + 1):
+            nom, prenom = aleatoire.choice(NOMS), aleatoire.choice(PRENOMS)
+            yield (i, nom, prenom, f"{prenom}.{nom}{i}@exemple.tg".lower(),
+                   f"+228 9{aleatoire.randint(0, 9)} {aleatoire.randint(10, 99)} {aleatoire.randint(10, 99)} "
+                   f"{aleatoire.randint(10, 99)}",
+                   (inscription + timedelta(days=aleatoire.randint(0, 2000))).isoformat())
+
+    ecrire_csv(os.path.join(dossier, 'clients.csv'), COLONNES['client'], clients())
+
+    origine = date(2020, 1, 1)
+    aujourd_hui = date.today()
+    with open(os.path.join(dossier, 'reservations.ndjson'), 'wb') as sortie:
+        for k in range(nb_reservations if nb_chambres else 0):
+            chambre_id = 1 + k % nb_chambres
+            id_agence, type_chambre, prix = chambre_generee(chambre_id, nb_agences)
+            arrivee = origine + timedelta(days=(k // nb_chambres) * CRENEAU_JOURS)
+            nuits = aleatoire.randint(1, CRENEAU_JOURS - 1)
+            depart = arrivee + timedelta(days=nuits)
+            statut = 'en cours' if depart >= aujourd_hui else 'terminée'
+            if aleatoire.random() < 0.1:
+                statut = 'annulée'
+            sortie.write(dumps_json({
+                "numero_reservation": f"RES{k + 1:06d}",
+                "client_id": aleatoire.randint(1, max(1, nb_clients)),
+                "chambre_id": chambre_id,
+                "id_agence": id_agence,
+                "type_chambre": type_chambre,
+                "nuits": nuits,
+                "prix_total": float(prix * nuits),
+                "date_arrivee": arrivee.isoformat(),
+                "date_depart": depart.isoformat(),
+                "date_reservation": f"{(arrivee - timedelta(days=aleatoire.randint(1, 60))).isoformat()}T10:00:00",
+                "statut": statut,
+            }) + b"\n")
+
+
+# ------------------------------------------------------------------ ligne de commande
+
+def main():
+    parser = argparse.ArgumentParser(description="Import en masse et génération de jeux de données")
+    commandes = parser.add_subparsers(dest='commande', required=True)
+
+    generation = commandes.add_parser('generer', help="écrit un jeu de données synthétique")
+    generation.add_argument('--dossier', required=True)
+    generation.add_argument('--agences', type=int, default=20)
+    generation.add_argument('--chambres', type=int, default=2000)
+    generation.add_argument('--clients', type=int, default=20000)
+    generation.add_argument('--reservations', type=int, default=200000)
+    generation.add_argument('--graine', type=int, default=42)
+
+    chargement = commandes.add_parser('charger', help="charge des fichiers CSV / NDJSON dans MySQL et MongoDB")
+    chargement.add_argument('--dossier', help="dossier contenant agences, chambres, clients, reservations")
+    for table in FICHIERS.values():
+        chargement.add_argument(f'--{table}', metavar='FICHIER')
+    chargement.add_argument('--lot', type=int, default=TAILLE_LOT, help="lignes par lot")
+    chargement.add_argument('--reprise', help="fichier d'état pour reprendre un import interrompu")
+    chargement.add_argument('--load-data', action='store_true', help="LOAD DATA LOCAL INFILE pour les CSV MySQL")
+    args = parser.parse_args()
+
+    if args.commande == 'generer':
+        debut = time.perf_counter()
+        generer(args.dossier, args.agences, args.chambres, args.clients, args.reservations, args.graine)
+        print(f"Jeu de données écrit dans {args.dossier} en {time.perf_counter() - debut:.1f}s")
+        return
+
+    fichiers = {}
+    for table, nom in FICHIERS.items():
+        chemin = getattr(args, nom) or (trouver_fichier(args.dossier, table) if args.dossier else None)
+        if chemin:
+            fichiers[table] = chemin
+    if not fichiers:
+        parser.error("aucun fichier à charger (--dossier ou --agences/--chambres/--clients/--reservations)")
+
+    try:
+        resultats = charger(fichiers, Reprise(args.reprise), args.lot, args.load_data)
+    except ErreurImport as e:
+        sys.exit(f"❌ {e}")
+    finally:
+        configuration.arreter()
+    for table, (lignes, duree) in resultats.items():
+        debit = lignes / duree if duree else 0
+        print(f"{FICHIERS[table]:13} {lignes:>10} lignes en {duree:7.1f}s ({debit * 60:,.0f} lignes/min)")
+    if 'reservations' in resultats:
+        print("Réservations importées: redémarrer le service réservations et lancer "
+              "python services/analytique.py --recalculer")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+"""Partitionnement des données par agence: table de routage id_agence -> partition.
+
+Une partition regroupe des agences et désigne leurs données: base MySQL (schéma
+ou serveur) du service chambres, collection MongoDB du service réservations, et
+nœuds qui les servent (URLs vues par la passerelle). Table lue dans un fichier
+JSON (PARTITIONS):
+
+    {
+      "defaut": "p0",
+      "agences": {"1": "p1", "2": "p1", "3": "p2"},
+      "partitions": {
+        "p0": {},
+        "p1": {"mysql": {"database": "chambres_p1"}, "mongo": {"collection": "reservations_p1"}},
+        "p2": {"mysql": {"host": "mysql-2", "database": "chambres_p2"},
+               "mongo": {"uri": "mongodb://mongo-2:27017/", "base": "hotel_p2"},
+               "services": {"chambres": "http://noeud-2:5001", "reservations": "http://noeud-2:5003"}}
+      }
+    }
+
+Sans fichier: une seule partition "principale" sur les bases de configuration.py.
+Les agences absentes de la table vont dans la partition par défaut.
+
+Un processus de service ne sert que ses partitions locales (PARTITIONS_LOCALES=p1,p2;
+toutes par défaut), chacune avec son propre pool MySQL / sa collection: une agence
+très sollicitée sature le pool de sa partition, pas ceux des autres. Monter en
+charge = déplacer des agences vers une nouvelle partition servie par un nouveau nœud.
+
+Les identifiants (id_chambre, _id) restent uniques d'une partition à l'autre
+(auto_increment_increment/offset par base MySQL, ObjectId côté MongoDB): une
+chambre se localise sans ambiguïté et les listes fusionnées restent triées. La
+table agence (données de référence) est répliquée dans chaque base chambres.
+"""
+import heapq
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from operator import itemgetter
+
+import configuration
+import traces
+
+PARTITION_UNIQUE = 'principale'
+# Services dont les données sont partitionnées (les clients ne le sont pas)
+SERVICES_PARTITIONNES = ('chambres', 'reservations')
+
+
+class PartitionDistante(Exception):
+    """La partition demandée n'est pas servie par ce processus"""
+
+    def __init__(self, partition):
+        super().__init__(f"Partition {partition} non servie par ce nœud")
+        self.partition = partition
+
+
+def lire_table(chemin=None):
+    chemin = chemin or os.environ.get('PARTITIONS')
+    if not chemin:
+        return {"defaut": PARTITION_UNIQUE, "agences": {}, "partitions": {PARTITION_UNIQUE: {}}}
+    with open(chemin, encoding='utf-8') as fichier:
+        return json.load(fichier)
+
+
+class TableRoutage:
+    def __init__(self, description, locales=None):
+        self.partitions = description.get('partitions') or {}
+        self.defaut = description.get('defaut') or next(iter(self.partitions), PARTITION_UNIQUE)
+        self.partitions.setdefault(self.defaut, {})
+        self.agences = {int(agence): nom for agence, nom in (description.get('agences') or {}).items()}
+        inconnues = set(self.agences.values()) - set(self.partitions)
+        if inconnues:
+            raise ValueError(f"Partitions inconnues dans la table de routage: {sorted(inconnues)}")
+        self.locales = [nom for nom in self.partitions if locales is None or nom in locales]
+        if not self.locales:
+            raise ValueError(f"Aucune partition locale parmi {sorted(self.partitions)}")
+
+    def partition(self, id_agence):
+        """Partition d'une agence (None ou inconnue: partition par défaut)"""
+        if id_agence is None:
+            return self.defaut
+        return self.agences.get(int(id_agence), self.defaut)
+
+    def agences_de(self, nom):
+        return sorted(agence for agence, partition in self.agences.items() if partition == nom)
+
+    def config_mysql(self, service, nom):
+        return dict(configuration.config_mysql(service), **self.partitions[nom].get('mysql', {}))
+
+    def config_mongo(self, nom):
+        """{uri, base, collection} des réservations de la partition"""
+        config = self.partitions[nom].get('mongo', {})
+        return {
+            'uri': config.get('uri', configuration.MONGO_URI),
+            'base': config.get('base', configuration.MONGO_BASE),
+            'collection': config.get('collection', 'reservations' if nom == self.defaut else f'reservations_{nom}'),
+        }
+
+    def url(self, service, nom):
+        return (self.partitions[nom].get('services', {}).get(service) or configuration.SERVICES[service]).rstrip('/')
+
+    def noeuds(self, service):
+        """URLs distinctes des nœuds qui servent le service, dans l'ordre des partitions"""
+        if service not in SERVICES_PARTITIONNES:
+            return [configuration.SERVICES[service]]
+        return list(dict.fromkeys(self.url(service, nom) for nom in self.partitions))
+
+    def stats(self):
+        return {
+            "defaut": self.defaut,
+            "locales": self.locales,
+            "partitions": {nom: {"agences": self.agences_de(nom), "locale": nom in self.locales}
+                           for nom in self.partitions},
+        }
+
+
+def _locales_env():
+    brut = os.environ.get('PARTITIONS_LOCALES')
+    return {nom.strip() for nom in brut.split(',') if nom.strip()} if brut else None
+
+
+table = TableRoutage(lire_table(), _locales_env())
+
+# Requêtes en éventail (une par partition ou par nœud)
+_executeur = ThreadPoolExecutor(max_workers=int(os.environ.get('PARTITIONS_THREADS', 16)),
+                                thread_name_prefix='partitions')
+configuration.a_l_arret(lambda: _executeur.shutdown(wait=False))
+
+
+def en_parallele(fonction, elements):
+    """{element: fonction(element)}, en parallèle (appel direct s'il n'y en a qu'un).
+    La première exception levée est propagée."""
+    elements = list(elements)
+    if len(elements) == 1:
+        return {elements[0]: fonction(elements[0])}
+    futures = {element: traces.soumettre(_executeur, fonction, element) for element in elements}
+    return {element: future.result() for element, future in futures.items()}
+
+
+def fusionner(listes, cle, inverse=False, limite=None):
+    """Fusion de listes déjà triées sur `cle` (tri conservé, NULL en tête comme MySQL), tronquée à `limite`"""
+    listes = [liste for liste in listes if liste]
+    if len(listes) == 1:
+        fusion = listes[0]
+    else:
+        valeur = itemgetter(cle)
+        fusion = heapq.merge(*listes, key=lambda ligne: (valeur(ligne) is not None, valeur(ligne)), reverse=inverse)
+    return list(islice(fusion, limite)) if limite else list(fusion)
@@ -0,0 +1,182 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+
+import aiohttp
+
+import configuration
+import format_echange
+import traces
+import vue_reservations
+from passerelle_http import (CACHE_AGENCES, ENDPOINTS_DEFAUT, TAILLE_PAGE, TAILLE_POOL, endpoint_chambres,
+                             fusionner_reponses, noeud_agence, noeuds, outils_noeud, url_service)
+
+# Délai global pour l'ensemble des appels de la page d'accueil
+DELAI_ACCUEIL = float(os.environ.get('PASSERELLE_DELAI_ACCUEIL', 3.0))
+
+journal = traces.journal(__name__)
+
+
+class PasserelleAsync:
+    """Boucle asyncio unique + session aiohttp partagée entre les requêtes Flask"""
+
+    def __init__(self, taille_pool=TAILLE_POOL):
+        self.taille_pool = taille_pool
+        self._boucle = None
+        self._session = None
+        self._verrou = threading.Lock()
+
+    def _demarrer(self):
+        with self._verrou:
+            if self._boucle is not None:
+                return
+            boucle = asyncio.new_event_loop()
+            thread = threading.Thread(target=boucle.run_forever, name="passerelle-async", daemon=True)
+            thread.start()
+
+            async def creer_session():
+                connecteur = aiohttp.TCPConnector(limit_per_host=self.taille_pool, keepalive_timeout=30)
+                return aiohttp.ClientSession(connector=connecteur)
+
+            self._session = asyncio.run_coroutine_threadsafe(creer_session(), boucle).result()
+            self._boucle = boucle
+
+    def executer(self, coro, timeout=None):
+        """Exécute une coroutine sur la boucle partagée depuis un thread Flask"""
+        self._demarrer()
+        correlation, spans = traces.CORRELATION.get(), traces.SPANS.get()
+
+        async def dans_le_contexte():
+            # Les tâches créées par la coroutine héritent de la corrélation et des spans de l'appelant
+            traces.CORRELATION.set(correlation)
+            traces.SPANS.set(spans)
+            return await coro
+
+        return asyncio.run_coroutine_threadsafe(dans_le_contexte(), self._boucle).result(timeout)
+
+    async def _get_json(self, service_name, endpoint, noeud=None):
+        _, disjoncteur = outils_noeud(service_name, noeud)
+        disjoncteur.verifier()
+        debut = time.perf_counter()
+        try:
+            headers = dict(traces.entetes_propagation(), Accept=format_echange.ACCEPT_COMPACT)
+            async with self._session.get(url_service(service_name, endpoint, noeud), headers=headers) as response:
+                if response.status >= 500:
+                    disjoncteur.echec()
+                else:
+                    disjoncteur.succes()
+                if response.status != 200:
+                    traces.evenement(journal, logging.WARNING, "reponse en erreur",
+                                     service=service_name, endpoint=endpoint, statut=response.status)
+                    return None
+                return format_echange.decoder(await response.read(), response.headers.get('Content-Type'))
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            disjoncteur.echec()
+            raise
+        except asyncio.CancelledError:
+            # Délai global de la page dépassé: le service est lent, l'appel compte comme un échec
+            disjoncteur.echec()
+            raise
+        finally:
+            traces.enregistrer_span('http', time.perf_counter() - debut, service=service_name,
+                                    methode='GET', endpoint=endpoint.split('?')[0])
+
+    async def _get_fusionne(self, service_name, endpoint, cle, inverse=False, limite=None, champ=None):
+        """_get_json sur chaque nœud du service, réponses fusionnées (voir passerelle_http.get_fusionne)"""
+        liste_noeuds = noeuds(service_name)
+        if len(liste_noeuds) == 1:
+            return await self._get_json(service_name, endpoint)
+        resultats = await asyncio.gather(*(self._get_json(service_name, endpoint, noeud) for noeud in liste_noeuds),
+                                         return_exceptions=True)
+        reponses = []
+        for noeud, resultat in zip(liste_noeuds, resultats):
+            if isinstance(resultat, Exception):
+                traces.evenement(journal, logging.WARNING, "noeud injoignable", service=service_name,
+                                 noeud=noeud, endpoint=endpoint, erreur=str(resultat))
+            elif resultat is not None:
+                reponses.append(resultat)
+        return fusionner_reponses(reponses, cle, inverse, limite, champ) if reponses else None
+
+    async def reservations_actives(self, after=None, limit=vue_reservations.TAILLE_PAGE):
+        """Page de réservations actives + recherches groupées clients/chambres"""
+        endpoint = f"reservations/actives?limit={limit}"
+        if after:
+            endpoint += f"&after={after}"
+        page = await self._get_fusionne('reservations', endpoint, '_id', inverse=True, limite=limit, champ='reservations')
+        if page is None:
+            return None
+
+        reservations = page.get('reservations', [])
+        clients_ids, chambres_ids = vue_reservations.ids_references(reservations)
+
+        async def rien():
+            return []
+
+        clients, chambres = await asyncio.gather(
+            self._get_json('clients', vue_reservations.endpoint_jointure('clients', clients_ids)) if clients_ids else rien(),
+            self._get_fusionne('chambres', vue_reservations.endpoint_jointure('chambres', chambres_ids), 'id_chambre')
+            if chambres_ids else rien(),
+        )
+        return {
+            "reservations": vue_reservations.enrichir(reservations, clients, chambres),
+            "next": page.get('next')
+        }
+
+    async def recuperer_plusieurs(self, appels, delai):
+        """Lance les appels en parallèle; ceux qui dépassent le délai valent None"""
+        taches = {
+            cle: asyncio.ensure_future(
+                appel if asyncio.iscoroutine(appel) else self._get_json(*appel)
+            )
+            for cle, appel in appels.items()
+        }
+        termines, en_retard = await asyncio.wait(taches.values(), timeout=delai)
+        for tache in en_retard:
+            tache.cancel()
+
+        resultats = {}
+        for cle, tache in taches.items():
+            if tache in termines and not tache.cancelled() and tache.exception() is None:
+                resultats[cle] = tache.result()
+            else:
+                if tache in termines and tache.exception() is not None:
+                    traces.evenement(journal, logging.WARNING, "appel en echec",
+                                     appel=cle, erreur=str(tache.exception()))
+                resultats[cle] = None
+        return resultats
+
+    def donnees_accueil(self, after=None, chambres_apres=None, agence=None, delai=DELAI_ACCUEIL):
+        agences = CACHE_AGENCES.get('agences')
+        chambres = endpoint_chambres(chambres_apres, agence)
+
+        async def toutes():
+            appels = {
+                'chambres': (('chambres', chambres, noeud_agence('chambres', agence)) if agence is not None
+                             else self._get_fusionne('chambres', chambres, 'id_chambre', limite=TAILLE_PAGE)),
+                'clients': ('clients', ENDPOINTS_DEFAUT['clients']),
+                'reservations': self.reservations_actives(after),
+            }
+            if agences is None:
+                appels['agences'] = ('chambres', 'agences')
+            return await self.recuperer_plusieurs(appels, delai)
+
+        donnees = self.executer(toutes(), timeout=delai + 1)
+        if agences is None:
+            if donnees['agences'] is not None:
+                CACHE_AGENCES.set('agences', donnees['agences'])
+        else:
+            donnees['agences'] = agences
+        return donnees
+
+    def fermer(self):
+        if self._boucle is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._session.close(), self._boucle).result()
+        self._boucle.call_soon_threadsafe(self._boucle.stop)
+        self._boucle = None
+
+
+passerelle = PasserelleAsync()
+configuration.a_l_arret(passerelle.fermer)
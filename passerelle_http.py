@@ -0,0 +1,320 @@
+import json
+import logging
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import configuration
+import format_echange
+import partitions
+import traces
+from cache_ttl import CacheTTL
+from disjoncteur import Disjoncteur
+
+# URLs des services (SERVICE_<NOM>_URL); nœuds des partitions: voir partitions.py
+SERVICES = configuration.SERVICES
+
+journal = traces.journal(__name__)
+
+# Taille du pool de connexions keep-alive par service
+TAILLE_POOL = int(os.environ.get('PASSERELLE_TAILLE_POOL', 20))
+
+# Endpoints par défaut: une page bornée et seulement les colonnes affichées
+TAILLE_PAGE = int(os.environ.get('PASSERELLE_TAILLE_PAGE', 200))
+ENDPOINTS_DEFAUT = {
+    'chambres': f"chambres?limit={TAILLE_PAGE}&fields=id_chambre,type_chambre,etage,prix,disponible,id_agence",
+    'clients': f"clients?limit={TAILLE_PAGE}&fields=id_client,nom,prenom,email,telephone",
+    'reservations': f"reservations?limit={TAILLE_PAGE}",
+}
+
+
+def endpoint_chambres(after=None, agence=None):
+    """Page de chambres de la page d'accueil: curseur ?after= et filtre ?agence= facultatifs"""
+    endpoint = ENDPOINTS_DEFAUT['chambres']
+    if after is not None:
+        endpoint += f"&after={after}"
+    if agence is not None:
+        endpoint += f"&agence={agence}"
+    return endpoint
+
+
+CHAMPS_JOINTURE = {
+    'clients': "id_client,nom,prenom",
+    'chambres': "id_chambre,type_chambre",
+}
+
+# Caches de la passerelle: données de référence (agences, attributs statiques des
+# chambres) séparées du drapeau volatil "disponible", et ETags des listes
+CACHE_AGENCES = CacheTTL('agences', taille_max=1, ttl=int(os.environ.get('CACHE_TTL_AGENCES', 300)))
+CACHE_CATALOGUE = CacheTTL('catalogue_chambres', taille_max=10000, ttl=int(os.environ.get('CACHE_TTL_CATALOGUE', 600)))
+CACHE_ETAGS = CacheTTL('etags', taille_max=256, ttl=3600)
+CHAMPS_STATIQUES_CHAMBRE = ('id_chambre', 'type_chambre', 'etage', 'prix', 'id_agence')
+
+# Timeouts (connexion, lecture) en secondes, par endpoint
+TIMEOUT_DEFAUT = (1.0, 5.0)
+TIMEOUTS = {
+    'health': (0.5, 2.0),
+    'chambres': (1.0, 5.0),
+    'clients': (1.0, 5.0),
+    'reservations': (1.0, 5.0),
+    'agences': (1.0, 5.0),
+    'chambre': (1.0, 3.0),
+    'reserver': (1.0, 10.0),
+    'statut': (1.0, 8.0),
+    'disponible': (1.0, 5.0),
+}
+
+
+def _nouvelle_session():
+    """Session keep-alive avec retry + backoff uniquement pour les GET"""
+    session = requests.Session()
+    retry = Retry(
+        total=2,
+        connect=2,
+        read=1,
+        backoff_factor=0.1,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset(['GET']),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=TAILLE_POOL, max_retries=retry)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def _nouveau_disjoncteur(nom):
+    return Disjoncteur(
+        nom,
+        seuil_echecs=int(os.environ.get('DISJONCTEUR_SEUIL', 5)),
+        delai_ouverture=float(os.environ.get('DISJONCTEUR_DELAI', 10.0)),
+    )
+
+
+SESSIONS = {nom: _nouvelle_session() for nom in SERVICES}
+
+# Un disjoncteur par nœud: un nœud mort échoue immédiatement au lieu d'attendre le timeout,
+# sans couper les agences servies par les autres nœuds
+DISJONCTEURS = {nom: _nouveau_disjoncteur(nom) for nom in SERVICES}
+_verrou_noeuds = threading.Lock()
+
+
+def cle_noeud(service_name, noeud=None):
+    """Clé des sessions et disjoncteurs: le nom du service pour son nœud principal, "service@url" sinon"""
+    return service_name if noeud is None or noeud == SERVICES[service_name] else f"{service_name}@{noeud}"
+
+
+def outils_noeud(service_name, noeud=None):
+    """(session, disjoncteur) du nœud, créés au premier appel"""
+    cle = cle_noeud(service_name, noeud)
+    if cle not in SESSIONS:
+        with _verrou_noeuds:
+            if cle not in SESSIONS:
+                DISJONCTEURS[cle] = _nouveau_disjoncteur(cle)
+                SESSIONS[cle] = _nouvelle_session()
+    return SESSIONS[cle], DISJONCTEURS[cle]
+
+
+def noeuds(service_name):
+    """URLs des nœuds du service (une seule sans partitionnement)"""
+    return partitions.table.noeuds(service_name)
+
+
+def noeud_agence(service_name, agence):
+    """Nœud qui sert la partition de l'agence (None: nœud principal)"""
+    if agence is None or service_name not in partitions.SERVICES_PARTITIONNES:
+        return None
+    return partitions.table.url(service_name, partitions.table.partition(agence))
+
+
+def timeout_pour(endpoint):
+    """Choisit le timeout d'après le premier ou le dernier segment de l'endpoint"""
+    segments = [s for s in endpoint.split('?')[0].split('/') if s]
+    for segment in (segments[-1:] + segments[:1]) if segments else []:
+        if segment in TIMEOUTS:
+            return TIMEOUTS[segment]
+    return TIMEOUT_DEFAUT
+
+
+def url_service(service_name, endpoint="", noeud=None):
+    base = noeud or SERVICES[service_name]
+    endpoint = endpoint.lstrip('/')
+    return f"{base}/{endpoint}" if endpoint else base
+
+
+def entetes(supplement=None):
+    """En-têtes sortants: identifiant de corrélation de la requête en cours"""
+    headers = traces.entetes_propagation()
+    if supplement:
+        headers.update(supplement)
+    return headers
+
+
+def requete(methode, service_name, endpoint="", timeout=None, headers=None, disjoncteur=True,
+            agence=None, noeud=None, **kwargs):
+    """Envoie une requête via la session persistante du nœud (celui de l'agence si elle est donnée).
+
+    Protégée par le disjoncteur du nœud (CircuitOuvert si ouvert): une erreur
+    réseau ou une réponse 5xx compte comme un échec.
+    """
+    if timeout is None:
+        timeout = timeout_pour(endpoint)
+    noeud = noeud or noeud_agence(service_name, agence)
+    session, disjoncteur_noeud = outils_noeud(service_name, noeud)
+    if disjoncteur:
+        disjoncteur_noeud.verifier()
+    try:
+        with traces.span('http', service=service_name, methode=methode, endpoint=endpoint.split('?')[0]):
+            response = session.request(methode, url_service(service_name, endpoint, noeud), timeout=timeout,
+                                        headers=entetes(headers), **kwargs)
+    except requests.exceptions.RequestException:
+        if disjoncteur:
+            disjoncteur_noeud.echec()
+        raise
+    if disjoncteur:
+        if response.status_code >= 500:
+            disjoncteur_noeud.echec()
+        else:
+            disjoncteur_noeud.succes()
+    return response
+
+
+def get(service_name, endpoint="", **kwargs):
+    return requete('GET', service_name, endpoint, **kwargs)
+
+
+def post(service_name, endpoint="", **kwargs):
+    return requete('POST', service_name, endpoint, **kwargs)
+
+
+def put(service_name, endpoint="", **kwargs):
+    return requete('PUT', service_name, endpoint, **kwargs)
+
+
+def requete_premier_noeud(methode, service_name, endpoint="", **kwargs):
+    """Requête sur une ressource dont on ignore l'agence: les nœuds sont essayés dans l'ordre
+    jusqu'à une réponse autre que 404"""
+    response = None
+    for noeud in noeuds(service_name):
+        response = requete(methode, service_name, endpoint, noeud=noeud, **kwargs)
+        if response.status_code != 404:
+            return response
+    return response
+
+
+def decoder(response):
+    """Corps décodé selon le format renvoyé par le service (JSON, colonnes, MessagePack)"""
+    return format_echange.decoder(response.content, response.headers.get('Content-Type'))
+
+
+def get_compact(service_name, endpoint="", headers=None, **kwargs):
+    """GET d'une lecture volumineuse: le service répond dans le format préféré (FORMAT_ECHANGE)"""
+    return get(service_name, endpoint, headers=dict(headers or {}, Accept=format_echange.ACCEPT_COMPACT), **kwargs)
+
+
+def get_conditionnel(service_name, endpoint="", agence=None, noeud=None, **kwargs):
+    """GET avec If-None-Match: un 304 renvoie la donnée déjà connue. Renvoie (status, données)"""
+    noeud = noeud or noeud_agence(service_name, agence)
+    cle = f"{service_name}:{endpoint}"
+    if cle_noeud(service_name, noeud) != service_name:
+        cle += f"@{noeud}"
+    connu = CACHE_ETAGS.get(cle)
+    headers = {'If-None-Match': connu[0]} if connu else {}
+    response = get_compact(service_name, endpoint, headers=headers, noeud=noeud, **kwargs)
+    if response.status_code == 304 and connu:
+        return 200, connu[1]
+    if response.status_code != 200:
+        return response.status_code, None
+    donnees = decoder(response)
+    etag = response.headers.get('ETag')
+    if etag:
+        CACHE_ETAGS.set(cle, (etag, donnees))
+    return 200, donnees
+
+
+def fusionner_reponses(reponses, cle, inverse=False, limite=None, champ=None):
+    """Réponses de plusieurs nœuds: listes triées sur `cle`, ou pages {champ: [...], "next": curseur}"""
+    if champ is None:
+        return partitions.fusionner(reponses, cle, inverse=inverse, limite=limite)
+    lignes = partitions.fusionner([page.get(champ) or [] for page in reponses], cle, inverse=inverse, limite=limite)
+    return {champ: lignes, "next": lignes[-1][cle] if limite and len(lignes) == limite else None}
+
+
+def get_fusionne(service_name, endpoint, cle, inverse=False, limite=None, champ=None):
+    """get_conditionnel sur chaque nœud du service, réponses fusionnées sur `cle`. Renvoie (status, données).
+    Un nœud en échec est ignoré (journalisé): les agences des autres nœuds restent servies"""
+    liste_noeuds = noeuds(service_name)
+    if len(liste_noeuds) == 1:
+        return get_conditionnel(service_name, endpoint)
+
+    def lire(noeud):
+        try:
+            return get_conditionnel(service_name, endpoint, noeud=noeud)
+        except requests.exceptions.RequestException as e:
+            traces.evenement(journal, logging.WARNING, "noeud injoignable", service=service_name,
+                             noeud=noeud, endpoint=endpoint, erreur=str(e))
+            return 503, None
+
+    resultats = list(partitions.en_parallele(lire, liste_noeuds).values())
+    reponses = [donnees for status, donnees in resultats if status == 200]
+    if not reponses:
+        return resultats[0][0], None
+    return 200, fusionner_reponses(reponses, cle, inverse, limite, champ)
+
+
+def memoriser_catalogue(chambres):
+    """Garde les attributs statiques (type, étage, prix, agence) de chaque chambre"""
+    for chambre in chambres or []:
+        if chambre.get('id_chambre') is not None and 'prix' in chambre:
+            CACHE_CATALOGUE.set(chambre['id_chambre'], {k: chambre.get(k) for k in CHAMPS_STATIQUES_CHAMBRE})
+
+
+def invalider_chambre(chambre_id):
+    """Après une écriture de disponibilité: les listes de chambres en cache sont périmées"""
+    CACHE_ETAGS.invalider_prefixe('chambres:chambres')
+    CACHE_ETAGS.invalider(f'chambres:chambre/{chambre_id}')
+    for noeud in noeuds('chambres')[1:]:
+        CACHE_ETAGS.invalider(f'chambres:chambre/{chambre_id}@{noeud}')
+
+
+def stats_caches():
+    return [cache.stats() for cache in (CACHE_AGENCES, CACHE_CATALOGUE, CACHE_ETAGS)]
+
+
+def ouvrir_ndjson(service_name, endpoint, params=None, timeout=(1.0, 30.0), noeud=None):
+    """Ouvre un flux NDJSON: statut vérifié (HTTPError sinon), corps encore à lire"""
+    session, _ = outils_noeud(service_name, noeud)
+    response = session.get(url_service(service_name, endpoint, noeud), params=params, headers=entetes(),
+                           timeout=timeout, stream=True)
+    try:
+        response.raise_for_status()
+    except requests.exceptions.HTTPError:
+        response.close()
+        raise
+    return response
+
+
+def lignes_ndjson(response):
+    """Documents d'un flux ouvert par ouvrir_ndjson, ligne par ligne; la réponse est fermée à la fin"""
+    with response:
+        for ligne in response.iter_lines(chunk_size=64 * 1024):
+            if ligne:
+                yield json.loads(ligne)
+
+
+def lire_ndjson(service_name, endpoint, params=None, timeout=(1.0, 30.0), noeud=None):
+    """Lit un flux NDJSON ligne par ligne sans charger la réponse entière"""
+    yield from lignes_ndjson(ouvrir_ndjson(service_name, endpoint, params, timeout, noeud))
+
+
+def stats_disjoncteurs():
+    return [disjoncteur.stats() for disjoncteur in list(DISJONCTEURS.values())]
+
+
+@configuration.a_l_arret
+def fermer():
+    for session in list(SESSIONS.values()):
+        session.close()
@@ -0,0 +1,97 @@
+"""Relais des flux d'événements des services vers le bus de la passerelle.
+
+Un thread par nœud de service suit GET /evenements (SSE) et republie chaque événement
+sur le bus de app_web, auquel s'abonnent les navigateurs. Les caches de la
+passerelle concernés (listes de chambres) sont invalidés au passage.
+"""
+import logging
+import threading
+
+import requests
+
+import configuration
+import passerelle_http
+import traces
+from bus_evenements import BusEvenements, lire_sse
+
+# Services qui publient des événements
+SERVICES_EVENEMENTS = ('chambres', 'reservations')
+DELAI_RECONNEXION_MAX = 30.0
+
+journal = traces.journal(__name__)
+
+
+class RelaisEvenements:
+    def __init__(self, services=SERVICES_EVENEMENTS):
+        self.bus = BusEvenements('app_web')
+        self.services = services
+        self._verrou = threading.Lock()
+        self._threads = []
+        self._arret = threading.Event()
+        self._derniers_ids = {}
+
+    def _demarrer(self):
+        with self._verrou:
+            if self._threads:
+                return
+            self._arret.clear()
+            for nom in self.services:
+                for noeud in passerelle_http.noeuds(nom):
+                    thread = threading.Thread(target=self._suivre, args=(nom, noeud),
+                                              name=f"relais-{passerelle_http.cle_noeud(nom, noeud)}", daemon=True)
+                    thread.start()
+                    self._threads.append(thread)
+
+    def _suivre(self, nom, noeud=None):
+        """Boucle de lecture du flux d'un nœud, reconnectée avec backoff"""
+        session = requests.Session()
+        source = passerelle_http.cle_noeud(nom, noeud)
+        delai = 0.5
+        while not self._arret.is_set():
+            headers = {'Last-Event-ID': self._derniers_ids[source]} if source in self._derniers_ids else {}
+            try:
+                # Lecture bornée à deux battements: un flux muet est considéré comme coupé
+                with session.get(passerelle_http.url_service(nom, 'evenements', noeud), headers=headers,
+                                 stream=True, timeout=(1.0, 35.0)) as response:
+                    response.raise_for_status()
+                    response.encoding = 'utf-8'
+                    delai = 0.5
+                    for identifiant, type_evenement, donnees in lire_sse(response.iter_lines(decode_unicode=True)):
+                        if self._arret.is_set():
+                            return
+                        self._relayer(source, identifiant, type_evenement, donnees)
+            except (requests.exceptions.RequestException, ValueError) as e:
+                traces.evenement(journal, logging.WARNING, "flux d'evenements coupe", service=source, erreur=str(e))
+            self._arret.wait(delai)
+            delai = min(delai * 2, DELAI_RECONNEXION_MAX)
+
+    def _relayer(self, nom, identifiant, type_evenement, donnees):
+        premiere_connexion = nom not in self._derniers_ids
+        if identifiant:
+            self._derniers_ids[nom] = identifiant
+        if type_evenement == 'resynchroniser':
+            # Service redémarré ou événements perdus: les pages ouvertes doivent se recharger
+            if not premiere_connexion:
+                self.bus.publier('resynchroniser', {"source": nom})
+            return
+        if type_evenement == 'disponibilite':
+            for chambre_id in donnees.get('chambres', []):
+                passerelle_http.invalider_chambre(chambre_id)
+        self.bus.publier(type_evenement, dict(donnees, source=nom))
+
+    def flux_sse(self, dernier_id=None):
+        self._demarrer()
+        return self.bus.flux_sse(dernier_id)
+
+    def stats(self):
+        sources = [passerelle_http.cle_noeud(nom, noeud) for nom in self.services for noeud in passerelle_http.noeuds(nom)]
+        return dict(self.bus.stats(), relais={source: self._derniers_ids.get(source) for source in sources})
+
+    def arreter(self):
+        self._arret.set()
+        with self._verrou:
+            self._threads = []
+
+
+relais = RelaisEvenements()
+configuration.a_l_arret(relais.arreter)
@@ -0,0 +1,150 @@
+"""Surveillance de santé des services par la passerelle.
+
+Un thread de fond sonde chaque nœud de chaque service (voir partitions.py) à
+intervalle régulier et tient une table d'état partagée (en ligne, latence, dernière
+erreur, état du disjoncteur). app_web et le tableau de bord lisent cette table au
+lieu de sonder à chaque requête; une réservation ne dépend que du nœud de son agence.
+"""
+import concurrent.futures
+import logging
+import os
+import threading
+import time
+
+import requests
+
+import configuration
+import passerelle_http
+import traces
+from disjoncteur import OUVERT
+
+INTERVALLE_SONDES = float(os.environ.get('SANTE_INTERVALLE', 5.0))
+
+# Endpoint sondé par service: /health vérifie aussi la base (503 si elle ne répond pas)
+ENDPOINTS_SANTE = {nom: 'health' for nom in passerelle_http.SERVICES}
+
+journal = traces.journal(__name__)
+
+
+class SurveillantSante:
+    """Sondes périodiques en arrière-plan + table d'état partagée entre les threads Flask"""
+
+    def __init__(self, intervalle=INTERVALLE_SONDES):
+        self.intervalle = intervalle
+        self._verrou = threading.Lock()
+        self._thread = None
+        self._arret = threading.Event()
+        # cle_noeud -> ligne: le nom du service pour son nœud principal, "service@url" sinon
+        self._table = {
+            passerelle_http.cle_noeud(nom, noeud): {"service": nom, "noeud": noeud, "en_ligne": None, "latence_ms": None,
+                                                    "verifie_le": None, "erreur": None, "base": None}
+            for nom, noeud in self.noeuds_sondes()
+        }
+
+    @staticmethod
+    def noeuds_sondes():
+        return [(nom, noeud) for nom in passerelle_http.SERVICES for noeud in passerelle_http.noeuds(nom)]
+
+    def _demarrer(self):
+        with self._verrou:
+            if self._thread is not None:
+                return
+            self._arret.clear()
+            self._thread = threading.Thread(target=self._boucle, name="surveillant-sante", daemon=True)
+            self._thread.start()
+
+    def _boucle(self):
+        while not self._arret.is_set():
+            self.sonder_tous()
+            self._arret.wait(self.intervalle)
+
+    def sonder(self, nom, noeud=None):
+        """Sonde un nœud du service (le principal par défaut); le résultat alimente aussi son disjoncteur"""
+        noeud = noeud or passerelle_http.SERVICES[nom]
+        cle = passerelle_http.cle_noeud(nom, noeud)
+        _, disjoncteur = passerelle_http.outils_noeud(nom, noeud)
+        debut = time.perf_counter()
+        erreur = None
+        base = None
+        try:
+            response = passerelle_http.get(nom, ENDPOINTS_SANTE[nom], disjoncteur=False, noeud=noeud,
+                                           timeout=passerelle_http.TIMEOUTS['health'])
+            en_ligne = response.status_code == 200
+            try:
+                corps = response.json()
+                base = {"database": corps.get("database"), "latence_ms": corps.get("latence_ms")}
+                erreur = corps.get("error")
+            except ValueError:
+                pass
+            if not en_ligne and not erreur:
+                erreur = f"Status {response.status_code}"
+        except requests.exceptions.RequestException as e:
+            en_ligne = False
+            erreur = str(e)
+        latence = time.perf_counter() - debut
+
+        if en_ligne:
+            disjoncteur.succes()
+        else:
+            disjoncteur.echec()
+        with self._verrou:
+            precedent = self._table.get(cle, {}).get("en_ligne")
+            self._table[cle] = {
+                "service": nom,
+                "noeud": noeud,
+                "en_ligne": en_ligne,
+                "latence_ms": round(1000 * latence, 1),
+                "verifie_le": time.time(),
+                "erreur": erreur,
+                "base": base,
+            }
+        if precedent is not None and precedent != en_ligne:
+            traces.evenement(journal, logging.WARNING if not en_ligne else logging.INFO,
+                             "changement d'etat", service=nom, noeud=noeud, en_ligne=en_ligne, erreur=erreur)
+        traces.registre.observer('sonde_sante_duree_secondes', latence, "Durée des sondes de santé", service=nom)
+        return en_ligne
+
+    def _sonder_sans_erreur(self, nom_noeud):
+        nom, noeud = nom_noeud
+        try:
+            self.sonder(nom, noeud)
+        except Exception as e:
+            traces.evenement(journal, logging.ERROR, "sonde en echec", service=nom, noeud=noeud, erreur=str(e))
+
+    def sonder_tous(self):
+        """Sondes en parallèle: un nœud qui ne répond pas ne retarde pas les autres"""
+        noeuds = self.noeuds_sondes()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(noeuds)) as executor:
+            list(executor.map(self._sonder_sans_erreur, noeuds))
+
+    def est_disponible(self, nom, agence=None):
+        """Lecture seule, sans réseau: faux si la dernière sonde du nœud (celui de l'agence si elle est
+        donnée) a échoué ou si son disjoncteur est ouvert. Tant qu'aucune sonde n'a abouti, seul le
+        disjoncteur décide."""
+        self._demarrer()
+        noeud = passerelle_http.noeud_agence(nom, agence)
+        cle = passerelle_http.cle_noeud(nom, noeud)
+        _, disjoncteur = passerelle_http.outils_noeud(nom, noeud)
+        with self._verrou:
+            en_ligne = self._table.get(cle, {}).get("en_ligne")
+        return en_ligne is not False and disjoncteur.etat != OUVERT
+
+    def etat(self):
+        """Table d'état: une ligne par nœud de service avec l'état de son disjoncteur"""
+        self._demarrer()
+        with self._verrou:
+            lignes = [dict(ligne) for ligne in self._table.values()]
+        for ligne in lignes:
+            ligne["disjoncteur"] = passerelle_http.outils_noeud(ligne["service"], ligne["noeud"])[1].etat
+        return lignes
+
+    def arreter(self):
+        self._arret.set()
+        with self._verrou:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join(timeout=self.intervalle + 1)
+
+
+surveillant = SurveillantSante()
+configuration.a_l_arret(surveillant.arreter)
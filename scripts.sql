@@ -74,4 +74,15 @@ INSERT INTO client (nom, prenom, email, telephone, date_inscription) VALUES
 ('Abalo', 'Mawulolo', 'mawuloloabalo@gmail.com', '+228 96 78 90 12', '2024-03-01'),
 ('Dosseh', 'Yawo', 'yawodosseh@gmail.com', '+228 97 89 01 23', '2024-03-05'),
 ('Folly', 'Akou', 'akoufolly@gmail.com', '+228 98 90 12 34', '2024-03-10'),
-('Gadri', 'Essi', 'essigadri@gmail.com', '+228 99 01 23 45', '2024-03-15');
\ No newline at end of file
+('Gadri', 'Essi', 'essigadri@gmail.com', '+228 99 01 23 45', '2024-03-15');
+
+-- Recherche de clients (GET /clients/recherche): préfixes sur index B-tree,
+-- mots entiers sur FULLTEXT, numéros sur une colonne de chiffres seuls
+ALTER TABLE client
+    ADD COLUMN telephone_normalise VARCHAR(20)
+        AS (REGEXP_REPLACE(telephone, '[^0-9]', '')) STORED,
+    ADD INDEX idx_client_nom (nom, prenom),
+    ADD INDEX idx_client_prenom (prenom),
+    ADD INDEX idx_client_email (email),
+    ADD INDEX idx_client_telephone (telephone_normalise),
+    ADD FULLTEXT INDEX ft_client (nom, prenom, email);
@@ -0,0 +1,255 @@
+"""Point d'entrée de production: plusieurs processus workers, chacun multi-threadé.
+
+    python serveur.py app_web --workers 4 --threads 16
+    python serveur.py reservations --port 5003      # un seul worker (idem chambres), voir UN_SEUL_WORKER
+
+Applications: app_web, chambres, clients, reservations, dashboard. Réglages aussi
+par variables d'environnement (WORKERS, THREADS, DELAI_ARRET, BIND; ports et bases:
+voir configuration.py).
+
+Gunicorn (worker gthread) est utilisé s'il est installé, sinon un pré-fork intégré
+sur le serveur Werkzeug: le maître ouvre le socket d'écoute, lance les workers et
+relance ceux qui meurent. Dans les deux cas l'application est importée dans chaque
+worker, après le fork: pools MySQL, client MongoDB, sessions HTTP et threads de
+fond appartiennent au worker et ne sont jamais partagés entre processus.
+
+Arrêt propre (SIGTERM/SIGINT): plus aucune connexion acceptée, les requêtes en
+cours ont DELAI_ARRET secondes pour finir (les flux SSE sont coupés au-delà), puis
+les tâches d'arrêt libèrent pools, clients et threads (configuration.a_l_arret).
+"""
+import argparse
+import importlib
+import logging
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+
+RACINE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, RACINE)
+
+import configuration
+import traces
+
+# nom -> (dossier, module)
+APPLICATIONS = {
+    'app_web': ('', 'app_web'),
+    'chambres': ('services', 'service_chambres'),
+    'clients': ('services', 'service_clients'),
+    'reservations': ('services', 'service_reservations'),
+    'dashboard': ('templates', 'dashboard'),
+}
+# Applications dont un état reste propre au processus: plusieurs workers se le partageraient
+# mal. service_reservations publie créations et changements de statut, service_chambres les
+# changements de disponibilité, sur un bus en mémoire: un client SSE de /evenements (dont le
+# relais de la passerelle, qui invalide ses ETags de chambres) ne verrait que ceux de son worker.
+UN_SEUL_WORKER = {
+    'chambres': "le bus d'événements (/evenements) est en mémoire du processus",
+    'reservations': "le bus d'événements (/evenements) est en mémoire du processus",
+}
+# Un worker qui meurt avant ce délai ne démarre pas: inutile de le relancer en boucle
+DELAI_DEMARRAGE = 5.0
+
+journal = traces.journal('serveur')
+
+
+def charger_application(nom):
+    """Importe le module de l'application (dans le worker) et renvoie son objet Flask"""
+    dossier, module = APPLICATIONS[nom]
+    if dossier:
+        sys.path.insert(0, os.path.join(RACINE, dossier))
+    return importlib.import_module(module).app
+
+
+# ------------------------------------------------------------------ gunicorn
+
+def servir_gunicorn(nom, hote, port, workers, threads, delai_arret):
+    from gunicorn.app.base import BaseApplication
+
+    class Application(BaseApplication):
+        def load_config(self):
+            for cle, valeur in {
+                "bind": f"{hote}:{port}",
+                "workers": workers,
+                "threads": threads,
+                "worker_class": "gthread",
+                "graceful_timeout": delai_arret,
+                "preload_app": False,
+                "worker_exit": lambda serveur, worker: configuration.arreter(),
+            }.items():
+                self.cfg.set(cle, valeur)
+
+        def load(self):
+            return charger_application(nom)
+
+    Application().run()
+
+
+# --------------------------------------------------------- pré-fork intégré
+
+def creer_serveur_worker(application, socket_ecoute, threads):
+    """Serveur Werkzeug sur le socket hérité du maître, au plus `threads` requêtes simultanées"""
+    from werkzeug.serving import ThreadedWSGIServer
+
+    class ServeurBorne(ThreadedWSGIServer):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.places = threading.BoundedSemaphore(threads)
+            self.en_cours = 0
+            self._verrou_compte = threading.Lock()
+
+        def process_request(self, request, client_address):
+            # Worker saturé: on cesse d'accepter, les autres workers prennent le relais
+            self.places.acquire()
+            with self._verrou_compte:
+                self.en_cours += 1
+            try:
+                super().process_request(request, client_address)
+            except Exception:
+                self._liberer()
+                raise
+
+        def process_request_thread(self, request, client_address):
+            try:
+                super().process_request_thread(request, client_address)
+            finally:
+                self._liberer()
+
+        def _liberer(self):
+            with self._verrou_compte:
+                self.en_cours -= 1
+            self.places.release()
+
+    hote, port = socket_ecoute.getsockname()[:2]
+    return ServeurBorne(hote, port, application, fd=socket_ecoute.fileno())
+
+
+def executer_worker(nom, socket_ecoute, threads, delai_arret):
+    """Corps d'un worker (processus enfant): importe l'application puis sert jusqu'au SIGTERM"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl-C: c'est le maître qui orchestre l'arrêt
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    application = charger_application(nom)
+    serveur = creer_serveur_worker(application, socket_ecoute, threads)
+
+    def sur_sigterm(signum, frame):
+        # shutdown() attend la fin de serve_forever: à appeler hors du thread principal
+        threading.Thread(target=serveur.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, sur_sigterm)
+    traces.evenement(journal, logging.INFO, "worker pret", application=nom, pid=os.getpid())
+    serveur.serve_forever()
+
+    echeance = time.monotonic() + delai_arret
+    while serveur.en_cours and time.monotonic() < echeance:
+        time.sleep(0.05)
+    if serveur.en_cours:
+        traces.evenement(journal, logging.WARNING, "requetes interrompues a l'arret",
+                         pid=os.getpid(), en_cours=serveur.en_cours)
+    configuration.arreter()
+
+
+def lancer_worker(nom, socket_ecoute, threads, delai_arret):
+    pid = os.fork()
+    if pid:
+        return pid
+    code = 0
+    try:
+        executer_worker(nom, socket_ecoute, threads, delai_arret)
+    except BaseException as e:
+        traces.evenement(journal, logging.ERROR, "worker en echec", application=nom, pid=os.getpid(), erreur=repr(e))
+        code = 1
+    finally:
+        logging.shutdown()
+        os._exit(code)
+
+
+def servir_prefork(nom, hote, port, workers, threads, delai_arret):
+    socket_ecoute = socket.create_server((hote, port), backlog=2048, reuse_port=False)
+    socket_ecoute.set_inheritable(True)
+
+    arret = threading.Event()
+
+    def sur_signal(signum, frame):
+        arret.set()
+
+    signal.signal(signal.SIGTERM, sur_signal)
+    signal.signal(signal.SIGINT, sur_signal)
+
+    enfants = {}  # pid -> heure de lancement
+    for _ in range(workers):
+        enfants[lancer_worker(nom, socket_ecoute, threads, delai_arret)] = time.monotonic()
+    traces.evenement(journal, logging.INFO, "serveur demarre", application=nom, adresse=f"{hote}:{port}",
+                     workers=workers, threads=threads, pid=os.getpid())
+
+    code = 0
+    while not arret.is_set():
+        arret.wait(0.5)
+        while enfants:
+            pid, statut = os.waitpid(-1, os.WNOHANG)
+            if not pid:
+                break
+            lance = enfants.pop(pid, None)
+            if lance is None or arret.is_set():
+                continue
+            if time.monotonic() - lance < DELAI_DEMARRAGE:
+                traces.evenement(journal, logging.ERROR, "worker mort au demarrage, arret du serveur",
+                                 pid=pid, statut=os.waitstatus_to_exitcode(statut))
+                arret.set()
+                code = 1
+                break
+            traces.evenement(journal, logging.WARNING, "worker relance", pid=pid,
+                             statut=os.waitstatus_to_exitcode(statut))
+            enfants[lancer_worker(nom, socket_ecoute, threads, delai_arret)] = time.monotonic()
+
+    socket_ecoute.close()
+    for pid in enfants:
+        os.kill(pid, signal.SIGTERM)
+    echeance = time.monotonic() + delai_arret + 2
+    while enfants and time.monotonic() < echeance:
+        pid, _ = os.waitpid(-1, os.WNOHANG)
+        if pid:
+            enfants.pop(pid, None)
+        else:
+            time.sleep(0.05)
+    for pid in enfants:
+        os.kill(pid, signal.SIGKILL)
+        os.waitpid(pid, 0)
+    traces.evenement(journal, logging.INFO, "serveur arrete", application=nom, forces=len(enfants))
+    return code
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serveur de production multi-processus")
+    parser.add_argument('application', choices=sorted(APPLICATIONS))
+    parser.add_argument('--bind', default=os.environ.get('BIND', '0.0.0.0'), help="adresse d'écoute")
+    parser.add_argument('--port', type=int, help="port (défaut: PORT_<APPLICATION> ou configuration.PORTS_DEFAUT)")
+    parser.add_argument('--workers', type=int, default=int(os.environ['WORKERS']) if 'WORKERS' in os.environ else None,
+                        help="processus workers (défaut: nombre de CPU, 1 pour les applications de UN_SEUL_WORKER)")
+    parser.add_argument('--threads', type=int, default=int(os.environ.get('THREADS', 32)),
+                        help="requêtes simultanées par worker (chaque flux SSE en occupe une)")
+    parser.add_argument('--delai-arret', type=float, default=float(os.environ.get('DELAI_ARRET', 30)))
+    parser.add_argument('--integre', action='store_true', help="pré-fork intégré même si gunicorn est installé")
+    args = parser.parse_args()
+    if args.workers is None:
+        args.workers = 1 if args.application in UN_SEUL_WORKER else os.cpu_count() or 2
+    elif args.workers > 1 and args.application in UN_SEUL_WORKER:
+        parser.error(f"{args.application}: un seul worker ({UN_SEUL_WORKER[args.application]}), "
+                     f"--workers/WORKERS={args.workers} refusé; répartir les agences sur plusieurs nœuds (partitions.py)")
+
+    traces.configurer_journal(args.application)
+    port = args.port or configuration.port(args.application)
+    options = (args.application, args.bind, port, max(args.workers, 1), max(args.threads, 1), args.delai_arret)
+    if not args.integre:
+        try:
+            import gunicorn  # noqa: F401
+        except ImportError:
+            pass
+        else:
+            return servir_gunicorn(*options)
+    return servir_prefork(*options)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,205 @@
+"""Agrégats d'occupation et de chiffre d'affaires par agence, type de chambre et jour.
+
+Chaque nuit réservée incrémente un document de la collection "stats_occupation"
+(_id "<jour>|<agence>|<type>"): nuits occupées, revenu de la nuit, arrivées.
+Les créations ajoutent, les annulations retranchent; /stats lit ces compteurs
+au lieu de parcourir les réservations.
+
+Chaque nœud tient ses propres compteurs (stats_occupation de son MONGO_URI), alimentés
+par les réservations de ses partitions locales; la passerelle additionne les nœuds.
+
+Recalcul complet (historique, ou après une dérive), à lancer sur chaque nœud avec sa
+configuration (MONGO_URI, PARTITIONS, PARTITIONS_LOCALES):
+
+    python services/analytique.py --recalculer [--partitions p1,p2] [--chambres http://noeud-1:5001,http://noeud-2:5001]
+"""
+import argparse
+import os
+import sys
+from collections import defaultdict
+
+from pymongo import ASCENDING, InsertOne, UpdateOne
+
+from disponibilites import iso, sejour_reservation
+
+TAILLE_LOT = 5000
+CHAMPS_STATS = ("nuits", "revenu", "arrivees")
+AXES = ("jour", "agence", "type_chambre")
+
+
+def cle_stats(jour, agence, type_chambre):
+    return f"{jour}|{'' if agence is None else agence}|{type_chambre or ''}"
+
+
+def increments(reservation, signe=1):
+    """{(jour, agence, type): {nuits, revenu, arrivees}} pour chaque nuit du séjour"""
+    sejour = sejour_reservation(reservation)
+    if not sejour:
+        return {}
+    debut, fin = sejour
+    prix_nuit = float(reservation.get('prix_total') or 0) / max(fin - debut, 1)
+    agence, type_chambre = reservation.get('id_agence'), reservation.get('type_chambre')
+    return {
+        (iso(jour), agence, type_chambre): {
+            "nuits": signe,
+            "revenu": signe * prix_nuit,
+            "arrivees": signe if jour == debut else 0,
+        }
+        for jour in range(debut, fin)
+    }
+
+
+def cumuler(totaux, reservation, signe=1):
+    for cle, valeurs in increments(reservation, signe).items():
+        ligne = totaux[cle]
+        for champ in CHAMPS_STATS:
+            ligne[champ] += valeurs[champ]
+
+
+def mettre_a_jour(collection, reservations, signe=1):
+    """Applique les réservations (signe=1) ou leur annulation (signe=-1) en un bulk_write"""
+    totaux = defaultdict(lambda: dict.fromkeys(CHAMPS_STATS, 0))
+    for reservation in reservations:
+        cumuler(totaux, reservation, signe)
+    if not totaux:
+        return 0
+    operations = [
+        UpdateOne(
+            {"_id": cle_stats(*cle)},
+            {"$inc": valeurs, "$setOnInsert": dict(zip(AXES, cle))},
+            upsert=True,
+        )
+        for cle, valeurs in totaux.items()
+    ]
+    collection.bulk_write(operations, ordered=False)
+    return len(operations)
+
+
+def creer_index(collection):
+    collection.create_index([("jour", ASCENDING), ("agence", ASCENDING)], name="jour_agence")
+
+
+def lire_stats(collection, debut, fin, par=("agence",), agence=None, type_chambre=None):
+    """Agrège les compteurs de [debut, fin[ selon les axes demandés (jour, agence, type_chambre)"""
+    filtre = {"jour": {"$gte": debut, "$lt": fin}}
+    if agence is not None:
+        filtre["agence"] = agence
+    if type_chambre:
+        filtre["type_chambre"] = type_chambre
+    groupe = {"_id": {axe: f"${axe}" for axe in par}}
+    groupe.update({champ: {"$sum": f"${champ}"} for champ in CHAMPS_STATS})
+    lignes = []
+    for ligne in collection.aggregate([{"$match": filtre}, {"$group": groupe}]):
+        axes = ligne.pop("_id")
+        ligne["revenu"] = round(ligne["revenu"], 2)
+        lignes.append(dict(axes, **ligne))
+    lignes.sort(key=lambda ligne: tuple(str(ligne.get(axe)) for axe in par))
+    return lignes
+
+
+def recalculer(reservations_collections, collection, catalogue=None, taille_lot=TAILLE_LOT):
+    """Reconstruit les agrégats depuis l'historique complet des collections réservations données
+    (celles des partitions du nœud qui tient `collection`).
+
+    Les réservations antérieures à ce module n'ont ni id_agence ni type_chambre:
+    ils sont complétés par le catalogue {chambre_id: {id_agence, type_chambre}}.
+    Le résultat est écrit dans une collection temporaire puis renommé; les
+    incréments reçus pendant le recalcul sont perdus (à lancer hors pointe).
+    """
+    catalogue = catalogue or {}
+    totaux = defaultdict(lambda: dict.fromkeys(CHAMPS_STATS, 0))
+    projection = {"chambre_id": 1, "id_agence": 1, "type_chambre": 1, "prix_total": 1, "nuits": 1,
+                  "date_arrivee": 1, "date_depart": 1, "date_reservation": 1}
+    nombre = 0
+    for reservations_collection in reservations_collections:
+        for reservation in reservations_collection.find({"statut": {"$ne": "annulée"}}, projection).batch_size(taille_lot):
+            if reservation.get('id_agence') is None and reservation.get('chambre_id') in catalogue:
+                reservation.update(catalogue[reservation['chambre_id']])
+            cumuler(totaux, reservation)
+            nombre += 1
+
+    temporaire = collection.database[f"{collection.name}_recalcul"]
+    temporaire.drop()
+    lot = []
+    for cle, valeurs in totaux.items():
+        lot.append(InsertOne(dict(zip(AXES, cle), _id=cle_stats(*cle), **valeurs)))
+        if len(lot) >= taille_lot:
+            temporaire.bulk_write(lot, ordered=False)
+            lot = []
+    if lot:
+        temporaire.bulk_write(lot, ordered=False)
+    if totaux:
+        creer_index(temporaire)
+        temporaire.rename(collection.name, dropTarget=True)
+    else:
+        collection.delete_many({})
+    return {"reservations": nombre, "documents": len(totaux)}
+
+
+def charger_catalogue(urls_chambres, taille_page=1000):
+    """{chambre_id: {id_agence, type_chambre}} lu page par page sur chaque nœud du service chambres"""
+    import requests
+
+    catalogue = {}
+    for url_chambres in urls_chambres:
+        after = None
+        while True:
+            params = {"limit": taille_page, "fields": "id_chambre,id_agence,type_chambre"}
+            if after is not None:
+                params["after"] = after
+            response = requests.get(f"{url_chambres}/chambres", params=params, timeout=(1.0, 30.0))
+            response.raise_for_status()
+            for chambre in response.json():
+                catalogue[chambre['id_chambre']] = {"id_agence": chambre.get('id_agence'),
+                                                    "type_chambre": chambre.get('type_chambre')}
+            after = response.headers.get('X-Next-After')
+            if not after:
+                break
+    return catalogue
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Agrégats d'occupation et de revenu")
+    parser.add_argument('--recalculer', action='store_true', help="reconstruit les agrégats depuis l'historique")
+    parser.add_argument('--mongo', default=os.environ.get('MONGO_URI', 'mongodb://localhost:27017/'))
+    parser.add_argument('--partitions', help="partitions dont les réservations alimentent ces agrégats "
+                                             "(défaut: partitions locales du nœud, PARTITIONS_LOCALES)")
+    parser.add_argument('--chambres', help="URLs du service chambres séparées par des virgules "
+                                           "(défaut: tous les nœuds de la table de routage)")
+    args = parser.parse_args()
+    if not args.recalculer:
+        parser.print_help()
+        return
+
+    from pymongo import MongoClient
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    import partitions
+
+    # Seules les partitions du nœud: celles des autres nœuds sont comptées dans leurs propres
+    # agrégats, que la passerelle additionne (les recompter ici les doublerait)
+    locales = args.partitions.split(',') if args.partitions else partitions.table.locales
+    inconnues = set(locales) - set(partitions.table.partitions)
+    if inconnues:
+        parser.error(f"partitions inconnues: {sorted(inconnues)}")
+    clients = {args.mongo: MongoClient(args.mongo)}
+    db = clients[args.mongo][os.environ.get('MONGO_BASE', 'hotel_reservations')]
+    sources = []
+    for nom in locales:
+        description = partitions.table.partitions[nom]
+        config = partitions.table.config_mongo(nom)
+        uri = config['uri'] if 'uri' in description.get('mongo', {}) else args.mongo
+        if uri not in clients:
+            clients[uri] = MongoClient(uri)
+        sources.append(clients[uri][config['base']][config['collection']])
+    try:
+        catalogue = charger_catalogue(args.chambres.split(',') if args.chambres else partitions.table.noeuds('chambres'))
+    except Exception as e:
+        print(f"⚠️ Catalogue des chambres indisponible ({e}): agences et types inconnus pour l'historique")
+        catalogue = {}
+    resultat = recalculer(sources, db['stats_occupation'], catalogue)
+    print(f"Agrégats recalculés ({', '.join(locales)}): {resultat['reservations']} réservations -> "
+          f"{resultat['documents']} documents")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+import threading
+from bisect import bisect_left, insort
+from datetime import date, timedelta
+
+
+def jour(valeur):
+    """Date ISO ('2024-03-01' ou '2024-03-01T10:00:00') -> numéro de jour (ordinal)"""
+    if isinstance(valeur, int):
+        return valeur
+    return date.fromisoformat(str(valeur)[:10]).toordinal()
+
+
+def iso(ordinal):
+    return date.fromordinal(ordinal).isoformat()
+
+
+def sejour_reservation(reservation):
+    """Intervalle [arrivée, départ[ d'une réservation, y compris les anciennes sans dates"""
+    if reservation.get('date_arrivee') and reservation.get('date_depart'):
+        return jour(reservation['date_arrivee']), jour(reservation['date_depart'])
+    if not reservation.get('date_reservation'):
+        return None
+    arrivee = jour(reservation['date_reservation'])
+    return arrivee, arrivee + int(reservation.get('nuits') or 1)
+
+
+class CalendrierChambres:
+    """Index d'intervalles triés par chambre pour les requêtes de disponibilité.
+
+    Chaque chambre garde ses séjours triés par date d'arrivée. La durée du plus long
+    séjour borne la recherche: un chevauchement avec [debut, fin[ ne peut venir que
+    d'un séjour arrivé après debut - duree_max, d'où des tests en O(log n + k).
+    """
+
+    def __init__(self):
+        self._verrou = threading.RLock()
+        self._arrivees = {}    # chambre_id -> [arrivée, ...] trié
+        self._sejours = {}     # chambre_id -> [(arrivée, départ, reservation_id), ...] trié
+        self._duree_max = {}   # chambre_id -> plus long séjour
+        self._index = {}       # reservation_id -> (chambre_id, séjour)
+
+    def vider(self):
+        with self._verrou:
+            self._arrivees.clear()
+            self._sejours.clear()
+            self._duree_max.clear()
+            self._index.clear()
+
+    def remplacer(self, autre):
+        """Reprend le contenu d'un calendrier rechargé, sans fenêtre où il serait vide"""
+        with self._verrou, autre._verrou:
+            self._arrivees, self._sejours = autre._arrivees, autre._sejours
+            self._duree_max, self._index = autre._duree_max, autre._index
+
+    def ajouter(self, chambre_id, debut, fin, reservation_id):
+        debut, fin = jour(debut), jour(fin)
+        with self._verrou:
+            sejour = (debut, fin, str(reservation_id))
+            position = bisect_left(self._sejours.setdefault(chambre_id, []), sejour)
+            self._sejours[chambre_id].insert(position, sejour)
+            insort(self._arrivees.setdefault(chambre_id, []), debut)
+            self._duree_max[chambre_id] = max(self._duree_max.get(chambre_id, 0), fin - debut)
+            self._index[str(reservation_id)] = (chambre_id, sejour)
+
+    def retirer(self, reservation_id):
+        reservation_id = str(reservation_id)
+        with self._verrou:
+            entree = self._index.pop(reservation_id, None)
+            if entree is None:
+                return False
+            chambre_id, sejour = entree
+            del self._sejours[chambre_id][bisect_left(self._sejours[chambre_id], sejour)]
+            del self._arrivees[chambre_id][bisect_left(self._arrivees[chambre_id], sejour[0])]
+            return True
+
+    def _chevauchements(self, chambre_id, debut, fin):
+        sejours = self._sejours.get(chambre_id)
+        if not sejours:
+            return []
+        arrivees = self._arrivees[chambre_id]
+        premier = bisect_left(arrivees, debut - self._duree_max[chambre_id] + 1)
+        dernier = bisect_left(arrivees, fin)
+        return [s for s in sejours[premier:dernier] if s[1] > debut]
+
+    def est_libre(self, chambre_id, debut, fin):
+        debut, fin = jour(debut), jour(fin)
+        with self._verrou:
+            return not self._chevauchements(chambre_id, debut, fin)
+
+    def chambres_libres(self, chambres_ids, debut, fin):
+        """Parmi chambres_ids, celles sans aucun séjour qui chevauche [debut, fin["""
+        debut, fin = jour(debut), jour(fin)
+        with self._verrou:
+            return [c for c in chambres_ids if not self._chevauchements(c, debut, fin)]
+
+    def calendrier(self, chambre_id, debut, jours):
+        """Bitset d'occupation: bit i à 1 si la chambre est occupée la nuit debut + i"""
+        debut = jour(debut)
+        fin = debut + jours
+        bits = 0
+        with self._verrou:
+            for arrivee, depart, _ in self._chevauchements(chambre_id, debut, fin):
+                de, a = max(arrivee, debut), min(depart, fin)
+                bits |= ((1 << (a - de)) - 1) << (de - debut)
+        return bits
+
+    def stats(self):
+        with self._verrou:
+            return {
+                "chambres": len(self._sejours),
+                "sejours": len(self._index),
+            }
+
+
+def bitset_en_texte(bits, jours):
+    """'0110...' avec le premier jour à gauche, pour l'affichage calendrier"""
+    return "".join("1" if bits >> i & 1 else "0" for i in range(jours))
+
+
+def depart_depuis(arrivee, nuits):
+    return (date.fromisoformat(str(arrivee)[:10]) + timedelta(days=int(nuits))).isoformat()
@@ -0,0 +1,111 @@
+"""Garde d'occupation en base: un document par chambre et par nuit.
+
+    {"_id": "12:2024-03-01", "chambre_id": 12, "reservation_id": ObjectId(...)}
+
+Le _id est unique: deux séjours qui se chevauchent ne peuvent pas poser la même nuit,
+quels que soient le processus ou le nœud qui écrivent. Les nuits sont posées avant la
+réservation (même base que la collection de la partition) et retirées si son insertion
+échoue, à l'annulation ou à la fin du séjour. Des nuits restées orphelines (processus
+arrêté entre deux écritures) sont reprises au premier conflit, passé DELAI_ORPHELINES.
+"""
+from datetime import datetime, timedelta, timezone
+
+from pymongo import ASCENDING
+from pymongo.errors import BulkWriteError
+
+from disponibilites import jour, iso
+
+DELAI_ORPHELINES = 60  # secondes
+INDEX = [{"keys": [("reservation_id", ASCENDING)], "name": "reservation_id"}]
+CLE_EN_DOUBLE = 11000
+
+
+def collection_nuitees(reservations):
+    """Collection des nuits posées, à côté de la collection réservations d'une partition"""
+    return reservations.database[f"{reservations.name}_nuitees"]
+
+
+def documents_nuits(chambre_id, debut, fin, reservation_id):
+    return [{"_id": f"{chambre_id}:{iso(nuit)}", "chambre_id": chambre_id, "reservation_id": reservation_id}
+            for nuit in range(jour(debut), jour(fin))]
+
+
+def erreurs_hors_doublons(erreur):
+    return [e for e in erreur.details.get('writeErrors', []) if e.get('code') != CLE_EN_DOUBLE]
+
+
+def retirer(reservations, reservation_ids):
+    """Rend les nuits des réservations données"""
+    if reservation_ids:
+        collection_nuitees(reservations).delete_many({"reservation_id": {"$in": list(reservation_ids)}})
+
+
+def reprendre_orphelines(reservations, nuits_ids):
+    """Retire les nuits bloquantes dont la réservation n'est plus (ou n'a jamais été) en cours.
+    Une réservation plus récente que DELAI_ORPHELINES peut être en cours d'écriture: elle est laissée"""
+    nuitees = collection_nuitees(reservations)
+    proprietaires = {n['reservation_id'] for n in nuitees.find({"_id": {"$in": nuits_ids}}, {"reservation_id": 1})}
+    if not proprietaires:
+        return True
+    vivantes = {r['_id'] for r in reservations.find({"_id": {"$in": list(proprietaires)}, "statut": "en cours"}, {"_id": 1})}
+    limite = datetime.now(timezone.utc) - timedelta(seconds=DELAI_ORPHELINES)
+    orphelines = [p for p in proprietaires - vivantes if p.generation_time < limite]
+    retirer(reservations, orphelines)
+    return bool(orphelines)
+
+
+def poser(reservations, chambre_id, debut, fin, reservation_id):
+    """Pose toutes les nuits de [debut, fin[ pour la réservation; en cas de chevauchement
+    rien n'est posé et False est renvoyé"""
+    documents = documents_nuits(chambre_id, debut, fin, reservation_id)
+    for tentative in range(2):
+        try:
+            collection_nuitees(reservations).insert_many(documents, ordered=True)
+            return True
+        except BulkWriteError as e:
+            retirer(reservations, [reservation_id])
+            if erreurs_hors_doublons(e):
+                raise
+            if tentative or not reprendre_orphelines(reservations, [d['_id'] for d in documents]):
+                return False
+    return False
+
+
+def poser_lot(reservations, sejours):
+    """sejours = [(cle, chambre_id, debut, fin, reservation_id), ...] d'une même partition.
+
+    Un seul insert_many non ordonné pour tout le lot; les séjours en conflit (avec la base
+    ou entre eux) sont rendus puis repris un à un dans l'ordre du lot. Renvoie les clés posées."""
+    documents, proprietaire = [], []
+    for position, (_, chambre_id, debut, fin, reservation_id) in enumerate(sejours):
+        nuits = documents_nuits(chambre_id, debut, fin, reservation_id)
+        documents.extend(nuits)
+        proprietaire.extend([position] * len(nuits))
+    en_conflit = set()
+    try:
+        if documents:
+            collection_nuitees(reservations).insert_many(documents, ordered=False)
+    except BulkWriteError as e:
+        if erreurs_hors_doublons(e):
+            retirer(reservations, [sejour[4] for sejour in sejours])
+            raise
+        en_conflit = {proprietaire[erreur['index']] for erreur in e.details.get('writeErrors', [])}
+        retirer(reservations, [sejours[position][4] for position in en_conflit])
+    posees = []
+    for position, (cle, chambre_id, debut, fin, reservation_id) in enumerate(sejours):
+        if position not in en_conflit or poser(reservations, chambre_id, debut, fin, reservation_id):
+            posees.append(cle)
+    return posees
+
+
+def completer(reservations, sejours):
+    """Pose les nuits manquantes de séjours existants [(chambre_id, debut, fin, reservation_id)]
+    (réservations antérieures à la garde, imports); les nuits déjà posées sont ignorées"""
+    documents = [nuit for sejour in sejours for nuit in documents_nuits(*sejour)]
+    if not documents:
+        return
+    try:
+        collection_nuitees(reservations).insert_many(documents, ordered=False)
+    except BulkWriteError as e:
+        if erreurs_hors_doublons(e):
+            raise
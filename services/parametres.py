@@ -0,0 +1,56 @@
+from flask import abort, jsonify, request
+
+
+def ids_demandes(nom='ids', maximum=500):
+    """Liste d'identifiants passée en ?ids=1,2,3 (None si absente)"""
+    brut = request.args.get(nom)
+    if brut is None:
+        return None
+    ids = []
+    for morceau in brut.split(','):
+        morceau = morceau.strip()
+        if morceau.isdigit():
+            ids.append(int(morceau))
+    return list(dict.fromkeys(ids))[:maximum]
+
+
+def pagination_demandee(limite_defaut=100, limite_max=1000, conversion=int):
+    """Curseur keyset ?after=<id>&limit=N (jamais d'OFFSET); un after non convertible -> 400"""
+    after = request.args.get('after') or None
+    if after is not None:
+        try:
+            after = conversion(after)
+        except Exception:
+            reponse = jsonify({"error": f"after invalide: {after}"})
+            reponse.status_code = 400
+            abort(reponse)
+    try:
+        limit = int(request.args.get('limit', limite_defaut))
+    except ValueError:
+        limit = limite_defaut
+    return after, min(max(limit, 1), limite_max)
+
+
+def champs_demandes(autorises, obligatoires=()):
+    """Projection ?fields=a,b limitée aux colonnes connues (None = toutes)"""
+    brut = request.args.get('fields')
+    if not brut:
+        return None
+    champs = [c.strip() for c in brut.split(',') if c.strip() in autorises]
+    for champ in obligatoires:
+        if champ not in champs:
+            champs.insert(0, champ)
+    return champs
+
+
+def reponse_paginee(reponse, lignes, limit, cle):
+    """Ajoute l'en-tête X-Next-After quand la page est pleine"""
+    if len(lignes) == limit and lignes:
+        reponse.headers['X-Next-After'] = str(lignes[-1][cle])
+    return reponse
+
+
+def reponse_conditionnelle(reponse):
+    """ETag calculé sur le corps: If-None-Match identique -> 304 sans corps"""
+    reponse.add_etag()
+    return reponse.make_conditional(request)
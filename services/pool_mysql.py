@@ -0,0 +1,204 @@
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+import mysql.connector
+
+import traces
+
+
+class PoolEpuise(Exception):
+    """Aucune connexion libre dans le délai d'attente"""
+
+
+class CurseurChronometre:
+    """Curseur MySQL dont chaque execute() est un span "mysql" de la requête HTTP en cours"""
+
+    def __init__(self, curseur):
+        self._curseur = curseur
+
+    def execute(self, requete, params=None, *args, **kwargs):
+        with traces.span('mysql', requete=requete.split(None, 1)[0].upper()):
+            return self._curseur.execute(requete, params, *args, **kwargs)
+
+    def executemany(self, requete, lignes, *args, **kwargs):
+        with traces.span('mysql', requete=requete.split(None, 1)[0].upper(), lignes=len(lignes)):
+            return self._curseur.executemany(requete, lignes, *args, **kwargs)
+
+    def __iter__(self):
+        return iter(self._curseur)
+
+    def __getattr__(self, nom):
+        return getattr(self._curseur, nom)
+
+
+class PoolMySQL:
+    """Pool borné de connexions MySQL partagé par les services"""
+
+    def __init__(self, db_config, taille=10, attente_max=5.0, duree_vie=1800, inactivite_max=300):
+        self.db_config = db_config
+        self.taille = taille
+        self.attente_max = attente_max
+        self.duree_vie = duree_vie
+        self.inactivite_max = inactivite_max
+
+        self._libres = queue.LifoQueue(maxsize=taille)
+        self._verrou = threading.Lock()
+        self._creees = 0
+        self._empruntees = 0
+
+        # Métriques
+        self._nb_emprunts = 0
+        self._attente_totale = 0.0
+        self._attente_max_observee = 0.0
+        self._nb_recyclages = 0
+        self._nb_echecs_sante = 0
+        self._nb_epuisements = 0
+
+    def _ouvrir(self):
+        conn = mysql.connector.connect(**self.db_config)
+        return {"conn": conn, "creee": time.monotonic(), "rendue": time.monotonic()}
+
+    def _fermer(self, entree):
+        try:
+            entree["conn"].close()
+        except Exception:
+            pass
+        with self._verrou:
+            self._creees -= 1
+
+    def _est_saine(self, entree):
+        """Vérifie qu'une connexion peut encore servir (recyclage + ping)"""
+        maintenant = time.monotonic()
+        if maintenant - entree["creee"] > self.duree_vie:
+            with self._verrou:
+                self._nb_recyclages += 1
+            return False
+        # Seule une connexion restée longtemps inactive est pingée avant usage (is_connected()
+        # pingerait à chaque emprunt); une connexion coupée entre-temps échoue à l'exécution
+        # et est rendue cassée
+        if maintenant - entree["rendue"] > self.inactivite_max:
+            try:
+                entree["conn"].ping(reconnect=False)
+            except Exception:
+                with self._verrou:
+                    self._nb_echecs_sante += 1
+                return False
+        return True
+
+    def _emprunter(self):
+        debut = time.monotonic()
+        limite = debut + self.attente_max
+        while True:
+            try:
+                entree = self._libres.get_nowait()
+            except queue.Empty:
+                entree = None
+                with self._verrou:
+                    peut_creer = self._creees < self.taille
+                    if peut_creer:
+                        self._creees += 1
+                if peut_creer:
+                    try:
+                        entree = self._ouvrir()
+                    except Exception:
+                        with self._verrou:
+                            self._creees -= 1
+                        raise
+                else:
+                    restant = limite - time.monotonic()
+                    if restant <= 0:
+                        with self._verrou:
+                            self._nb_epuisements += 1
+                        raise PoolEpuise(f"Pool MySQL épuisé ({self.taille} connexions)")
+                    try:
+                        entree = self._libres.get(timeout=restant)
+                    except queue.Empty:
+                        continue
+
+            if not self._est_saine(entree):
+                self._fermer(entree)
+                continue
+
+            attente = time.monotonic() - debut
+            traces.enregistrer_span('mysql_attente_pool', attente)
+            with self._verrou:
+                self._empruntees += 1
+                self._nb_emprunts += 1
+                self._attente_totale += attente
+                self._attente_max_observee = max(self._attente_max_observee, attente)
+            return entree
+
+    def _rendre(self, entree, casse=False):
+        with self._verrou:
+            self._empruntees -= 1
+        if casse:
+            self._fermer(entree)
+            return
+        try:
+            # Annule toute transaction laissée ouverte
+            entree["conn"].rollback()
+        except Exception:
+            self._fermer(entree)
+            return
+        entree["rendue"] = time.monotonic()
+        self._libres.put_nowait(entree)
+
+    @contextmanager
+    def connexion(self):
+        """Emprunte une connexion et la rend au pool, même en cas d'exception"""
+        entree = self._emprunter()
+        casse = False
+        try:
+            yield entree["conn"]
+        except mysql.connector.errors.OperationalError:
+            casse = True
+            raise
+        except mysql.connector.errors.InterfaceError:
+            casse = True
+            raise
+        finally:
+            self._rendre(entree, casse)
+
+    @contextmanager
+    def curseur(self, dictionary=True):
+        """Raccourci: connexion + curseur, fermés automatiquement"""
+        with self.connexion() as conn:
+            cursor = conn.cursor(dictionary=dictionary)
+            try:
+                yield conn, CurseurChronometre(cursor)
+            finally:
+                cursor.close()
+
+    def ping(self):
+        """Aller-retour SELECT 1 sur une connexion du pool; renvoie la latence en secondes"""
+        debut = time.perf_counter()
+        with self.curseur(dictionary=False) as (conn, cursor):
+            cursor.execute("SELECT 1")
+            cursor.fetchall()
+        return time.perf_counter() - debut
+
+    def stats(self):
+        with self._verrou:
+            return {
+                "taille_max": self.taille,
+                "ouvertes": self._creees,
+                "empruntees": self._empruntees,
+                "libres": self._libres.qsize(),
+                "utilisation": round(self._empruntees / self.taille, 3) if self.taille else 0,
+                "emprunts": self._nb_emprunts,
+                "attente_moyenne_ms": round(1000 * self._attente_totale / self._nb_emprunts, 3) if self._nb_emprunts else 0,
+                "attente_max_ms": round(1000 * self._attente_max_observee, 3),
+                "recyclages": self._nb_recyclages,
+                "echecs_sante": self._nb_echecs_sante,
+                "epuisements": self._nb_epuisements,
+            }
+
+    def fermer(self):
+        while True:
+            try:
+                entree = self._libres.get_nowait()
+            except queue.Empty:
+                break
+            self._fermer(entree)
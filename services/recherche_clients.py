@@ -0,0 +1,313 @@
+"""Recherche de clients par nom, prénom, email ou téléphone (autocomplétion).
+
+Index en mémoire reconstruit périodiquement depuis MySQL. Il n'est pas mis à jour
+client par client: un client ajouté en base (import_donnees.py, autre application)
+n'est trouvé qu'après la reconstruction suivante, au plus RECHERCHE_RAFRAICHISSEMENT
+secondes plus tard, ou aussitôt après POST /clients/recherche/reconstruire.
+
+- préfixes: tableau trié des jetons normalisés (mots du nom et du prénom, email et
+  sa partie locale, téléphone complet et national). Un préfixe est une plage
+  contiguë trouvée par bisection (trie compacté), en O(log n + k);
+- fautes de frappe: trigrammes des noms et prénoms; les candidats qui partagent
+  assez de trigrammes avec le mot tapé sont retenus à distance d'édition bornée.
+
+Chaque mot de la requête doit correspondre à un jeton du client (ET). Le score
+cumule exact > préfixe > approché, pondéré par champ.
+
+Téléphones: "+228 90 12 34 56", "0022890123456", "90123456" et "90 12 34 56"
+désignent le même numéro (chiffres, indicatif 228 ajouté aux numéros nationaux).
+"""
+import heapq
+import logging
+import threading
+import time
+import unicodedata
+from bisect import bisect_left
+from collections import Counter
+
+import traces
+
+INDICATIF = '228'
+LONGUEUR_NATIONALE = 8
+
+POIDS_CHAMPS = {'nom': 1.0, 'prenom': 1.0, 'email': 0.8, 'telephone': 1.0}
+SCORE_EXACT, SCORE_PREFIXE, SCORE_APPROCHE = 3.0, 2.0, 1.0
+# Au-delà, un préfixe trop court ("k") n'est pas parcouru en entier
+MAX_CORRESPONDANCES_PREFIXE = 2000
+# Jetons approchés examinés par mot (ceux qui partagent le plus de trigrammes)
+MAX_CANDIDATS_APPROCHES = 100
+
+journal = traces.journal(__name__)
+
+
+def normaliser_texte(texte):
+    """Minuscules sans accents: 'Agbéto' -> 'agbeto'"""
+    decompose = unicodedata.normalize('NFKD', str(texte or ''))
+    return ''.join(c for c in decompose if not unicodedata.combining(c)).lower().strip()
+
+
+def chiffres(texte):
+    return ''.join(c for c in str(texte or '') if c.isdigit())
+
+
+def normaliser_telephone(telephone):
+    """Numéro complet en chiffres avec indicatif ('22890123456'), None s'il n'y a pas de chiffres"""
+    numero = chiffres(telephone)
+    if numero.startswith('00'):
+        numero = numero[2:]
+    if len(numero) == LONGUEUR_NATIONALE:
+        numero = INDICATIF + numero
+    return numero or None
+
+
+def est_telephone(requete):
+    """Requête composée uniquement de chiffres et de séparateurs de numéro"""
+    brut = str(requete or '').strip()
+    return len(chiffres(brut)) >= 2 and all(c.isdigit() or c in ' +-.()' for c in brut)
+
+
+def trigrammes(mot):
+    mot = f"^{mot}$"
+    return {mot[i:i + 3] for i in range(len(mot) - 2)}
+
+
+def distance_bornee(a, b, borne):
+    """Distance de Damerau-Levenshtein restreinte (deux lettres voisines inversées comptent
+    pour une faute: 'agebto' -> 'agbeto'), ou borne + 1 dès qu'elle est dépassée"""
+    if abs(len(a) - len(b)) > borne:
+        return borne + 1
+    avant = None
+    precedente = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        courante = [i]
+        for j, cb in enumerate(b, 1):
+            distance = min(precedente[j] + 1, courante[j - 1] + 1, precedente[j - 1] + (ca != cb))
+            if avant is not None and j > 1 and ca == b[j - 2] and a[i - 2] == cb:
+                distance = min(distance, avant[j - 2] + 1)
+            courante.append(distance)
+        if min(courante) > borne:
+            return borne + 1
+        avant, precedente = precedente, courante
+    return precedente[-1]
+
+
+def tolerance(mot):
+    return 0 if len(mot) < 4 else 1 if len(mot) < 7 else 2
+
+
+def jetons_client(client):
+    """[(jeton, champ)] d'un client"""
+    jetons = []
+    for champ in ('nom', 'prenom'):
+        for mot in normaliser_texte(client.get(champ)).replace('-', ' ').split():
+            jetons.append((mot, champ))
+    email = normaliser_texte(client.get('email'))
+    if email:
+        jetons.append((email, 'email'))
+        locale = email.split('@', 1)[0]
+        for mot in {locale, *locale.replace('.', ' ').replace('_', ' ').replace('-', ' ').split()}:
+            if mot != email:
+                jetons.append((mot, 'email'))
+    numero = normaliser_telephone(client.get('telephone'))
+    if numero:
+        jetons.append((numero, 'telephone'))
+        if numero.startswith(INDICATIF):
+            jetons.append((numero[len(INDICATIF):], 'telephone'))
+    return jetons
+
+
+class IndexClients:
+    """Index d'autocomplétion reconstruit en arrière-plan; None tant qu'il n'est pas prêt"""
+
+    def __init__(self, source, intervalle=300.0):
+        self.source = source          # callable -> itérable de clients (dict)
+        self.intervalle = intervalle
+        self._verrou = threading.Lock()
+        self._thread = None
+        self._arret = threading.Event()
+        self._reveil = threading.Event()
+        self._etat = None             # instantané immuable, remplacé en bloc
+        self.construit_le = None
+        self.duree_construction = None
+
+    # --- Construction ------------------------------------------------------
+
+    def construire(self, clients):
+        debut = time.perf_counter()
+        fiches = {}
+        entrees = []
+        for client in clients:
+            fiches[client['id_client']] = client
+            for jeton, champ in jetons_client(client):
+                entrees.append((jeton, client['id_client'], champ))
+        entrees.sort()
+        cles = [jeton for jeton, _, _ in entrees]
+        references = [(id_client, champ) for _, id_client, champ in entrees]
+
+        # Trigrammes des noms et prénoms distincts: emails et téléphones se cherchent par préfixe
+        vocabulaire = sorted({jeton for jeton, _, champ in entrees if champ in ('nom', 'prenom')})
+        index_trigrammes = {}
+        for position, jeton in enumerate(vocabulaire):
+            for trigramme in trigrammes(jeton):
+                index_trigrammes.setdefault(trigramme, []).append(position)
+
+        etat = (fiches, cles, references, vocabulaire, index_trigrammes)
+        with self._verrou:
+            self._etat = etat
+            self.construit_le = time.time()
+            self.duree_construction = time.perf_counter() - debut
+        return len(fiches)
+
+    def _demarrer(self):
+        with self._verrou:
+            if self._thread is not None:
+                return False
+            self._arret.clear()
+            self._reveil.clear()
+            self._thread = threading.Thread(target=self._boucle, name="index-clients", daemon=True)
+            self._thread.start()
+            return True
+
+    def _boucle(self):
+        while not self._arret.is_set():
+            try:
+                self.construire(self.source())
+            except Exception as e:
+                # Base indisponible: on garde l'index précédent, la recherche SQL prend le relais sinon
+                traces.evenement(journal, logging.WARNING, "index clients non reconstruit", erreur=str(e))
+            self._reveil.wait(self.intervalle)
+            self._reveil.clear()
+
+    def reconstruire(self):
+        """Reconstruction immédiate, en arrière-plan (après un import de clients)"""
+        if not self._demarrer():
+            self._reveil.set()
+
+    def pret(self):
+        self._demarrer()
+        return self._etat is not None
+
+    def arreter(self):
+        self._arret.set()
+        self._reveil.set()
+        with self._verrou:
+            self._thread = None
+
+    # --- Recherche ---------------------------------------------------------
+
+    def _prefixe(self, cles, references, prefixe, exact=False):
+        """{id_client: score} des jetons commençant par prefixe (ou égaux, si exact)"""
+        trouves = {}
+        position = bisect_left(cles, prefixe)
+        fin = min(len(cles), position + MAX_CORRESPONDANCES_PREFIXE)
+        while position < fin and (cles[position] == prefixe if exact else cles[position].startswith(prefixe)):
+            id_client, champ = references[position]
+            score = (SCORE_EXACT if cles[position] == prefixe else SCORE_PREFIXE) * POIDS_CHAMPS[champ]
+            if score > trouves.get(id_client, 0):
+                trouves[id_client] = score
+            position += 1
+        return trouves
+
+    def _approche(self, etat, mot):
+        """Jetons à distance bornée du mot (ou dont le début l'est): fautes de frappe"""
+        _, cles, references, vocabulaire, index_trigrammes = etat
+        borne = tolerance(mot)
+        if not borne:
+            return {}
+        tri = trigrammes(mot)
+        communs = Counter()
+        for trigramme in tri:
+            communs.update(index_trigrammes.get(trigramme, ()))
+        # Une faute détruit au plus 4 trigrammes (inversion de deux lettres voisines)
+        seuil = max(1, len(tri) - 4 * borne)
+        candidats = [(nombre, position) for position, nombre in communs.items() if nombre >= seuil]
+        trouves = {}
+        for _, position in heapq.nlargest(MAX_CANDIDATS_APPROCHES, candidats):
+            if len(trouves) >= MAX_CORRESPONDANCES_PREFIXE:
+                break
+            jeton = vocabulaire[position]
+            distance = distance_bornee(mot, jeton, borne)
+            if distance > borne and len(jeton) > len(mot):
+                distance = distance_bornee(mot, jeton[:len(mot)], borne)
+            if distance > borne:
+                continue
+            score = SCORE_APPROCHE - 0.25 * distance
+            for id_client, score_champ in self._prefixe(cles, references, jeton, exact=True).items():
+                score_champ = score * score_champ / SCORE_EXACT
+                if score_champ > trouves.get(id_client, 0):
+                    trouves[id_client] = score_champ
+        return trouves
+
+    def rechercher(self, requete, limite=10):
+        """[(client, score)] triés par score décroissant; None si l'index n'est pas prêt"""
+        if not self.pret():
+            return None
+        etat = self._etat
+        fiches, cles, references, _, _ = etat
+
+        if est_telephone(requete):
+            numero = chiffres(requete)
+            numero = numero[2:] if numero.startswith('00') else numero
+            mots = [numero]
+        else:
+            mots = normaliser_texte(requete).split()
+        if not mots:
+            return []
+
+        scores = None
+        for mot in mots:
+            trouves = self._prefixe(cles, references, mot)
+            if len(trouves) < limite and not mot.isdigit():
+                for id_client, score in self._approche(etat, mot).items():
+                    if score > trouves.get(id_client, 0):
+                        trouves[id_client] = score
+            if scores is None:
+                scores = trouves
+            else:
+                scores = {id_client: scores[id_client] + score for id_client, score in trouves.items() if id_client in scores}
+            if not scores:
+                return []
+        meilleurs = heapq.nlargest(limite, scores.items(), key=lambda item: (item[1], -item[0]))
+        return [(fiches[id_client], round(score, 3)) for id_client, score in meilleurs]
+
+    def stats(self):
+        etat = self._etat
+        return {
+            "pret": etat is not None,
+            "clients": len(etat[0]) if etat else 0,
+            "jetons": len(etat[1]) if etat else 0,
+            "construit_le": self.construit_le,
+            "duree_construction_ms": round(1000 * self.duree_construction, 1) if self.duree_construction else None,
+        }
+
+
+def requete_sql(requete, colonnes, limite):
+    """(SELECT, params) de repli sur MySQL: FULLTEXT en mode booléen pour les mots d'au moins
+    3 lettres, LIKE 'préfixe%' (index B-tree) en deçà, colonne telephone_normalise pour les numéros"""
+    select = f"SELECT {', '.join(colonnes)} FROM client WHERE "
+    if est_telephone(requete):
+        numero = chiffres(requete)
+        numero = numero[2:] if numero.startswith('00') else numero
+        if numero.startswith(INDICATIF):
+            return select + "telephone_normalise LIKE %s ORDER BY id_client LIMIT %s", (numero + '%', limite)
+        return (select + "(telephone_normalise LIKE %s OR telephone_normalise LIKE %s) ORDER BY id_client LIMIT %s",
+                (numero + '%', INDICATIF + numero + '%', limite))
+
+    mots = [''.join(c for c in mot if c.isalnum()) for mot in normaliser_texte(requete).replace('@', ' ').replace('.', ' ').split()]
+    mots = [mot for mot in mots if mot]
+    longs = [mot for mot in mots if len(mot) >= 3]
+    courts = [mot for mot in mots if len(mot) < 3]
+    conditions, params = [], []
+    if longs:
+        conditions.append("MATCH(nom, prenom, email) AGAINST (%s IN BOOLEAN MODE)")
+        params.append(' '.join(f"+{mot}*" for mot in longs))
+    for mot in courts:
+        conditions.append("(nom LIKE %s OR prenom LIKE %s OR email LIKE %s)")
+        params.extend([mot + '%'] * 3)
+    if not conditions:
+        return None, None
+    ordre = "MATCH(nom, prenom, email) AGAINST (%s IN BOOLEAN MODE) DESC, id_client" if longs else "id_client"
+    if longs:
+        params.append(params[0])
+    params.append(limite)
+    return select + " AND ".join(conditions) + f" ORDER BY {ordre} LIMIT %s", tuple(params)
@@ -1,56 +1,189 @@
 from flask import Flask, jsonify, request
-import mysql.connector
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import configuration
+import partitions
+import traces
+from bus_evenements import BusEvenements, reponse_sse
+from cache_ttl import CacheTTL
+from pool_mysql import PoolMySQL
+from parametres import ids_demandes, pagination_demandee, champs_demandes, reponse_paginee, reponse_conditionnelle
 
 app = Flask(__name__)
+traces.instrumenter(app, 'service_chambres')
 
-# Configuration avec TA base
-db_config = {
-    'host': 'localhost',
-    'user': 'root',
-    'password': '',
-    'database': 'service_chambres'
+# Une base MySQL et un pool par partition locale (variables MYSQL_*, table PARTITIONS)
+table = partitions.table
+pools = {
+    nom: PoolMySQL(table.config_mysql('chambres', nom), taille=int(os.environ.get('MYSQL_POOL_TAILLE', 10)))
+    for nom in table.locales
 }
 
+@configuration.a_l_arret
+def fermer_pools():
+    for pool in pools.values():
+        pool.fermer()
+
+traces.registre.jauge('mysql_pool_utilisation', lambda: max(pool.stats()['utilisation'] for pool in pools.values()),
+                      "Part des connexions MySQL empruntées (partition la plus chargée)")
+
+# id_chambre -> partition, appris aux lectures (une chambre ne change pas d'agence)
+localisations = CacheTTL('localisation_chambres', taille_max=100000, ttl=3600)
+
+def pool_partition(nom):
+    if nom not in pools:
+        raise partitions.PartitionDistante(nom)
+    return pools[nom]
+
+def pool_reference():
+    """Pool des données de référence (table agence, répliquée dans chaque partition)"""
+    return pools.get(table.defaut) or next(iter(pools.values()))
+
+def localiser(ids, agence=None):
+    """{partition: [ids]} des chambres; celles qu'on n'a jamais vues sont cherchées dans chaque
+    partition locale (une chambre introuvable n'apparaît nulle part)"""
+    if agence is not None:
+        return {table.partition(agence): list(ids)}
+    if len(pools) == 1:
+        return {next(iter(pools)): list(ids)}
+    groupes, inconnues = {}, []
+    for id_chambre in ids:
+        nom = localisations.get(id_chambre)
+        if nom is None:
+            inconnues.append(id_chambre)
+        else:
+            groupes.setdefault(nom, []).append(id_chambre)
+    if inconnues:
+        def chercher(nom):
+            with pools[nom].curseur(dictionary=False) as (conn, cursor):
+                cursor.execute(f"SELECT id_chambre FROM chambre WHERE id_chambre IN ({', '.join(['%s'] * len(inconnues))})",
+                               tuple(inconnues))
+                return [ligne[0] for ligne in cursor.fetchall()]
+        for nom, trouvees in partitions.en_parallele(chercher, pools).items():
+            for id_chambre in trouvees:
+                localisations.set(id_chambre, nom)
+                groupes.setdefault(nom, []).append(id_chambre)
+    return groupes
+
+def modifier_chambres(requete, params, ids, agence=None):
+    """UPDATE dans la partition de chaque chambre ({ids} reçoit les marqueurs). Renvoie le nombre de lignes modifiées"""
+    modifiees = 0
+    for nom, ids_partition in localiser(ids, agence).items():
+        with pool_partition(nom).curseur(dictionary=False) as (conn, cursor):
+            cursor.execute(requete.format(ids=", ".join(["%s"] * len(ids_partition))), (*params, *ids_partition))
+            conn.commit()
+            modifiees += cursor.rowcount
+    return modifiees
+
+@app.errorhandler(partitions.PartitionDistante)
+def partition_distante(e):
+    return jsonify({"error": str(e), "partition": e.partition}), 421
+
+# Changements de disponibilité diffusés sur /evenements (relayés par la passerelle)
+bus = BusEvenements('service_chambres')
+
+def publier_disponibilite(ids, disponible):
+    bus.publier('disponibilite', {"chambres": list(ids), "disponible": bool(disponible)})
+
 @app.route('/')
 def racine():
     return jsonify({"status": "OK", "service": "Chambres"})
 
+COLONNES_CHAMBRE = ('id_chambre', 'type_chambre', 'etage', 'prix', 'disponible', 'id_agence')
+
+def lister_chambres(condition=None, agence=None):
+    """Liste paginée (?after=&limit=), projetée (?fields=) et filtrable par ?agence= des chambres.
+    Avec une agence, seule sa partition est lue; sinon les partitions locales, fusionnées par id_chambre"""
+    colonnes = champs_demandes(COLONNES_CHAMBRE, obligatoires=('id_chambre',)) or COLONNES_CHAMBRE
+    select = f"SELECT {', '.join(colonnes)} FROM chambre"
+    conditions = [condition] if condition else []
+    params = []
+
+    if agence is None:
+        agence = request.args.get('agence', type=int)
+    if agence is not None:
+        conditions.append("id_agence = %s")
+        params.append(agence)
+
+    ids = ids_demandes()
+    if ids is not None:
+        # Recherche groupée: ?ids=1,2,3
+        if not ids:
+            return jsonify([])
+        conditions.append(f"id_chambre IN ({', '.join(['%s'] * len(ids))})")
+        params.extend(ids)
+        after, limit = None, len(ids)
+    else:
+        after, limit = pagination_demandee()
+        if after is not None:
+            conditions.append("id_chambre > %s")
+            params.append(after)
+
+    if conditions:
+        select += " WHERE " + " AND ".join(conditions)
+    select += " ORDER BY id_chambre LIMIT %s"
+    params.append(limit)
+
+    def lire(nom):
+        with pool_partition(nom).curseur() as (conn, cursor):
+            cursor.execute(select, tuple(params))
+            return cursor.fetchall()
+
+    lues = partitions.en_parallele(lire, [table.partition(agence)] if agence is not None else pools)
+    if len(pools) > 1:
+        for nom, lignes in lues.items():
+            for chambre in lignes:
+                localisations.set(chambre['id_chambre'], nom)
+    chambres = partitions.fusionner(lues.values(), 'id_chambre', limite=limit)
+    if ids is not None:
+        return reponse_conditionnelle(jsonify(chambres))
+    return reponse_conditionnelle(reponse_paginee(jsonify(chambres), chambres, limit, 'id_chambre'))
+
 @app.route('/chambres', methods=['GET'])
 def get_chambres():
-    conn = mysql.connector.connect(**db_config)
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("SELECT * FROM chambre")
-    chambres = cursor.fetchall()
-    conn.close()
-    return jsonify(chambres)
+    return lister_chambres()
 
 @app.route('/chambres/disponibles', methods=['GET'])
 def get_chambres_disponibles():
-    conn = mysql.connector.connect(**db_config)
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("SELECT * FROM chambre WHERE disponible = TRUE")
-    chambres = cursor.fetchall()
-    conn.close()
-    return jsonify(chambres)
+    return lister_chambres("disponible = TRUE")
+
+@app.route('/agences/<int:id_agence>/chambres', methods=['GET'])
+def get_chambres_agence(id_agence):
+    return lister_chambres(agence=id_agence)
+
+@app.route('/agences/<int:id_agence>/chambres/disponibles', methods=['GET'])
+def get_chambres_disponibles_agence(id_agence):
+    return lister_chambres("disponible = TRUE", agence=id_agence)
+
+@app.route('/chambres/capacite', methods=['GET'])
+def get_capacite():
+    """Nombre de chambres par agence et par type (dénominateur des taux d'occupation)"""
+    def lire(nom):
+        with pools[nom].curseur() as (conn, cursor):
+            cursor.execute("SELECT id_agence, type_chambre, COUNT(*) AS chambres FROM chambre "
+                           "GROUP BY id_agence, type_chambre ORDER BY id_agence, type_chambre")
+            return cursor.fetchall()
+    capacite = partitions.fusionner(partitions.en_parallele(lire, pools).values(), 'id_agence')
+    return reponse_conditionnelle(jsonify(capacite))
 
 @app.route('/chambre/<int:id>', methods=['GET'])
 def get_chambre(id):
-    conn = mysql.connector.connect(**db_config)
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("SELECT * FROM chambre WHERE id_chambre = %s", (id,))
-    chambre = cursor.fetchone()
-    conn.close()
+    chambre = None
+    for nom in localiser([id], request.args.get('agence', type=int)):
+        with pool_partition(nom).curseur() as (conn, cursor):
+            cursor.execute("SELECT * FROM chambre WHERE id_chambre = %s", (id,))
+            chambre = cursor.fetchone()
     return jsonify(chambre) if chambre else ({"error": "Chambre non trouvée"}, 404)
 
 @app.route('/agences', methods=['GET'])
 def get_agences():
     """Récupère toutes les agences"""
-    conn = mysql.connector.connect(**db_config)
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("SELECT * FROM agence")
-    agences = cursor.fetchall()
-    conn.close()
-    return jsonify(agences)
+    with pool_reference().curseur() as (conn, cursor):
+        cursor.execute("SELECT * FROM agence")
+        agences = cursor.fetchall()
+    return reponse_conditionnelle(jsonify(agences))
 
 # AJOUTE CETTE NOUVELLE ROUTE 
 @app.route('/chambre/<int:id>/disponible', methods=['PUT'])
@@ -60,13 +193,11 @@ def update_disponibilite(id):
         data = request.json
         disponible = data.get('disponible')
         
-        conn = mysql.connector.connect(**db_config)
-        cursor = conn.cursor()
-        cursor.execute("UPDATE chambre SET disponible = %s WHERE id_chambre = %s", 
-                      (disponible, id))
-        conn.commit()
-        conn.close()
+        modifiee = modifier_chambres("UPDATE chambre SET disponible = %s WHERE id_chambre IN ({ids})",
+                                     (disponible,), [id], request.args.get('agence', type=int)) == 1
         
+        if modifiee:
+            publier_disponibilite([id], disponible)
         return jsonify({
             "success": True, 
             "message": f"Chambre {id} mise à jour: disponible = {disponible}"
@@ -74,26 +205,75 @@ def update_disponibilite(id):
     except Exception as e:
         return jsonify({"error": f"Erreur MySQL: {str(e)}"}), 500
 
-def liberer_chambre(chambre_id):
+@app.route('/chambres/disponible', methods=['PUT'])
+def update_disponibilite_lot():
+    """Met à jour la disponibilité de plusieurs chambres en une requête: {"ids": [...], "disponible": bool}"""
+    try:
+        data = request.json or {}
+        ids = [int(i) for i in data.get('ids') or []]
+        disponible = data.get('disponible')
+        if not ids or disponible is None:
+            return jsonify({"error": "ids et disponible requis"}), 400
+        
+        modifiees = modifier_chambres("UPDATE chambre SET disponible = %s WHERE id_chambre IN ({ids})",
+                                      (disponible,), ids, data.get('id_agence'))
+        
+        if modifiees:
+            publier_disponibilite(ids, disponible)
+        return jsonify({"success": True, "modifiees": modifiees, "disponible": disponible})
+    except (TypeError, ValueError):
+        return jsonify({"error": "ids doit être une liste d'entiers"}), 400
+    except Exception as e:
+        return jsonify({"error": f"Erreur MySQL: {str(e)}"}), 500
+
+def liberer_chambre(chambre_id, agence=None):
     """Service qui libère seulement une chambre"""
     try:
-        conn = mysql.connector.connect(**db_config)
-        cursor = conn.cursor()
-        cursor.execute("UPDATE chambre SET disponible = TRUE WHERE id_chambre = %s", (chambre_id,))
-        conn.commit()
+        modifiees = modifier_chambres("UPDATE chambre SET disponible = TRUE WHERE id_chambre IN ({ids})",
+                                      (), [chambre_id], agence)
         
-        if cursor.rowcount == 1:
+        if modifiees == 1:
+            publier_disponibilite([chambre_id], True)
             return {"success": True, "message": "Chambre libérée"}
         else:
             return {"success": False, "error": "Chambre non trouvée"}
             
     except Exception as e:
         return {"success": False, "error": f"Erreur MySQL: {str(e)}"}
-    finally:
-        if 'conn' in locals() and conn.is_connected():
-            conn.close()
+
+@app.route('/evenements', methods=['GET'])
+def evenements():
+    """Flux SSE des changements de disponibilité (reprise via Last-Event-ID)"""
+    return reponse_sse(bus.flux_sse(request.headers.get('Last-Event-ID')))
+
+@app.route('/health', methods=['GET'])
+def health():
+    """Sonde: connectivité et latence MySQL de chaque partition locale.
+    503 seulement si aucune ne répond: une partition en panne n'arrête pas les autres agences"""
+    latences, erreurs = {}, {}
+    for nom, pool in pools.items():
+        try:
+            latences[nom] = round(1000 * pool.ping(), 2)
+        except Exception as e:
+            erreurs[nom] = str(e)
+    if not latences:
+        return jsonify({"status": "ERREUR", "service": "Chambres", "database": "MySQL", "error": "; ".join(erreurs.values()),
+                        "partitions_en_erreur": erreurs}), 503
+    return jsonify({"status": "DEGRADE" if erreurs else "OK", "service": "Chambres", "database": "MySQL",
+                    "latence_ms": max(latences.values()), "partitions": latences, "partitions_en_erreur": erreurs})
+
+@app.route('/pool/stats', methods=['GET'])
+def pool_stats():
+    """Métriques des pools MySQL (attente, utilisation), par partition locale"""
+    return jsonify({nom: pool.stats() for nom, pool in pools.items()})
+
+@app.route('/partitions', methods=['GET'])
+def get_partitions():
+    """Table de routage agence -> partition et partitions servies par ce nœud"""
+    return jsonify(table.stats())
 
 
 if __name__ == '__main__':
-    print("Service Chambres -> http://localhost:5001")
-    app.run(port=5001, debug=True)
+    # Développement seulement; en production: python serveur.py chambres
+    print(f"Service Chambres -> http://localhost:{configuration.port('chambres')}")
+    app.run(port=configuration.port('chambres'), debug=configuration.DEBUG)
@@ -1,37 +1,143 @@
-from flask import Flask, jsonify
-import mysql.connector
+from flask import Flask, jsonify, request
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import configuration
+import traces
+from pool_mysql import PoolMySQL
+from recherche_clients import IndexClients, requete_sql
+from parametres import ids_demandes, pagination_demandee, champs_demandes, reponse_paginee, reponse_conditionnelle
 
 app = Flask(__name__)
+traces.instrumenter(app, 'service_clients')
+
+# Base MySQL du service (variables MYSQL_*, voir configuration.py)
+db_config = configuration.config_mysql('clients')
 
-db_config = {
-    'host': 'localhost',
-    'user': 'root', 
-    'password': '',
-    'database': 'service_clients'
-}
+pool = PoolMySQL(db_config, taille=int(os.environ.get('MYSQL_POOL_TAILLE', 10)))
+configuration.a_l_arret(lambda: pool.fermer())
+traces.registre.jauge('mysql_pool_utilisation', lambda: pool.stats()['utilisation'],
+                      "Part des connexions MySQL empruntées")
 
 @app.route('/')
 def racine():
-    return jsonified({"status": "OK", "service": "Clients"})
+    return jsonify({"status": "OK", "service": "Clients"})
+
+COLONNES_CLIENT = ('id_client', 'nom', 'prenom', 'email', 'telephone', 'date_inscription')
 
 @app.route('/clients', methods=['GET'])
 def get_clients():
-    conn = mysql.connector.connect(**db_config)
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("SELECT * FROM client")
-    clients = cursor.fetchall()
-    conn.close()
-    return jsonify(clients)
+    """Liste paginée (?after=&limit=) et projetée (?fields=) des clients"""
+    colonnes = champs_demandes(COLONNES_CLIENT, obligatoires=('id_client',)) or COLONNES_CLIENT
+    select = f"SELECT {', '.join(colonnes)} FROM client"
+    params = []
+
+    ids = ids_demandes()
+    if ids is not None:
+        # Recherche groupée: ?ids=1,2,3
+        if not ids:
+            return jsonify([])
+        select += f" WHERE id_client IN ({', '.join(['%s'] * len(ids))})"
+        params.extend(ids)
+        limit = len(ids)
+    else:
+        after, limit = pagination_demandee()
+        if after is not None:
+            select += " WHERE id_client > %s"
+            params.append(after)
+
+    select += " ORDER BY id_client LIMIT %s"
+    params.append(limit)
+
+    with pool.curseur() as (conn, cursor):
+        cursor.execute(select, tuple(params))
+        clients = cursor.fetchall()
+    if ids is not None:
+        return reponse_conditionnelle(jsonify(clients))
+    return reponse_conditionnelle(reponse_paginee(jsonify(clients), clients, limit, 'id_client'))
+
+COLONNES_RECHERCHE = ('id_client', 'nom', 'prenom', 'email', 'telephone')
+
+def lire_clients(taille_page=5000):
+    """Tous les clients, page par page (source de l'index de recherche)"""
+    after = 0
+    while True:
+        with pool.curseur() as (conn, cursor):
+            cursor.execute(f"SELECT {', '.join(COLONNES_RECHERCHE)} FROM client WHERE id_client > %s "
+                           "ORDER BY id_client LIMIT %s", (after, taille_page))
+            page = cursor.fetchall()
+        yield from page
+        if len(page) < taille_page:
+            return
+        after = page[-1]['id_client']
+
+# Index d'autocomplétion en mémoire, reconstruit toutes les RECHERCHE_RAFRAICHISSEMENT secondes:
+# un client ajouté en base n'y figure qu'à la reconstruction suivante (ou après /reconstruire)
+index_recherche = IndexClients(lire_clients, intervalle=float(os.environ.get('RECHERCHE_RAFRAICHISSEMENT', 300)))
+configuration.a_l_arret(index_recherche.arreter)
+
+@app.route('/clients/recherche', methods=['GET'])
+def rechercher_clients():
+    """Autocomplétion ?q=<nom, email ou téléphone>&limit=N: préfixes et fautes de frappe, classés par score.
+    Tant que l'index n'est pas construit, repli sur MySQL (FULLTEXT et préfixes indexés)."""
+    requete = (request.args.get('q') or '').strip()
+    limit = min(max(request.args.get('limit', 10, type=int), 1), 50)
+    if not requete:
+        return jsonify([])
+
+    resultats = index_recherche.rechercher(requete, limit)
+    if resultats is not None:
+        clients = [dict(client, score=score) for client, score in resultats]
+        source = 'index'
+    else:
+        select, params = requete_sql(requete, COLONNES_RECHERCHE, limit)
+        clients = []
+        if select is not None:
+            try:
+                with pool.curseur() as (conn, cursor):
+                    cursor.execute(select, params)
+                    clients = cursor.fetchall()
+            except Exception as e:
+                # Ex: index FULLTEXT / colonne telephone_normalise absents (scripts.sql non appliqué)
+                return jsonify({"error": f"Recherche indisponible: {e}"}), 503
+        source = 'sql'
+    reponse = jsonify(clients)
+    reponse.headers['X-Recherche'] = source
+    return reponse
+
+@app.route('/clients/recherche/reconstruire', methods=['POST'])
+def reconstruire_recherche():
+    """Reconstruit l'index sans attendre RECHERCHE_RAFRAICHISSEMENT (après un import de clients)"""
+    index_recherche.reconstruire()
+    return jsonify({"success": True, "message": "Reconstruction de l'index lancée"}), 202
+
+@app.route('/clients/recherche/stats', methods=['GET'])
+def recherche_stats():
+    return jsonify(index_recherche.stats())
 
 @app.route('/client/<int:id>', methods=['GET'])
 def get_client(id):
-    conn = mysql.connector.connect(**db_config)
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("SELECT * FROM client WHERE id_client = %s", (id,))
-    client = cursor.fetchone()
-    conn.close()
+    with pool.curseur() as (conn, cursor):
+        cursor.execute("SELECT * FROM client WHERE id_client = %s", (id,))
+        client = cursor.fetchone()
     return jsonify(client) if client else ({"error": "Client non trouvé"}, 404)
 
+@app.route('/health', methods=['GET'])
+def health():
+    """Sonde: connectivité et latence MySQL (503 si la base ne répond pas)"""
+    try:
+        latence = pool.ping()
+    except Exception as e:
+        return jsonify({"status": "ERREUR", "service": "Clients", "database": "MySQL", "error": str(e)}), 503
+    return jsonify({"status": "OK", "service": "Clients", "database": "MySQL", "latence_ms": round(1000 * latence, 2)})
+
+@app.route('/pool/stats', methods=['GET'])
+def pool_stats():
+    """Métriques du pool MySQL (attente, utilisation)"""
+    return jsonify(pool.stats())
+
 if __name__ == '__main__':
-    print(" Service Clients -> http://localhost:5002")
-    app.run(port=5002, debug=True)
\ No newline at end of file
+    # Développement seulement; en production: python serveur.py clients
+    print(f" Service Clients -> http://localhost:{configuration.port('clients')}")
+    app.run(port=configuration.port('clients'), debug=configuration.DEBUG)
\ No newline at end of file
@@ -1,150 +1,818 @@
-from flask import Flask, jsonify, request
-from pymongo import MongoClient
-from datetime import datetime
-import random
+from flask import Flask, jsonify, request, Response, stream_with_context
+from pymongo import MongoClient, ASCENDING, DESCENDING, ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure, PyMongoError
+from datetime import datetime, date
+import hashlib
+import heapq
+import logging
+import os
+import sys
+import threading
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from bson.objectid import ObjectId
+from werkzeug.exceptions import HTTPException
+from disponibilites import CalendrierChambres, sejour_reservation, depart_depuis, jour, bitset_en_texte
+from parametres import ids_demandes, pagination_demandee, champs_demandes, reponse_paginee
+import configuration
+import partitions
+import traces
+from format_echange import dumps_json
+from bus_evenements import BusEvenements, reponse_sse
+import analytique
+import boite_envoi
+import nuitees
 
 app = Flask(__name__)
+traces.instrumenter(app, 'service_reservations')
+journal = traces.journal(__name__)
 
-# Connexion MongoDB
-client = MongoClient('mongodb://localhost:27017/')
-db = client['hotel_reservations']
-reservations_collection = db['reservations']
+# Connexions MongoDB (MONGO_URI, MONGO_BASE, table PARTITIONS): un client par serveur, chaque
+# commande chronométrée par l'écouteur de traces
+table = partitions.table
+clients_mongo = {}
+
+def client_mongo(uri):
+    if uri not in clients_mongo:
+        clients_mongo[uri] = MongoClient(uri, event_listeners=[traces.EcouteurMongo()])
+    return clients_mongo[uri]
+
+@configuration.a_l_arret
+def fermer_clients():
+    for client_partition in clients_mongo.values():
+        client_partition.close()
+
+client = client_mongo(configuration.MONGO_URI)
+db = client[configuration.MONGO_BASE]
+# Réservations: une collection par partition locale. Compteur de numéros et agrégats restent
+# dans la base principale (numéros uniques tous partitions confondues)
+collections = {}
+for nom in table.locales:
+    config_partition = table.config_mongo(nom)
+    collections[nom] = client_mongo(config_partition['uri'])[config_partition['base']][config_partition['collection']]
+reservations_collection = collections[table.defaut] if table.defaut in collections else next(iter(collections.values()))
+compteurs_collection = db['compteurs']
+stats_collection = db['stats_occupation']
+# Identifie la collection d'agrégats lue par /stats: des nœuds qui partagent la même base
+# principale renvoient la même source, que la passerelle ne compte qu'une fois
+SOURCE_STATS = hashlib.sha1(f"{configuration.MONGO_URI}/{stats_collection.full_name}".encode()).hexdigest()[:12]
+
+def collection_partition(nom):
+    if nom not in collections:
+        raise partitions.PartitionDistante(nom)
+    return collections[nom]
+
+def collection_agence(id_agence):
+    """Collection de la partition d'une agence (réservations sans agence: partition par défaut)"""
+    return collection_partition(table.partition(id_agence))
+
+def partitions_visees(agence=None):
+    """Partitions à interroger: celle de l'agence si elle est connue, sinon toutes les partitions locales"""
+    if agence is None:
+        return list(collections)
+    nom = table.partition(agence)
+    collection_partition(nom)
+    return [nom]
+
+def lire_partitions(lecture, agence=None):
+    """[lecture(collection)] exécutées en parallèle sur les partitions visées"""
+    return list(partitions.en_parallele(lambda nom: lecture(collections[nom]), partitions_visees(agence)).values())
+
+@app.errorhandler(partitions.PartitionDistante)
+def partition_distante(e):
+    return jsonify({"error": str(e), "partition": e.partition}), 421
+
+# Index couvrant les requêtes fréquentes du service
+INDEX_RESERVATIONS = [
+    {"keys": [("client_id", ASCENDING)], "name": "client_id"},
+    {"keys": [("chambre_id", ASCENDING)], "name": "chambre_id"},
+    {"keys": [("statut", ASCENDING), ("date_reservation", DESCENDING)], "name": "statut_date"},
+    {"keys": [("numero_reservation", ASCENDING)], "name": "numero_reservation", "unique": True},
+    {"keys": [("cle_idempotence", ASCENDING)], "name": "cle_idempotence", "unique": True, "sparse": True},
+    {"keys": [("id_agence", ASCENDING), ("_id", DESCENDING)], "name": "agence_id"},
+    boite_envoi.INDEX,
+]
+
+def creer_index():
+    """Crée (si besoin) les index des collections réservations (et nuits posées) de chaque partition locale"""
+    for nom, collection in collections.items():
+        a_creer = [(collection, index) for index in INDEX_RESERVATIONS]
+        a_creer += [(nuitees.collection_nuitees(collection), index) for index in nuitees.INDEX]
+        for cible, index in a_creer:
+            options = {cle: valeur for cle, valeur in index.items() if cle != "keys"}
+            try:
+                cible.create_index(index["keys"], **options)
+            except OperationFailure as e:
+                # Ex: doublons historiques de numero_reservation empêchant l'index unique
+                traces.evenement(journal, logging.WARNING, "index non cree", index=index['name'],
+                                 partition=nom, erreur=str(e))
+
+def nouveaux_numeros(nombre=1):
+    """Numéros de réservation sans collision, tirés d'un compteur atomique ($inc)"""
+    compteur = compteurs_collection.find_one_and_update(
+        {"_id": "numero_reservation"},
+        {"$inc": {"valeur": nombre}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    fin = compteur["valeur"]
+    return [f"RES{n:06d}" for n in range(fin - nombre + 1, fin + 1)]
+
+def normaliser_id(valeur):
+    """client_id / chambre_id sont stockés en int, quelle que soit la forme reçue"""
+    return int(valeur)
+
+# Requêtes critiques vérifiées par explain() (aucune ne doit finir en COLLSCAN)
+REQUETES_CRITIQUES = {
+    "reservations_client": {"filter": {"client_id": 1}},
+    "reservations_chambre": {"filter": {"chambre_id": 1}},
+    "actives": {"filter": {"statut": {"$ne": "annulée"}}, "sort": [("_id", DESCENDING)], "limit": 50},
+    "export_statut_date": {"filter": {"statut": "en cours", "date_reservation": {"$gte": "2024-01-01"}}},
+    "par_id": {"filter": {"_id": ObjectId("000000000000000000000000")}},
+    "par_numero": {"filter": {"numero_reservation": "RES0000"}},
+    "derniere": {"filter": {}, "sort": [("_id", DESCENDING)], "limit": 1},
+    "compte_statut": {"filter": {"statut": "en cours"}},
+    "agence_actives": {"filter": {"id_agence": 1, "statut": {"$ne": "annulée"}}, "sort": [("_id", DESCENDING)], "limit": 50},
+    "boite_envoi": {"filter": boite_envoi.FILTRE_EN_ATTENTE, "sort": [(f"{boite_envoi.CHAMP}._id", ASCENDING)], "limit": 500},
+}
+
+def etapes_plan(plan):
+    """Toutes les étapes (stage) d'un plan d'exécution MongoDB"""
+    etapes = [plan.get("stage")]
+    for cle in ("inputStage", "queryPlan"):
+        if cle in plan:
+            etapes.extend(etapes_plan(plan[cle]))
+    for sous_plan in plan.get("inputStages", []):
+        etapes.extend(etapes_plan(sous_plan))
+    return [etape for etape in etapes if etape]
+
+def verifier_plans():
+    """Lance explain() sur chaque requête critique et renvoie les étapes du plan gagnant"""
+    resultats = {}
+    for nom, requete in REQUETES_CRITIQUES.items():
+        curseur = reservations_collection.find(requete["filter"])
+        if "sort" in requete:
+            curseur = curseur.sort(requete["sort"])
+        if "limit" in requete:
+            curseur = curseur.limit(requete["limit"])
+        plan = curseur.explain()["queryPlanner"]["winningPlan"]
+        resultats[nom] = etapes_plan(plan)
+    return resultats
+
+# Index d'intervalles des séjours en cours, par chambre: cache de lecture de /disponibilites et
+# /calendrier. Les autres processus écrivent aussi: il est rechargé toutes les
+# CALENDRIER_RAFRAICHISSEMENT secondes, la garde contre les chevauchements restant en base
+calendrier = CalendrierChambres()
+CALENDRIER_RAFRAICHISSEMENT = float(os.environ.get('CALENDRIER_RAFRAICHISSEMENT', 30))
+
+def charger_calendrier(completer_nuits=False):
+    """Reconstruit l'index des séjours depuis MongoDB (toutes les partitions locales).
+    completer_nuits: pose aussi les nuits à venir des réservations écrites sans la garde"""
+    nouveau = CalendrierChambres()
+    aujourd_hui = jour(date.today().isoformat())
+    projection = {"chambre_id": 1, "date_arrivee": 1, "date_depart": 1, "date_reservation": 1, "nuits": 1}
+    for collection in collections.values():
+        a_completer = []
+        for resa in collection.find({"statut": "en cours"}, projection).batch_size(5000):
+            sejour = sejour_reservation(resa)
+            if sejour and resa.get('chambre_id') is not None:
+                nouveau.ajouter(resa['chambre_id'], sejour[0], sejour[1], resa['_id'])
+                if completer_nuits and sejour[1] > aujourd_hui:
+                    a_completer.append((resa['chambre_id'], max(sejour[0], aujourd_hui), sejour[1], resa['_id']))
+        nuitees.completer(collection, a_completer)
+    calendrier.remplacer(nouveau)
+
+def rafraichir_calendrier(arret):
+    while not arret.wait(CALENDRIER_RAFRAICHISSEMENT):
+        try:
+            charger_calendrier()
+        except Exception as e:
+            traces.evenement(journal, logging.WARNING, "calendrier non recharge", erreur=str(e))
+
+# Démarrage hors import: MongoDB injoignable, le service répond quand même (dégradé) et
+# index, calendrier et nuits à venir sont repris jusqu'au succès
+calendrier_pret = threading.Event()
+DELAI_REPRISE_MAX = 30.0
+
+def initialiser(arret):
+    delai = 1.0
+    while not arret.is_set():
+        try:
+            creer_index()
+            analytique.creer_index(stats_collection)
+            charger_calendrier(completer_nuits=True)
+            calendrier_pret.set()
+            traces.evenement(journal, logging.INFO, "service reservations initialise", calendrier=calendrier.stats())
+            break
+        except PyMongoError as e:
+            traces.evenement(journal, logging.WARNING, "initialisation reportee", erreur=str(e), nouvel_essai_s=delai)
+            arret.wait(delai)
+            delai = min(DELAI_REPRISE_MAX, delai * 2)
+    rafraichir_calendrier(arret)
+
+arret_calendrier = threading.Event()
+threading.Thread(target=initialiser, args=(arret_calendrier,), name="calendrier", daemon=True).start()
+configuration.a_l_arret(arret_calendrier.set)
+
+def calendrier_indisponible():
+    """Réponse tant que le calendrier n'est pas chargé (il répondrait "tout est libre")"""
+    return jsonify({"error": "Calendrier en cours de chargement, réessayer plus tard"}), 503
+
+NUITS_MAX = 365
+
+def preparer_reservation(data):
+    """Valide une demande et construit le document réservation. Renvoie (document, erreur)"""
+    client_id = data.get('client_id')
+    chambre_id = data.get('chambre_id')
+    
+    # ✅ Vérifications basiques
+    if not client_id or not chambre_id:
+        return None, "client_id et chambre_id requis"
+    try:
+        client_id = normaliser_id(client_id)
+        chambre_id = normaliser_id(chambre_id)
+        nuits = int(data.get('nuits', 1))
+    except (TypeError, ValueError):
+        return None, "client_id, chambre_id et nuits doivent être des entiers"
+    
+    # ✅ Séjour [date_arrivee, date_depart[ (arrivée aujourd'hui par défaut)
+    try:
+        date_arrivee = date.fromisoformat(data.get('date_arrivee') or date.today().isoformat()).isoformat()
+    except ValueError:
+        return None, "date_arrivee invalide (AAAA-MM-JJ)"
+    if not 1 <= nuits <= NUITS_MAX:
+        return None, f"nuits doit être entre 1 et {NUITS_MAX}"
+    
+    # ✅ Calcul prix: accepter prix_total fourni par app_web, sinon défaut
+    prix_total = data.get('prix_total')
+    if prix_total is None:
+        prix_total = 100 * nuits
+    
+    return {
+        "client_id": client_id,
+        "chambre_id": chambre_id,
+        "client_info": data.get('client_info'),
+        "chambre_info": data.get('chambre_info'),
+        # Dénormalisés depuis le catalogue de la passerelle pour les agrégats par agence/type
+        "id_agence": data.get('id_agence'),
+        "type_chambre": data.get('type_chambre'),
+        "nuits": nuits,
+        "prix_total": prix_total,
+        "date_arrivee": date_arrivee,
+        "date_depart": depart_depuis(date_arrivee, nuits),
+        "date_reservation": datetime.now().isoformat(),
+        "statut": "en cours",
+        # Chambre à marquer occupée: livrée au service chambres par boite_envoi.py
+        boite_envoi.CHAMP: [boite_envoi.evenement(False)],
+    }, None
+
+# Créations et changements de statut diffusés sur /evenements (relayés par la passerelle)
+bus = BusEvenements('service_reservations')
+CHAMPS_EVENEMENT = ('numero_reservation', 'client_id', 'chambre_id', 'nuits', 'prix_total',
+                    'date_arrivee', 'date_depart', 'date_reservation', 'statut')
+
+def maj_stats(reservations, signe=1):
+    """Incrémente les agrégats d'occupation; un échec ne bloque pas la réservation"""
+    try:
+        analytique.mettre_a_jour(stats_collection, reservations, signe)
+    except Exception as e:
+        traces.evenement(journal, logging.ERROR, "agregats non mis a jour", erreur=str(e))
+
+def publier_creation(reservation):
+    delta = {champ: reservation.get(champ) for champ in CHAMPS_EVENEMENT}
+    delta['reservation_id'] = str(reservation['_id'])
+    bus.publier('reservation_creee', delta)
+
+def message_indisponible(reservation):
+    return (f"Chambre {reservation['chambre_id']} déjà réservée entre le "
+            f"{reservation['date_arrivee']} et le {reservation['date_depart']}")
+
+def reponse_reservation(reservation, rejouee=False):
+    return {
+        "success": True, 
+        "message": "Réservation déjà enregistrée" if rejouee else "Réservation créée avec succès",
+        "reservation_id": str(reservation['_id']),
+        "chambre_id": reservation['chambre_id'],
+        "date_arrivee": reservation.get('date_arrivee'),
+        "date_depart": reservation.get('date_depart'),
+        "numero_reservation": reservation['numero_reservation'],
+        "rejouee": rejouee
+    }
+
+def reservation_par_cle(cle, agence=None):
+    if not cle:
+        return None
+    trouvees = lire_partitions(lambda collection: collection.find_one({"cle_idempotence": cle}), agence)
+    return next((reservation for reservation in trouvees if reservation), None)
 
 @app.route('/reserver', methods=['POST'])
 def reserver():
+    """Crée une réservation. Une cle_idempotence déjà vue renvoie la réservation existante"""
     try:
-        data = request.json
-        client_id = data.get('client_id')
-        chambre_id = data.get('chambre_id')
-        nuits = data.get('nuits', 1)
-        
-        # ✅ Vérifications basiques
-        if not client_id or not chambre_id:
-            return jsonify({"success": False, "error": "client_id et chambre_id requis"}), 400
+        data = request.json or {}
+        cle = data.get('cle_idempotence')
+        existante = reservation_par_cle(cle, data.get('id_agence'))
+        if existante:
+            return jsonify(reponse_reservation(existante, rejouee=True))
         
-        # ✅ Calcul prix: accepter prix_total fourni par app_web, sinon défaut
-        prix_total = data.get('prix_total')
-        if prix_total is None:
-            prix_total = 100 * nuits
+        reservation, erreur = preparer_reservation(data)
+        if erreur:
+            return jsonify({"success": False, "error": erreur}), 400
+        if cle:
+            reservation['cle_idempotence'] = cle
+        collection = collection_agence(reservation['id_agence'])
         
-        # ✅ Création réservation
-        reservation = {
-            "client_id": client_id,
-            "chambre_id": chambre_id,
-            "client_info": data.get('client_info'),
-            "chambre_info": data.get('chambre_info'),
-            "nuits": nuits,
-            "prix_total": prix_total,
-            "date_reservation": datetime.now().isoformat(),
-            "statut": "en cours",
-            "numero_reservation": f"RES{random.randint(1000, 9999)}",
-        }
+        # Nuits posées en base d'abord: un séjour qui chevauche est refusé par l'index unique,
+        # quel que soit le processus qui l'a écrit
+        reservation['_id'] = ObjectId()
+        posees = nuitees.poser(collection, reservation['chambre_id'], reservation['date_arrivee'],
+                               reservation['date_depart'], reservation['_id'])
+        if posees:
+            try:
+                reservation['numero_reservation'] = nouveaux_numeros()[0]
+                collection.insert_one(reservation)
+            except Exception as e:
+                nuitees.retirer(collection, [reservation['_id']])
+                if not isinstance(e, DuplicateKeyError):
+                    raise
+                posees = False
+        if not posees:
+            # Requête rejouée en parallèle avec la même clé: c'est elle qui occupe le créneau
+            existante = reservation_par_cle(cle, reservation['id_agence'])
+            if existante:
+                return jsonify(reponse_reservation(existante, rejouee=True))
+            return jsonify({"success": False, "error": message_indisponible(reservation)}), 409
         
-        result = reservations_collection.insert_one(reservation)
-        
-        return jsonify({
-            "success": True, 
-            "message": "Réservation créée avec succès",
-            "reservation_id": str(result.inserted_id),
-            "numero_reservation": reservation['numero_reservation']
-        })
+        calendrier.ajouter(reservation['chambre_id'], reservation['date_arrivee'], reservation['date_depart'], reservation['_id'])
+        maj_stats([reservation])
+        publier_creation(reservation)
+        return jsonify(reponse_reservation(reservation))
         
+    except partitions.PartitionDistante:
+        raise
     except Exception as e:
         return jsonify({"success": False, "error": f"Erreur: {str(e)}"}), 500
 
+TAILLE_MAX_LOT = 200
+
+def inserer_lot(documents):
+    """insert_many non ordonné, un par partition. Renvoie {position: _id} pour les documents insérés"""
+    par_partition = {}
+    for position, document in enumerate(documents):
+        par_partition.setdefault(table.partition(document.get('id_agence')), []).append(position)
+    inseres = {}
+    for nom, positions in par_partition.items():
+        lot = [documents[position] for position in positions]
+        try:
+            resultat = collection_partition(nom).insert_many(lot, ordered=False)
+            inseres.update(zip(positions, resultat.inserted_ids))
+        except BulkWriteError as e:
+            echecs = {erreur['index'] for erreur in e.details.get('writeErrors', [])}
+            inseres.update((position, doc['_id']) for i, (position, doc) in enumerate(zip(positions, lot)) if i not in echecs)
+    return inseres
+
+@app.route('/reserver/lot', methods=['POST'])
+def reserver_lot():
+    """Réservation groupée: un seul insert_many et un rapport par élément"""
+    try:
+        demandes = (request.json or {}).get('reservations') or []
+        if not isinstance(demandes, list) or not demandes:
+            return jsonify({"success": False, "error": "liste 'reservations' requise"}), 400
+        if len(demandes) > TAILLE_MAX_LOT:
+            return jsonify({"success": False, "error": f"{TAILLE_MAX_LOT} réservations maximum par lot"}), 400
+        for demande in demandes:
+            # Tout le lot doit relever de partitions servies ici, avant la moindre insertion
+            collection_agence((demande or {}).get('id_agence'))
+
+        rapport = [None] * len(demandes)
+        valides = []
+        for index, demande in enumerate(demandes):
+            reservation, erreur = preparer_reservation(demande or {})
+            if erreur:
+                rapport[index] = {"index": index, "success": False, "error": erreur}
+            else:
+                valides.append((index, reservation))
+
+        # Nuits posées par partition (un insert_many chacune), puis un insert_many des réservations acceptées
+        documents = dict(valides)
+        par_partition = {}
+        for index, reservation in valides:
+            reservation['_id'] = ObjectId()
+            par_partition.setdefault(table.partition(reservation['id_agence']), []).append(
+                (index, reservation['chambre_id'], reservation['date_arrivee'], reservation['date_depart'], reservation['_id']))
+        acceptes = sorted(index for nom, sejours in par_partition.items()
+                          for index in nuitees.poser_lot(collection_partition(nom), sejours))
+
+        a_inserer = [documents[index] for index in acceptes]
+        ids = {}
+        if a_inserer:
+            try:
+                for document, numero in zip(a_inserer, nouveaux_numeros(len(a_inserer))):
+                    document['numero_reservation'] = numero
+                ids = {acceptes[pos]: _id for pos, _id in inserer_lot(a_inserer).items()}
+            finally:
+                # Nuits des réservations non écrites rendues
+                for index in acceptes:
+                    if index not in ids:
+                        nuitees.retirer(collection_agence(documents[index]['id_agence']), [documents[index]['_id']])
+            for index in ids:
+                reservation = documents[index]
+                calendrier.ajouter(reservation['chambre_id'], reservation['date_arrivee'], reservation['date_depart'], reservation['_id'])
+            ids.update((index, None) for index in acceptes if index not in ids)
+        maj_stats([reservation for index, reservation in valides if ids.get(index) is not None])
+        for index, reservation in valides:
+            if index not in ids:
+                rapport[index] = {"index": index, "success": False, "error": message_indisponible(reservation)}
+            elif ids[index] is None:
+                rapport[index] = {"index": index, "success": False, "error": "Échec de l'insertion"}
+            else:
+                publier_creation(reservation)
+                rapport[index] = {
+                    "index": index,
+                    "success": True,
+                    "reservation_id": str(ids[index]),
+                    "chambre_id": reservation['chambre_id'],
+                    "numero_reservation": reservation['numero_reservation'],
+                    "date_arrivee": reservation['date_arrivee'],
+                    "date_depart": reservation['date_depart']
+                }
+
+        reussies = sum(1 for ligne in rapport if ligne['success'])
+        return jsonify({"success": reussies > 0, "reussies": reussies, "echecs": len(rapport) - reussies, "resultats": rapport})
+    except partitions.PartitionDistante:
+        raise
+    except Exception as e:
+        return jsonify({"success": False, "error": f"Erreur: {str(e)}"}), 500
+
+CHAMPS_RESERVATION = (
+    'client_id', 'chambre_id', 'client_info', 'chambre_info', 'nuits', 'prix_total',
+    'date_reservation', 'statut', 'numero_reservation', 'date_annulation'
+)
+
+def lire_fusionne(filtre, projection, sens, limit, agence=None):
+    """Même requête sur chaque partition visée, fusion triée sur _id (sens 1 ou -1) tronquée à limit"""
+    if agence is not None:
+        filtre = dict(filtre, id_agence=agence)
+    projection = projection or boite_envoi.SANS_BOITE_ENVOI
+    lues = lire_partitions(lambda collection: list(collection.find(filtre, projection).sort("_id", sens).limit(limit)), agence)
+    return partitions.fusionner(lues, '_id', inverse=sens < 0, limite=limit)
+
+def lister_reservations(agence=None):
+    after, limit = pagination_demandee(conversion=ObjectId)
+    champs = champs_demandes(CHAMPS_RESERVATION)
+    projection = {champ: 1 for champ in champs} if champs else None
+
+    filtre = {"_id": {"$gt": after}} if after else {}
+    reservations = lire_fusionne(filtre, projection, 1, limit, agence)
+    # _id (ObjectId) converti par l'encodeur de format_echange
+    return reponse_paginee(jsonify(reservations), reservations, limit, '_id')
+
+def lister_actives(agence=None):
+    after, limit = pagination_demandee(limite_defaut=50, limite_max=200, conversion=ObjectId)
+
+    filtre = {"statut": {"$ne": "annulée"}}
+    if after:
+        filtre["_id"] = {"$lt": after}
+
+    reservations = lire_fusionne(filtre, None, -1, limit, agence)
+    suivant = reservations[-1]['_id'] if len(reservations) == limit else None
+    return jsonify({"reservations": reservations, "next": suivant})
+
 @app.route('/reservations', methods=['GET'])
 def get_reservations():
-    """Voir toutes les réservations"""
+    """Voir les réservations, paginées par curseur (?after=<_id>&limit=N&fields=...)"""
     try:
-        reservations = list(reservations_collection.find())
-        for resa in reservations:
-            resa['_id'] = str(resa['_id'])
-        return jsonify(reservations)
+        return lister_reservations()
+    except HTTPException:
+        raise
     except Exception as e:
         return jsonify({"error": f"Erreur: {str(e)}"}), 500
 
-@app.route('/reservations/client/<client_id>', methods=['GET'])
+@app.route('/reservations/actives', methods=['GET'])
+def get_reservations_actives():
+    """Réservations non annulées, les plus récentes d'abord, paginées par curseur"""
+    try:
+        return lister_actives()
+    except HTTPException:
+        raise
+    except Exception as e:
+        return jsonify({"error": f"Erreur: {str(e)}"}), 500
+
+@app.route('/agences/<int:id_agence>/reservations', methods=['GET'])
+def get_reservations_agence(id_agence):
+    """Réservations d'une agence: seule la partition de l'agence est lue"""
+    try:
+        return lister_reservations(id_agence)
+    except (partitions.PartitionDistante, HTTPException):
+        raise
+    except Exception as e:
+        return jsonify({"error": f"Erreur: {str(e)}"}), 500
+
+@app.route('/agences/<int:id_agence>/reservations/actives', methods=['GET'])
+def get_reservations_actives_agence(id_agence):
+    try:
+        return lister_actives(id_agence)
+    except (partitions.PartitionDistante, HTTPException):
+        raise
+    except Exception as e:
+        return jsonify({"error": f"Erreur: {str(e)}"}), 500
+
+TAILLE_LOT_EXPORT = 1000
+
+def filtre_export(args):
+    """Filtre MongoDB à partir de ?statut=&date_debut=&date_fin=&client_id=&chambre_id="""
+    filtre = {}
+    if args.get('statut'):
+        filtre['statut'] = args['statut']
+    # date_reservation est stockée en ISO 8601: la comparaison de chaînes suit l'ordre chronologique
+    dates = {}
+    if args.get('date_debut'):
+        dates['$gte'] = args['date_debut']
+    if args.get('date_fin'):
+        dates['$lt'] = args['date_fin']
+    if dates:
+        filtre['date_reservation'] = dates
+    for champ in ('client_id', 'chambre_id'):
+        if args.get(champ):
+            filtre[champ] = normaliser_id(args[champ])
+    return filtre
+
+@app.route('/reservations/export', methods=['GET'])
+def export_reservations():
+    """Export NDJSON en flux: une réservation par ligne, mémoire constante"""
+    try:
+        filtre = filtre_export(request.args)
+    except ValueError:
+        return jsonify({"error": "client_id et chambre_id doivent être des entiers"}), 400
+
+    def lignes():
+        # Un curseur par partition, fusionnés sur _id: l'ordre global est conservé
+        curseurs = [collection.find(filtre, boite_envoi.SANS_BOITE_ENVOI).sort("_id", 1).batch_size(TAILLE_LOT_EXPORT)
+                    for collection in collections.values()]
+        try:
+            tampon = []
+            fusion = curseurs[0] if len(curseurs) == 1 else heapq.merge(*curseurs, key=lambda resa: resa['_id'])
+            for resa in fusion:
+                tampon.append(dumps_json(resa))
+                if len(tampon) == TAILLE_LOT_EXPORT:
+                    yield b"\n".join(tampon) + b"\n"
+                    tampon = []
+            if tampon:
+                yield b"\n".join(tampon) + b"\n"
+        finally:
+            for curseur in curseurs:
+                curseur.close()
+
+    return Response(stream_with_context(lignes()), mimetype='application/x-ndjson')
+
+@app.route('/reservations/client/<int:client_id>', methods=['GET'])
 def get_reservations_client(client_id):
-    """Voir les réservations d'un client"""
+    """Voir les réservations d'un client (client_id entier, comme en base)"""
     try:
-        reservations = list(reservations_collection.find({"client_id": client_id}))
-        for resa in reservations:
-            resa['_id'] = str(resa['_id'])
-        return jsonify(reservations)
+        lues = lire_partitions(lambda collection: list(collection.find({"client_id": client_id}, boite_envoi.SANS_BOITE_ENVOI).sort("_id", 1)))
+        return jsonify(partitions.fusionner(lues, '_id'))
     except Exception as e:
         return jsonify({"error": f"Erreur: {str(e)}"}), 500
 
-def changer_statut_reservation(reservation_id, nouveau_statut="annulée"):
+# Machine à états des réservations: statut cible -> statuts sources autorisés
+TRANSITIONS_STATUT = {
+    "annulée": ("en cours",),
+    "terminée": ("en cours",),
+}
+
+def transition_statut(reservation_id, nouveau_statut, agence=None):
+    """Transition atomique en un seul aller-retour (find_one_and_update) par partition visée.
+
+    Le filtre porte sur les statuts sources autorisés: deux annulations concurrentes
+    ne peuvent pas réussir toutes les deux. Renvoie (document mis à jour, erreur, code HTTP).
+    """
+    sources = TRANSITIONS_STATUT.get(nouveau_statut)
+    if sources is None:
+        return None, f"Statut inconnu: {nouveau_statut}", 400
+
+    maintenant = datetime.now().isoformat()
+    modifications = {"statut": nouveau_statut}
+    if nouveau_statut == "annulée":
+        modifications["date_annulation"] = maintenant
+
+    reservation = None
+    for nom in partitions_visees(agence):
+        # Annulée ou terminée: la boîte d'envoi, dans la même écriture, fera recalculer l'état de la
+        # chambre (libre seulement si aucune autre réservation en cours ne la vise)
+        reservation = collections[nom].find_one_and_update(
+            {"_id": ObjectId(reservation_id), "statut": {"$in": list(sources)}},
+            {"$set": modifications, "$push": {boite_envoi.CHAMP: boite_envoi.evenement(True)}},
+            return_document=ReturnDocument.AFTER
+        )
+        if reservation:
+            # Séjour annulé ou terminé: ses nuits sont rendues (reprises au prochain conflit si cet appel échoue)
+            try:
+                nuitees.retirer(collections[nom], [reservation['_id']])
+            except Exception as e:
+                traces.evenement(journal, logging.WARNING, "nuits non rendues",
+                                 reservation_id=str(reservation['_id']), erreur=str(e))
+            break
+    if reservation:
+        calendrier.retirer(reservation['_id'])
+        if nouveau_statut == "annulée":
+            maj_stats([reservation], signe=-1)
+        bus.publier('reservation_statut', {
+            "reservation_id": str(reservation['_id']),
+            "numero_reservation": reservation.get('numero_reservation'),
+            "chambre_id": reservation.get('chambre_id'),
+            "statut": nouveau_statut
+        })
+        return reservation, None, 200
+
+    # Chemin d'échec uniquement: distinguer "introuvable" de "transition interdite"
+    actuelles = lire_partitions(lambda collection: collection.find_one({"_id": ObjectId(reservation_id)}, {"statut": 1}), agence)
+    actuelle = next((reservation for reservation in actuelles if reservation), None)
+    if not actuelle:
+        return None, "Réservation non trouvée", 404
+    if actuelle.get('statut') == nouveau_statut == "annulée":
+        return None, "Réservation déjà annulée", 409
+    return None, f"Transition interdite: {actuelle.get('statut')} → {nouveau_statut}", 409
+
+def changer_statut_reservation(reservation_id, nouveau_statut="annulée", agence=None):
     """Service interne qui change seulement le statut d'une réservation"""
     try:
-        print(f"🔄 Changement statut {reservation_id} → {nouveau_statut}")
-        
-        reservation = reservations_collection.find_one({"_id": ObjectId(reservation_id)})
-        
+        reservation, erreur, _ = transition_statut(reservation_id, nouveau_statut, agence)
         if not reservation:
-            return {"success": False, "error": "Réservation non trouvée"}
-        
-        # Vérifier si déjà annulée
-        if reservation.get('statut') == 'annulée':
-            return {"success": False, "error": "Réservation déjà annulée"}
-        
-        # Modification du statut
-        result = reservations_collection.update_one(
-            {"_id": ObjectId(reservation_id)},
-            {"$set": {
-                "statut": nouveau_statut,
-                "date_annulation": datetime.now().isoformat() if nouveau_statut == "annulée" else None
-            }}
-        )
+            return {"success": False, "error": erreur}
         
-        if result.modified_count == 1:
-            success_message = f"✅ Statut changé: {reservation_id} → {nouveau_statut}"
-            print(success_message)
-            return {
-                "success": True, 
-                "message": success_message,
-                "chambre_id": reservation.get('chambre_id'),
-                "numero_reservation": reservation.get('numero_reservation')
-            }
-        else:
-            return {"success": False, "error": "Échec du changement de statut"}
+        success_message = f"✅ Statut changé: {reservation_id} → {nouveau_statut}"
+        traces.evenement(journal, logging.INFO, "statut change",
+                         reservation_id=reservation_id, statut=nouveau_statut)
+        return {
+            "success": True, 
+            "message": success_message,
+            "chambre_id": reservation.get('chambre_id'),
+            "numero_reservation": reservation.get('numero_reservation')
+        }
             
     except Exception as e:
         error_message = f"Erreur: {str(e)}"
-        print(error_message)
+        traces.evenement(journal, logging.ERROR, "changement de statut en echec",
+                         reservation_id=reservation_id, erreur=str(e))
         return {"success": False, "error": error_message}
 
+@app.route('/reservations/cle/<cle>', methods=['GET'])
+def get_reservation_par_cle(cle):
+    """Réservation créée avec une clé d'idempotence (404 si aucune)"""
+    reservation = reservation_par_cle(cle, request.args.get('agence', type=int))
+    if not reservation:
+        return jsonify({"success": False, "error": "Aucune réservation pour cette clé"}), 404
+    return jsonify(reponse_reservation(reservation, rejouee=True))
+
+DISPONIBILITES_MAX = 200000
+
+@app.route('/disponibilites', methods=['GET', 'POST'])
+def get_disponibilites():
+    """Chambres libres sur [date_debut, date_fin[ parmi ?chambres=1,2,3, ou en POST
+    {"chambres": [...], "date_debut": ..., "date_fin": ...} pour les longues listes (devis d'une agence)"""
+    if request.method == 'POST':
+        parametres = request.get_json(silent=True) or {}
+        chambres_ids = parametres.get('chambres') or []
+        if not isinstance(chambres_ids, list) or not all(isinstance(c, int) for c in chambres_ids):
+            return jsonify({"error": "chambres: liste d'entiers requise"}), 400
+        if len(chambres_ids) > DISPONIBILITES_MAX:
+            return jsonify({"error": f"{DISPONIBILITES_MAX} chambres maximum"}), 400
+    else:
+        parametres = request.args
+        chambres_ids = ids_demandes('chambres', maximum=10000) or []
+    try:
+        debut = jour(parametres['date_debut'])
+        fin = jour(parametres['date_fin'])
+    except (KeyError, TypeError, ValueError):
+        return jsonify({"error": "date_debut et date_fin (AAAA-MM-JJ) requis"}), 400
+    if fin <= debut:
+        return jsonify({"error": "date_fin doit suivre date_debut"}), 400
+    if not calendrier_pret.is_set():
+        return calendrier_indisponible()
+    return jsonify({"libres": calendrier.chambres_libres(chambres_ids, debut, fin)})
+
+@app.route('/calendrier/<int:chambre_id>', methods=['GET'])
+def get_calendrier(chambre_id):
+    """Occupation jour par jour ('1' = nuit occupée) à partir de ?debut= sur ?jours="""
+    try:
+        debut = jour(request.args.get('debut') or date.today().isoformat())
+        jours = min(max(int(request.args.get('jours', 30)), 1), 366)
+    except ValueError:
+        return jsonify({"error": "Paramètres debut/jours invalides"}), 400
+    if not calendrier_pret.is_set():
+        return calendrier_indisponible()
+    bits = calendrier.calendrier(chambre_id, debut, jours)
+    return jsonify({
+        "chambre_id": chambre_id,
+        "debut": date.fromordinal(debut).isoformat(),
+        "jours": jours,
+        "occupation": bitset_en_texte(bits, jours)
+    })
+
+@app.route('/stats', methods=['GET'])
+def stats_occupation():
+    """Nuits occupées, revenu et arrivées sur [debut, fin[ (?par=jour,agence,type_chambre&agence=&type_chambre=)"""
+    debut = request.args.get('debut')
+    fin = request.args.get('fin')
+    if not debut or not fin:
+        return jsonify({"error": "debut et fin requis (AAAA-MM-JJ)"}), 400
+    try:
+        debut, fin = date.fromisoformat(debut).isoformat(), date.fromisoformat(fin).isoformat()
+    except ValueError:
+        return jsonify({"error": "debut et fin au format AAAA-MM-JJ"}), 400
+    par = tuple(axe for axe in request.args.get('par', 'agence').split(',') if axe in analytique.AXES)
+    lignes = analytique.lire_stats(
+        stats_collection, debut, fin, par=par or ('agence',),
+        agence=request.args.get('agence', type=int), type_chambre=request.args.get('type_chambre')
+    )
+    return jsonify({"debut": debut, "fin": fin, "par": list(par or ('agence',)), "lignes": lignes, "source": SOURCE_STATS})
+
+@app.route('/evenements', methods=['GET'])
+def evenements():
+    """Flux SSE des créations et changements de statut (reprise via Last-Event-ID)"""
+    return reponse_sse(bus.flux_sse(request.headers.get('Last-Event-ID')))
+
 @app.route('/health', methods=['GET'])
 def health():
-    return jsonify({"status": "OK", "service": "Réservations", "database": "MongoDB"})
+    """Sonde: connectivité et latence de chaque serveur MongoDB.
+    503 seulement si aucun ne répond: une partition en panne n'arrête pas les autres agences"""
+    latences, erreurs = {}, {}
+    for uri, client_partition in clients_mongo.items():
+        debut = time.perf_counter()
+        try:
+            client_partition.admin.command('ping')
+            latences[uri] = round(1000 * (time.perf_counter() - debut), 2)
+        except Exception as e:
+            erreurs[uri] = str(e)
+    if not latences:
+        return jsonify({"status": "ERREUR", "service": "Réservations", "database": "MongoDB",
+                        "error": "; ".join(erreurs.values())}), 503
+    return jsonify({
+        "status": "DEGRADE" if erreurs or not calendrier_pret.is_set() else "OK",
+        "service": "Réservations",
+        "database": "MongoDB",
+        "latence_ms": max(latences.values()),
+        "serveurs_en_erreur": len(erreurs),
+        "calendrier": dict(calendrier.stats(), pret=calendrier_pret.is_set())
+    })
+
+@app.route('/partitions', methods=['GET'])
+def get_partitions():
+    """Table de routage agence -> partition et partitions servies par ce nœud"""
+    return jsonify(dict(table.stats(), collections={nom: collection.full_name for nom, collection in collections.items()}))
+
+@app.route('/boite-envoi', methods=['GET'])
+def get_boite_envoi():
+    """Réservations dont les effets sur le service chambres attendent le livreur, par partition"""
+    return jsonify(boite_envoi.en_attente(collections))
+
+STATUTS_RESERVATION = ("en cours", "terminée", "annulée")
+
+@app.route('/reservations/resume', methods=['GET'])
+def resume_reservations():
+    """Compteurs et dernière réservation, sans parcourir la collection.
+
+    Le total vient des métadonnées (estimated_document_count), les comptes par statut
+    de l'index statut_date et la dernière réservation d'un tri sur _id limité à 1, par partition.
+    """
+    try:
+        def resumer(collection):
+            return {
+                "total": collection.estimated_document_count(),
+                "par_statut": {statut: collection.count_documents({"statut": statut}) for statut in STATUTS_RESERVATION},
+                "derniere": next(collection.find({}, boite_envoi.SANS_BOITE_ENVOI).sort("_id", DESCENDING).limit(1), None),
+            }
+        resumes = lire_partitions(resumer)
+        dernieres = [resume["derniere"] for resume in resumes if resume["derniere"]]
+        return jsonify({
+            "total": sum(resume["total"] for resume in resumes),
+            "par_statut": {statut: sum(resume["par_statut"][statut] for resume in resumes) for statut in STATUTS_RESERVATION},
+            "derniere_reservation": max(dernieres, key=lambda resa: resa['_id']) if dernieres else None
+        })
+    except Exception as e:
+        return jsonify({"error": f"Erreur: {str(e)}"}), 500
 
 @app.route('/reservations/<reservation_id>/statut', methods=['PUT'])
 def update_statut_reservation(reservation_id):
     try:
         data = request.json or {}
         nouveau_statut = data.get('statut', 'annulée')
-        reservation = reservations_collection.find_one({"_id": ObjectId(reservation_id)})
+        reservation, erreur, code = transition_statut(reservation_id, nouveau_statut, request.args.get('agence', type=int))
         if not reservation:
-            return jsonify({"success": False, "error": "Réservation non trouvée"}), 404
-        result = reservations_collection.update_one(
-            {"_id": ObjectId(reservation_id)},
-            {"$set": {
-                "statut": nouveau_statut,
-                "date_annulation": datetime.now().isoformat() if nouveau_statut == "annulée" else None
-            }}
-        )
-        if result.modified_count == 1:
-            return jsonify({
-                "success": True,
-                "chambre_id": reservation.get('chambre_id'),
-                "numero_reservation": reservation.get('numero_reservation')
-            })
-        else:
-            return jsonify({"success": False, "error": "Échec du changement de statut"}), 500
+            return jsonify({"success": False, "error": erreur}), code
+        return jsonify({
+            "success": True,
+            "statut": reservation.get('statut'),
+            "chambre_id": reservation.get('chambre_id'),
+            "id_agence": reservation.get('id_agence'),
+            "numero_reservation": reservation.get('numero_reservation')
+        })
+    except partitions.PartitionDistante:
+        raise
     except Exception as e:
         return jsonify({"success": False, "error": f"Erreur: {str(e)}"}), 500
 
 if __name__ == '__main__':
-    print("Service Réservations -> http://localhost:5003")
-    app.run(port=5003, debug=True)
+    # Développement seulement; en production: python serveur.py reservations
+    print(f"Service Réservations -> http://localhost:{configuration.port('reservations')}")
+    app.run(port=configuration.port('reservations'), debug=configuration.DEBUG)
@@ -0,0 +1,267 @@
+"""Moteur de tarification en colonnes (NumPy) pour les devis de la passerelle.
+
+Le catalogue des chambres est chargé en tableaux parallèles triés par id_chambre
+(prix de base, agence, type). Les règles sont appliquées en vectoriel:
+
+- saison: coefficient par jour de l'année, sommé sur les nuits du séjour
+  (sommes cumulées: une soustraction par chambre, quelle que soit la durée);
+- agence: coefficient multiplicatif par id_agence;
+- durée: remise selon le nombre de nuits (paliers).
+
+Un devis d'agence (toutes ses chambres libres pour un séjour) est donc un produit
+de quelques tableaux, sans boucle Python par chambre ni par nuit.
+
+Règles par défaut ci-dessous, remplaçables par un fichier JSON (TARIFS_REGLES).
+"""
+import json
+import logging
+import os
+import threading
+import time
+from datetime import date
+
+import numpy as np
+
+import passerelle_http
+import traces
+
+REGLES_DEFAUT = {
+    # Périodes "MM-JJ" incluses, éventuellement à cheval sur le nouvel an
+    "saisons": [
+        {"debut": "12-15", "fin": "01-05", "coefficient": 1.30},
+        {"debut": "07-01", "fin": "08-31", "coefficient": 1.15},
+    ],
+    # id_agence -> coefficient (1.0 par défaut)
+    "agences": {},
+    # Remise à partir de N nuits (le palier le plus élevé atteint s'applique)
+    "duree": [
+        {"nuits": 3, "remise": 0.05},
+        {"nuits": 7, "remise": 0.10},
+        {"nuits": 28, "remise": 0.20},
+    ],
+}
+TTL_CATALOGUE = int(os.environ.get('CACHE_TTL_CATALOGUE', 600))
+TAILLE_PAGE = 1000
+
+journal = traces.journal(__name__)
+
+
+def charger_regles(chemin=None):
+    chemin = chemin or os.environ.get('TARIFS_REGLES')
+    if not chemin:
+        return REGLES_DEFAUT
+    with open(chemin, encoding='utf-8') as fichier:
+        return dict(REGLES_DEFAUT, **json.load(fichier))
+
+
+def table_saisons(saisons):
+    """Coefficient indexé par mois * 32 + jour (année bissextile de référence: 29/02 inclus)"""
+    table = np.ones(13 * 32)
+    jours = np.arange('2024-01-01', '2025-01-01', dtype='datetime64[D]')
+    mois, jour = mois_jour(jours)
+    cles = mois * 100 + jour
+    for saison in saisons:
+        debut = int(saison["debut"].replace('-', ''))
+        fin = int(saison["fin"].replace('-', ''))
+        dans = (cles >= debut) & (cles <= fin) if debut <= fin else (cles >= debut) | (cles <= fin)
+        table[(mois * 32 + jour)[dans]] = float(saison["coefficient"])
+    return table
+
+
+def mois_jour(jours):
+    """Tableaux (mois 1-12, jour 1-31) d'un tableau datetime64[D]"""
+    debut_mois = jours.astype('datetime64[M]')
+    mois = debut_mois.astype(np.int64) % 12 + 1
+    jour = (jours - debut_mois.astype('datetime64[D]')).astype(np.int64) + 1
+    return mois, jour
+
+
+def en_jours(valeurs):
+    """Dates ISO, objets date ou tableau -> datetime64[D]"""
+    if isinstance(valeurs, (np.ndarray, np.datetime64)) and valeurs.dtype.kind == 'M':
+        return np.asarray(valeurs).astype('datetime64[D]')
+    if isinstance(valeurs, (str, date)):
+        return np.datetime64(str(valeurs)[:10], 'D')
+    return np.asarray([str(v)[:10] for v in valeurs], dtype='datetime64[D]')
+
+
+class CatalogueColonnes:
+    """Instantané immuable du catalogue: tableaux triés par id_chambre"""
+
+    def __init__(self, chambres):
+        chambres = sorted((c for c in chambres if c.get('prix') is not None), key=lambda c: c['id_chambre'])
+        self.ids = np.fromiter((c['id_chambre'] for c in chambres), dtype=np.int64, count=len(chambres))
+        self.prix = np.fromiter((float(c['prix']) for c in chambres), dtype=np.float64, count=len(chambres))
+        self.agences = np.fromiter((c.get('id_agence') if c.get('id_agence') is not None else -1 for c in chambres),
+                                   dtype=np.int64, count=len(chambres))
+        self.types, self.codes_type = np.unique(
+            np.asarray([c.get('type_chambre') or '' for c in chambres], dtype=object).astype(str),
+            return_inverse=True,
+        )
+        self.charge_le = time.monotonic()
+
+    def code_type(self, type_chambre):
+        """Code du type dans self.types, -1 s'il est absent du catalogue"""
+        code = int(np.searchsorted(self.types, type_chambre))
+        return code if code < len(self.types) and self.types[code] == type_chambre else -1
+
+    def __len__(self):
+        return len(self.ids)
+
+    def positions(self, ids):
+        """Index de chaque id dans les colonnes, -1 si la chambre est inconnue"""
+        ids = np.asarray(ids, dtype=np.int64)
+        positions = np.searchsorted(self.ids, ids)
+        positions = np.minimum(positions, max(len(self.ids) - 1, 0))
+        connues = (self.ids[positions] == ids) if len(self.ids) else np.zeros(ids.shape, dtype=bool)
+        return np.where(connues, positions, -1)
+
+
+class MoteurTarifs:
+    def __init__(self, regles=None):
+        self._verrou = threading.Lock()
+        self._catalogue = None
+        self.configurer(regles or charger_regles())
+
+    def configurer(self, regles):
+        self.regles = regles
+        self._saisons = table_saisons(regles.get("saisons", []))
+        self._coef_agences = {int(a): float(c) for a, c in regles.get("agences", {}).items()}
+        paliers = sorted(regles.get("duree", []), key=lambda p: p["nuits"])
+        self._paliers_nuits = np.asarray([p["nuits"] for p in paliers], dtype=np.int64)
+        self._paliers_coef = np.concatenate(([1.0], [1.0 - float(p["remise"]) for p in paliers]))
+
+    # --- Catalogue ---------------------------------------------------------
+
+    def charger(self, chambres):
+        catalogue = CatalogueColonnes(chambres)
+        with self._verrou:
+            self._catalogue = catalogue
+        return catalogue
+
+    def catalogue(self):
+        """Catalogue courant, rechargé depuis le service chambres après TTL_CATALOGUE"""
+        catalogue = self._catalogue
+        if catalogue is not None and time.monotonic() - catalogue.charge_le < TTL_CATALOGUE:
+            return catalogue
+        try:
+            return self.charger(lire_catalogue())
+        except Exception as e:
+            traces.evenement(journal, logging.WARNING, "catalogue tarifaire non recharge", erreur=str(e))
+            if catalogue is None:
+                raise
+            return catalogue
+
+    def invalider(self):
+        with self._verrou:
+            self._catalogue = None
+
+    # --- Règles vectorisées --------------------------------------------------
+
+    def coefficients_agences(self, agences):
+        agences = np.asarray(agences, dtype=np.int64)
+        if not self._coef_agences:
+            return np.ones(agences.shape)
+        coefficients = np.ones(agences.shape)
+        for agence, coefficient in self._coef_agences.items():
+            coefficients[agences == agence] = coefficient
+        return coefficients
+
+    def coefficients_duree(self, nuits):
+        return self._paliers_coef[np.searchsorted(self._paliers_nuits, np.asarray(nuits), side='right')]
+
+    def sommes_saison(self, arrivees, nuits):
+        """Somme des coefficients de saison sur les nuits [arrivée, arrivée + nuits[ de chaque séjour"""
+        arrivees = en_jours(arrivees)
+        nuits = np.asarray(nuits, dtype=np.int64)
+        premier = arrivees.min()
+        jours = np.arange(premier, (arrivees + nuits).max() + 1)
+        mois, jour = mois_jour(jours)
+        cumul = np.concatenate(([0.0], np.cumsum(self._saisons[mois * 32 + jour])))
+        decalage = (arrivees - premier).astype(np.int64)
+        return cumul[decalage + nuits] - cumul[decalage]
+
+    def coter_prix(self, prix, agences, arrivees, nuits):
+        """Totaux de séjours à partir des prix de base et des agences (tableaux diffusables)"""
+        prix = np.asarray(prix, dtype=np.float64)
+        arrivees = en_jours(arrivees)
+        forme = np.broadcast_shapes(prix.shape, np.shape(arrivees), np.shape(nuits))
+        if not np.prod(forme):
+            return np.zeros(forme)
+        nuits = np.broadcast_to(np.asarray(nuits, dtype=np.int64), forme)
+        totaux = (prix * self.coefficients_agences(agences)
+                  * self.sommes_saison(np.broadcast_to(arrivees, forme), nuits)
+                  * self.coefficients_duree(nuits))
+        return np.round(totaux, 2)
+
+    def coter(self, ids, arrivees, nuits, catalogue=None):
+        """Totaux par chambre du catalogue (NaN pour une chambre inconnue)"""
+        catalogue = catalogue or self.catalogue()
+        positions = catalogue.positions(ids)
+        connues = positions >= 0
+        totaux = np.full(positions.shape, np.nan)
+        if connues.any():
+            arrivees = np.broadcast_to(en_jours(arrivees), positions.shape)
+            nuits = np.broadcast_to(np.asarray(nuits, dtype=np.int64), positions.shape)
+            totaux[connues] = self.coter_prix(catalogue.prix[positions[connues]], catalogue.agences[positions[connues]],
+                                              arrivees[connues], nuits[connues])
+        return totaux
+
+    def devis_agence(self, agence, debut, fin, libres=None, type_chambre=None):
+        """Devis de toutes les chambres d'une agence pour [debut, fin[ (limitées à `libres` si fourni)"""
+        nuits = int((en_jours(fin) - en_jours(debut)).astype(np.int64))
+        if nuits < 1:
+            raise ValueError("date_fin doit être postérieure à date_debut")
+        catalogue = self.catalogue()
+        masque = catalogue.agences == int(agence)
+        if type_chambre:
+            masque &= catalogue.codes_type == catalogue.code_type(type_chambre)
+        if libres is not None:
+            masque &= np.isin(catalogue.ids, np.fromiter(libres, dtype=np.int64))
+        positions = np.flatnonzero(masque)
+        with traces.span('tarifs', chambres=len(positions)):
+            totaux = self.coter_prix(catalogue.prix[positions], catalogue.agences[positions], debut, nuits)
+        ordre = np.argsort(totaux, kind='stable')
+        positions, totaux = positions[ordre], totaux[ordre]
+        types = catalogue.types[catalogue.codes_type[positions]].tolist()
+        moyens = np.round(totaux / nuits, 2).tolist()
+        return [
+            {"id_chambre": id_chambre, "type_chambre": type_chambre or None, "prix_nuit": prix,
+             "total": total, "prix_moyen_nuit": moyen}
+            for id_chambre, type_chambre, prix, total, moyen in zip(
+                catalogue.ids[positions].tolist(), types, catalogue.prix[positions].tolist(), totaux.tolist(), moyens)
+        ]
+
+    def ids_agence(self, agence):
+        catalogue = self.catalogue()
+        return catalogue.ids[catalogue.agences == int(agence)].tolist()
+
+    def stats(self):
+        catalogue = self._catalogue
+        return {
+            "chambres": len(catalogue) if catalogue is not None else 0,
+            "age_catalogue_s": round(time.monotonic() - catalogue.charge_le, 1) if catalogue is not None else None,
+            "regles": self.regles,
+        }
+
+
+def lire_catalogue(taille_page=TAILLE_PAGE):
+    """Catalogue complet (prix, agence, type) lu page par page sur chaque nœud du service chambres"""
+    chambres = []
+    for noeud in passerelle_http.noeuds('chambres'):
+        after = None
+        while True:
+            params = {"limit": taille_page, "fields": "id_chambre,type_chambre,etage,prix,id_agence"}
+            if after is not None:
+                params["after"] = after
+            response = passerelle_http.get_compact('chambres', 'chambres', params=params, noeud=noeud)
+            response.raise_for_status()
+            chambres.extend(passerelle_http.decoder(response))
+            after = response.headers.get('X-Next-After')
+            if not after:
+                break
+    passerelle_http.memoriser_catalogue(chambres)
+    return chambres
+
+
+moteur = MoteurTarifs()
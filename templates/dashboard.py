@@ -1,7 +1,21 @@
 from flask import Flask, render_template_string
+import concurrent.futures
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import requests
 
+import configuration
+import partitions
+import passerelle_http
+import traces
+
 app = Flask(__name__)
+traces.instrumenter(app, 'dashboard')
+
+# L'état des services vient de la passerelle, qui les sonde en arrière-plan
+URL_APP_WEB = os.environ.get('APP_WEB_URL', f"http://localhost:{configuration.port('app_web')}")
 
 PAGE_WEB = '''
 <!DOCTYPE html>
@@ -58,11 +72,23 @@ PAGE_WEB = '''
         
         <div class="service-status">
             <h2>ETAT DES SERVICES</h2>
-            <p><strong>Service Clients:</strong> <span class="{{ classe_clients }}">{{ statut_clients }}</span></p>
-            <p><strong>Service Chambres:</strong> <span class="{{ classe_chambres }}">{{ statut_chambres }}</span></p>
-            <p><strong>Service Reservations:</strong> <span class="{{ classe_reservations }}">{{ statut_reservations }}</span></p>
+            <p><strong>Service Clients:</strong> <span class="{{ classe_clients }}">{{ statut_clients }}</span>{% if latences.clients is not none %} (MySQL {{ latences.clients }} ms){% endif %}</p>
+            <p><strong>Service Chambres:</strong> <span class="{{ classe_chambres }}">{{ statut_chambres }}</span>{% if latences.chambres is not none %} (MySQL {{ latences.chambres }} ms){% endif %}</p>
+            <p><strong>Service Reservations:</strong> <span class="{{ classe_reservations }}">{{ statut_reservations }}</span>{% if latences.reservations is not none %} (MongoDB {{ latences.reservations }} ms){% endif %}</p>
         </div>
         
+        {% if resume %}
+        <div class="reservation-box">
+            <h2>RESERVATIONS</h2>
+            <p><strong>Total:</strong> <span id="total">{{ resume.total }}</span>
+               ({% for statut, nombre in resume.par_statut.items() %}{{ statut }}: <span data-statut="{{ statut }}">{{ nombre }}</span>{% if not loop.last %}, {% endif %}{% endfor %})</p>
+            <p id="derniere"{% if not reservation %} style="display: none;"{% endif %}><strong>Dernière réservation:</strong>
+               <span id="derniere-texte">{% if reservation %}{{ reservation.numero_reservation }}
+               - client {{ reservation.client_id }}, chambre {{ reservation.chambre_id }},
+               {{ reservation.nuits }} nuit(s), {{ reservation.statut }}{% endif %}</span></p>
+        </div>
+        {% endif %}
+        
         <div class="communication">
             <h2>COMMUNICATION VIA APP_WEB (PONT)</h2>
             <p>1. <strong>app_web</strong> -> <strong>Service Chambres</strong> : récupère les informations sur la chambre </p>
@@ -77,46 +103,114 @@ PAGE_WEB = '''
             </button>
         </div>
     </div>
+    <script>
+        // Compteurs tenus à jour par le flux d'événements de la passerelle (SSE), sans recharger
+        function ajouter(selecteur, delta) {
+            const el = document.querySelector(selecteur);
+            if (el) el.textContent = parseInt(el.textContent, 10) + delta;
+        }
+        if (window.EventSource) {
+            const flux = new EventSource('{{ url_app_web }}/evenements');
+            flux.addEventListener('reservation_creee', (e) => {
+                const r = JSON.parse(e.data);
+                ajouter('#total', 1);
+                ajouter(`[data-statut="${r.statut}"]`, 1);
+                const derniere = document.getElementById('derniere');
+                if (!derniere) return;
+                document.getElementById('derniere-texte').textContent =
+                    `${r.numero_reservation} - client ${r.client_id}, chambre ${r.chambre_id}, ${r.nuits} nuit(s), ${r.statut}`;
+                derniere.style.display = '';
+            });
+            flux.addEventListener('reservation_statut', (e) => {
+                const r = JSON.parse(e.data);
+                ajouter('[data-statut="en cours"]', -1);
+                ajouter(`[data-statut="${r.statut}"]`, 1);
+            });
+            flux.addEventListener('resynchroniser', () => window.location.reload());
+        }
+    </script>
 </body>
 </html>
 '''
 
-@app.route('/')
-def afficher_dashboard():
+def sonder(service_name):
+    """Sonde /health d'un service (base comprise): ligne au format de la table d'état"""
     try:
-        requests.get("http://localhost:5001/chambres", timeout=2)
-        statut_chambres = "EN LIGNE"
-        classe_chambres = "online"
-    except:
-        statut_chambres = "HORS LIGNE"
-        classe_chambres = "offline"
-    
+        response = passerelle_http.get(service_name, 'health', timeout=passerelle_http.TIMEOUTS['health'])
+        corps = response.json()
+        return {"service": service_name, "en_ligne": response.status_code == 200,
+                "base": {"database": corps.get("database"), "latence_ms": corps.get("latence_ms")}}
+    except (requests.exceptions.RequestException, ValueError):
+        return {"service": service_name, "en_ligne": False, "base": None}
+
+def par_service(lignes):
+    """{service: ligne} d'une table d'état par nœud: le premier nœud en panne représente le service"""
+    etat = {}
+    for ligne in lignes:
+        actuelle = etat.get(ligne['service'])
+        if actuelle is None or (affichage(actuelle)[0] == "EN LIGNE" and affichage(ligne)[0] != "EN LIGNE"):
+            etat[ligne['service']] = ligne
+    return etat
+
+def etat_services():
+    """Table d'état tenue par le surveillant de la passerelle: {service: ligne}.
+    Si la passerelle ne répond pas, les trois /health sont sondés en parallèle."""
     try:
-        requests.get("http://localhost:5002/clients", timeout=2)
-        statut_clients = "EN LIGNE"
-        classe_clients = "online"
-    except:
-        statut_clients = "HORS LIGNE"
-        classe_clients = "offline"
-    
+        response = requests.get(f"{URL_APP_WEB}/sante", timeout=passerelle_http.TIMEOUTS['health'])
+        return par_service(response.json()['services'])
+    except (requests.exceptions.RequestException, ValueError, KeyError):
+        pass
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(passerelle_http.SERVICES)) as executor:
+        return {ligne['service']: ligne for ligne in executor.map(sonder, passerelle_http.SERVICES)}
+
+def resume_noeud(noeud):
     try:
-        reservations_data = requests.get("http://localhost:5003/reservations", timeout=2)
-        statut_reservations = "EN LIGNE"
-        classe_reservations = "online"
-        
-        reservations = reservations_data.json()
-        
-        if reservations and isinstance(reservations, list) and len(reservations) > 0:
-            derniere_reservation = reservations[-1]
-        elif reservations and isinstance(reservations, dict) and len(reservations) > 0:
-            derniere_reservation = list(reservations.values())[-1]
-        else:
-            derniere_reservation = None
-            
-    except Exception as e:
-        statut_reservations = "HORS LIGNE"
-        classe_reservations = "offline"
-        derniere_reservation = None
+        response = passerelle_http.get('reservations', 'reservations/resume', noeud=noeud,
+                                       timeout=passerelle_http.TIMEOUTS['health'])
+        return response.json() if response.status_code == 200 else None
+    except (requests.exceptions.RequestException, ValueError):
+        return None
+
+def resume_reservations():
+    """Compteurs et dernière réservation (une requête triée limit(1) côté service), additionnés
+    sur tous les nœuds réservations; un nœud en échec est ignoré (compté dans noeuds_en_erreur)"""
+    resumes = list(partitions.en_parallele(resume_noeud, passerelle_http.noeuds('reservations')).values())
+    valides = [resume for resume in resumes if resume]
+    if not valides:
+        return None
+    dernieres = [resume['derniere_reservation'] for resume in valides if resume.get('derniere_reservation')]
+    statuts = dict.fromkeys(statut for resume in valides for statut in resume.get('par_statut', {}))
+    return {
+        "total": sum(resume.get('total', 0) for resume in valides),
+        "par_statut": {statut: sum(resume.get('par_statut', {}).get(statut, 0) for resume in valides) for statut in statuts},
+        # _id: ObjectId en hexadécimal, ordre chronologique
+        "derniere_reservation": max(dernieres, key=lambda resa: resa['_id']) if dernieres else None,
+        "noeuds_en_erreur": len(resumes) - len(valides),
+    }
+
+def affichage(ligne):
+    """(statut, classe CSS) d'un service d'après sa ligne de la table d'état"""
+    if ligne and ligne.get('en_ligne') and ligne.get('disjoncteur') != 'ouvert':
+        return "EN LIGNE", "online"
+    if ligne and ligne.get('en_ligne') is None:
+        return "EN ATTENTE", "offline"
+    return "HORS LIGNE", "offline"
+
+def latence_base(ligne):
+    base = (ligne or {}).get('base') or {}
+    return base.get('latence_ms')
+
+@app.route('/')
+def afficher_dashboard():
+    with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+        future_etat = traces.soumettre(executor, etat_services)
+        future_resume = traces.soumettre(executor, resume_reservations)
+        etat = future_etat.result()
+        resume = future_resume.result()
+
+    statut_chambres, classe_chambres = affichage(etat.get('chambres'))
+    statut_clients, classe_clients = affichage(etat.get('clients'))
+    statut_reservations, classe_reservations = affichage(etat.get('reservations'))
     
     return render_template_string(PAGE_WEB,
         statut_chambres=statut_chambres,
@@ -125,9 +219,13 @@ def afficher_dashboard():
         classe_clients=classe_clients,
         statut_reservations=statut_reservations,
         classe_reservations=classe_reservations,
-        reservation=derniere_reservation
+        latences={nom: latence_base(etat.get(nom)) for nom in passerelle_http.SERVICES},
+        resume=resume,
+        url_app_web=URL_APP_WEB,
+        reservation=resume.get('derniere_reservation') if resume else None
     )
 
 if __name__ == '__main__':
-    print("Tableau de bord Hotel -> http://localhost:5005")
-    app.run(port=5005, debug=True)
+    # Développement seulement; en production: python serveur.py dashboard
+    print(f"Tableau de bord Hotel -> http://localhost:{configuration.port('dashboard')}")
+    app.run(port=configuration.port('dashboard'), debug=configuration.DEBUG)
@@ -0,0 +1,6 @@
+import os
+import sys
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Modules de la racine (passerelle) et des services, importés comme par leurs points d'entrée
+sys.path[:0] = [RACINE, os.path.join(RACINE, 'services')]
@@ -0,0 +1,54 @@
+from cache_ttl import CacheTTL
+
+
+def test_get_set():
+    cache = CacheTTL('test', taille_max=10, ttl=60)
+    assert cache.get('a') is None
+    assert cache.get('a', 'defaut') == 'defaut'
+    cache.set('a', 1)
+    assert cache.get('a') == 1
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["taux_hit"]) == (1, 2, 0.333)
+
+
+def test_expiration():
+    cache = CacheTTL('test', taille_max=10, ttl=60)
+    cache.set('a', 1, ttl=-1)
+    cache.set('b', 2)
+    assert cache.get('a') is None
+    assert cache.get('b') == 2
+    assert cache.stats()["entrees"] == 1
+
+
+def test_eviction_lru():
+    cache = CacheTTL('test', taille_max=2, ttl=60)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')  # 'a' devient la plus récente
+    cache.set('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1 and cache.get('c') == 3
+    assert cache.stats()["evictions"] == 1
+
+
+def test_reecriture_sans_eviction():
+    cache = CacheTTL('test', taille_max=2, ttl=60)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.set('a', 3)
+    assert cache.get('a') == 3 and cache.get('b') == 2
+    assert cache.stats()["evictions"] == 0
+
+
+def test_invalidations():
+    cache = CacheTTL('test', taille_max=10, ttl=60)
+    for cle in ('chambres:chambres?limit=200', 'chambres:chambres?limit=200@http://n2', 'chambres:chambre/1', 7):
+        cache.set(cle, True)
+    cache.invalider_prefixe('chambres:chambres')
+    assert cache.get('chambres:chambre/1') and cache.get(7)
+    cache.invalider('chambres:chambre/1')
+    cache.invalider('absente')
+    assert cache.get('chambres:chambre/1') is None
+    cache.invalider()
+    assert cache.get(7) is None
+    assert cache.stats()["invalidations"] == 4
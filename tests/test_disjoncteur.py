@@ -0,0 +1,48 @@
+import pytest
+
+from disjoncteur import FERME, OUVERT, SEMI_OUVERT, CircuitOuvert, Disjoncteur
+
+
+def test_ouvert_apres_le_seuil():
+    disjoncteur = Disjoncteur('test', seuil_echecs=3, delai_ouverture=60)
+    disjoncteur.echec()
+    disjoncteur.echec()
+    assert disjoncteur.etat == FERME and disjoncteur.autoriser()
+    disjoncteur.echec()
+    assert disjoncteur.etat == OUVERT
+    assert not disjoncteur.autoriser()
+    with pytest.raises(CircuitOuvert):
+        disjoncteur.verifier()
+    assert disjoncteur.stats()["ouvertures"] == 1
+    assert disjoncteur.stats()["refus"] == 2
+
+
+def test_succes_remet_les_echecs_a_zero():
+    disjoncteur = Disjoncteur('test', seuil_echecs=2, delai_ouverture=60)
+    disjoncteur.echec()
+    disjoncteur.succes()
+    disjoncteur.echec()
+    assert disjoncteur.etat == FERME
+
+
+def test_semi_ouvert_un_seul_essai():
+    disjoncteur = Disjoncteur('test', seuil_echecs=1, delai_ouverture=0)
+    disjoncteur.echec()
+    assert disjoncteur.etat == SEMI_OUVERT
+    assert disjoncteur.autoriser()
+    assert not disjoncteur.autoriser()
+    disjoncteur.succes()
+    assert disjoncteur.etat == FERME
+    assert disjoncteur.autoriser() and disjoncteur.autoriser()
+
+
+def test_essai_en_echec_rouvre():
+    disjoncteur = Disjoncteur('test', seuil_echecs=5, delai_ouverture=0)
+    for _ in range(5):
+        disjoncteur.echec()
+    assert disjoncteur.autoriser()
+    disjoncteur.delai_ouverture = 60
+    disjoncteur.echec()
+    assert disjoncteur.etat == OUVERT
+    assert not disjoncteur.autoriser()
+    assert disjoncteur.stats()["ouvertures"] == 2
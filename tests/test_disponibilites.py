@@ -0,0 +1,82 @@
+from disponibilites import CalendrierChambres, bitset_en_texte, depart_depuis, jour, sejour_reservation
+
+
+def calendrier_exemple():
+    calendrier = CalendrierChambres()
+    calendrier.ajouter(1, '2030-01-10', '2030-01-13', 'a')
+    calendrier.ajouter(1, '2030-01-20', '2030-01-21', 'b')
+    calendrier.ajouter(2, '2030-01-01', '2030-02-01', 'c')
+    return calendrier
+
+
+def test_depart_libere_la_chambre():
+    calendrier = calendrier_exemple()
+    assert calendrier.est_libre(1, '2030-01-13', '2030-01-15')
+    assert calendrier.est_libre(1, '2030-01-08', '2030-01-10')
+    assert not calendrier.est_libre(1, '2030-01-12', '2030-01-14')
+    assert not calendrier.est_libre(1, '2030-01-09', '2030-01-11')
+
+
+def test_sejour_englobant():
+    calendrier = calendrier_exemple()
+    assert not calendrier.est_libre(1, '2030-01-01', '2030-01-31')
+    assert not calendrier.est_libre(1, '2030-01-11', '2030-01-12')
+
+
+def test_long_sejour_arrive_avant_la_periode():
+    # Le séjour de la chambre 2 commence bien avant la période demandée
+    calendrier = calendrier_exemple()
+    calendrier.ajouter(2, '2030-03-01', '2030-03-02', 'd')
+    assert not calendrier.est_libre(2, '2030-01-30', '2030-02-03')
+    assert calendrier.est_libre(2, '2030-02-01', '2030-03-01')
+
+
+def test_chambres_libres_garde_l_ordre_demande():
+    calendrier = calendrier_exemple()
+    assert calendrier.chambres_libres([3, 2, 1], '2030-01-11', '2030-01-12') == [3]
+    assert calendrier.chambres_libres([3, 2, 1], '2030-02-01', '2030-02-05') == [3, 2, 1]
+
+
+def test_retirer():
+    calendrier = calendrier_exemple()
+    assert calendrier.retirer('a')
+    assert not calendrier.retirer('a')
+    assert calendrier.est_libre(1, '2030-01-10', '2030-01-13')
+    assert not calendrier.est_libre(1, '2030-01-20', '2030-01-21')
+    assert calendrier.stats() == {"chambres": 2, "sejours": 2}
+
+
+def test_sejours_identiques_retires_un_a_un():
+    calendrier = CalendrierChambres()
+    calendrier.ajouter(1, '2030-01-10', '2030-01-12', 'a')
+    calendrier.ajouter(1, '2030-01-10', '2030-01-12', 'b')
+    calendrier.retirer('a')
+    assert not calendrier.est_libre(1, '2030-01-10', '2030-01-11')
+    calendrier.retirer('b')
+    assert calendrier.est_libre(1, '2030-01-10', '2030-01-11')
+
+
+def test_calendrier_bitset():
+    calendrier = calendrier_exemple()
+    bits = calendrier.calendrier(1, '2030-01-09', 14)
+    assert bitset_en_texte(bits, 14) == "01110000000100"
+    assert calendrier.calendrier(3, '2030-01-09', 14) == 0
+
+
+def test_remplacer():
+    calendrier = calendrier_exemple()
+    nouveau = CalendrierChambres()
+    nouveau.ajouter(5, '2030-01-01', '2030-01-02', 'e')
+    calendrier.remplacer(nouveau)
+    assert calendrier.est_libre(1, '2030-01-10', '2030-01-13')
+    assert not calendrier.est_libre(5, '2030-01-01', '2030-01-02')
+
+
+def test_sejour_reservation():
+    assert sejour_reservation({"date_arrivee": "2030-01-10", "date_depart": "2030-01-12"}) == \
+        (jour('2030-01-10'), jour('2030-01-12'))
+    # Anciennes réservations: arrivée le jour de la réservation
+    assert sejour_reservation({"date_reservation": "2030-01-10T09:30:00", "nuits": 3}) == \
+        (jour('2030-01-10'), jour('2030-01-13'))
+    assert sejour_reservation({"nuits": 3}) is None
+    assert depart_depuis('2030-02-27', 3) == '2030-03-02'
@@ -0,0 +1,71 @@
+import datetime
+import decimal
+
+import pytest
+from bson import ObjectId
+
+import format_echange
+from format_echange import CLE_COLONNES, CLE_LIGNES, compacter, decoder, deployer, encoder
+
+LIGNES = [
+    {"id_chambre": 1, "type_chambre": "seul", "prix": 25000.0, "disponible": True},
+    {"id_chambre": 2, "type_chambre": "double", "prix": 40000.0, "disponible": False},
+    {"id_chambre": 3, "type_chambre": None, "prix": 75000.0, "disponible": True},
+]
+
+
+def test_compacter_liste_homogene():
+    compacte = compacter(LIGNES)
+    assert compacte[CLE_COLONNES] == ["id_chambre", "type_chambre", "prix", "disponible"]
+    assert compacte[CLE_LIGNES][1] == [2, "double", 40000.0, False]
+    assert deployer(compacte) == LIGNES
+
+
+@pytest.mark.parametrize("donnees", [
+    [],
+    [{"a": 1}],
+    [{"a": 1}, {"b": 2}],
+    [{"a": 1}, 2, "trois"],
+    {"reservations": LIGNES, "next": None, "total": 3},
+    [{"id": 1, "sejours": [{"debut": "2030-01-01", "nuits": 2}, {"debut": "2030-02-01", "nuits": 1}]},
+     {"id": 2, "sejours": []}],
+    [{"id": 1, "sejours": None}, {"id": 2, "sejours": [{"nuits": 2}, {"nuits": 1}]}],
+    [[{"a": 1}, {"a": 2}], [{"a": 3}, {"a": 4}]],
+])
+def test_aller_retour(donnees):
+    assert deployer(compacter(donnees)) == donnees
+
+
+def test_lignes_imbriquees_compactees():
+    donnees = [{"id": 1, "sejours": [{"nuits": 2}, {"nuits": 1}]}, {"id": 2, "sejours": [{"nuits": 3}, {"nuits": 4}]}]
+    compacte = compacter(donnees)
+    assert compacte[CLE_LIGNES][0][1] == {CLE_COLONNES: ["nuits"], CLE_LIGNES: [[2], [1]]}
+
+
+@pytest.mark.parametrize("format_demande", format_echange.FORMATS)
+def test_encoder_decoder(format_demande):
+    corps, type_mime = encoder({"chambres": LIGNES}, format_demande)
+    assert type_mime == format_demande
+    assert decoder(corps, f"{type_mime}; charset=utf-8") == {"chambres": LIGNES}
+
+
+def test_types_des_services_convertis():
+    identifiant = ObjectId()
+    donnees = {
+        "_id": identifiant,
+        "date_arrivee": datetime.date(2030, 1, 10),
+        "date_reservation": datetime.datetime(2030, 1, 1, 9, 30),
+        "prix": decimal.Decimal("25000.50"),
+    }
+    corps, type_mime = encoder(donnees)
+    assert decoder(corps, type_mime) == {
+        "_id": str(identifiant),
+        "date_arrivee": "2030-01-10",
+        "date_reservation": "2030-01-01T09:30:00",
+        "prix": 25000.5,
+    }
+
+
+def test_type_inconnu_refuse():
+    with pytest.raises(TypeError):
+        encoder({"objet": object()})
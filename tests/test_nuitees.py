@@ -0,0 +1,65 @@
+import pytest
+from bson import ObjectId
+
+import nuitees
+
+
+def test_documents_nuits():
+    reservation_id = ObjectId()
+    documents = nuitees.documents_nuits(12, '2024-02-28', '2024-03-02', reservation_id)
+    assert [document["_id"] for document in documents] == ["12:2024-02-28", "12:2024-02-29", "12:2024-03-01"]
+    assert all(document["chambre_id"] == 12 and document["reservation_id"] == reservation_id for document in documents)
+
+
+def test_documents_nuits_sejour_vide():
+    assert nuitees.documents_nuits(12, '2024-03-01', '2024-03-01', ObjectId()) == []
+
+
+@pytest.fixture
+def reservations():
+    mongomock = pytest.importorskip("mongomock")
+    return mongomock.MongoClient()['hotel_test']['reservations']
+
+
+def nuits_posees(reservations):
+    return sorted(document["_id"] for document in nuitees.collection_nuitees(reservations).find())
+
+
+def test_poser_refuse_un_chevauchement(reservations):
+    premier, second = ObjectId(), ObjectId()
+    reservations.insert_one({"_id": premier, "statut": "en cours"})
+    assert nuitees.poser(reservations, 1, '2030-01-10', '2030-01-13', premier)
+    assert not nuitees.poser(reservations, 1, '2030-01-12', '2030-01-14', second)
+    # Rien de posé pour le séjour refusé, même la nuit libre du 13
+    assert nuits_posees(reservations) == ["1:2030-01-10", "1:2030-01-11", "1:2030-01-12"]
+    assert nuitees.poser(reservations, 1, '2030-01-13', '2030-01-14', second)
+
+
+def test_retirer_rend_les_nuits(reservations):
+    reservation_id = ObjectId()
+    nuitees.poser(reservations, 1, '2030-01-10', '2030-01-12', reservation_id)
+    nuitees.retirer(reservations, [reservation_id])
+    assert nuits_posees(reservations) == []
+    assert nuitees.poser(reservations, 1, '2030-01-10', '2030-01-12', ObjectId())
+
+
+def test_poser_lot(reservations):
+    existante = ObjectId()
+    reservations.insert_one({"_id": existante, "statut": "en cours"})
+    nuitees.poser(reservations, 1, '2030-01-10', '2030-01-12', existante)
+    sejours = [
+        ("a", 1, '2030-01-11', '2030-01-13', ObjectId()),  # conflit avec la base
+        ("b", 2, '2030-01-10', '2030-01-12', ObjectId()),
+        ("c", 2, '2030-01-11', '2030-01-12', ObjectId()),  # conflit avec "b", dans le lot
+        ("d", 1, '2030-01-12', '2030-01-13', ObjectId()),
+    ]
+    assert nuitees.poser_lot(reservations, sejours) == ["b", "d"]
+    assert nuits_posees(reservations) == ["1:2030-01-10", "1:2030-01-11", "1:2030-01-12",
+                                          "2:2030-01-10", "2:2030-01-11"]
+
+
+def test_completer_ignore_les_nuits_deja_posees(reservations):
+    reservation_id = ObjectId()
+    nuitees.poser(reservations, 1, '2030-01-10', '2030-01-12', reservation_id)
+    nuitees.completer(reservations, [(1, '2030-01-10', '2030-01-13', reservation_id)])
+    assert nuits_posees(reservations) == ["1:2030-01-10", "1:2030-01-11", "1:2030-01-12"]
@@ -0,0 +1,72 @@
+import pytest
+
+from tarification import MoteurTarifs
+
+REGLES = {
+    "saisons": [{"debut": "07-01", "fin": "07-31", "coefficient": 2.0},
+                {"debut": "12-31", "fin": "01-01", "coefficient": 3.0}],
+    "agences": {"2": 1.5},
+    "duree": [{"nuits": 3, "remise": 0.1}, {"nuits": 7, "remise": 0.2}],
+}
+CHAMBRES = [
+    {"id_chambre": 1, "id_agence": 1, "type_chambre": "seul", "prix": 100},
+    {"id_chambre": 2, "id_agence": 1, "type_chambre": "double", "prix": 50},
+    {"id_chambre": 3, "id_agence": 2, "type_chambre": "seul", "prix": 100},
+    {"id_chambre": 4, "id_agence": 1, "type_chambre": "suite", "prix": None},
+]
+
+
+@pytest.fixture
+def moteur():
+    moteur = MoteurTarifs(REGLES)
+    moteur.charger(CHAMBRES)
+    return moteur
+
+
+def test_devis_trie_du_moins_cher(moteur):
+    # Nuits du 30/06 (1.0) et du 01/07 (2.0): coefficient 3.0, pas de remise sous 3 nuits
+    devis = moteur.devis_agence(1, '2031-06-30', '2031-07-02')
+    assert devis == [
+        {"id_chambre": 2, "type_chambre": "double", "prix_nuit": 50.0, "total": 150.0, "prix_moyen_nuit": 75.0},
+        {"id_chambre": 1, "type_chambre": "seul", "prix_nuit": 100.0, "total": 300.0, "prix_moyen_nuit": 150.0},
+    ]
+
+
+def test_chambre_sans_prix_absente(moteur):
+    assert 4 not in [ligne["id_chambre"] for ligne in moteur.devis_agence(1, '2031-06-01', '2031-06-02')]
+
+
+def test_remise_de_duree(moteur):
+    assert moteur.devis_agence(1, '2031-06-01', '2031-06-04', libres=[1])[0]["total"] == 270.0
+    assert moteur.devis_agence(1, '2031-06-01', '2031-06-08', libres=[1])[0]["total"] == 560.0
+
+
+def test_saison_a_cheval_sur_le_nouvel_an(moteur):
+    # 30/12 (1.0), 31/12 (3.0), 01/01 (3.0), 02/01 (1.0) avec la remise de 3 nuits et plus
+    assert moteur.devis_agence(1, '2031-12-30', '2032-01-03', libres=[1])[0]["total"] == 720.0
+
+
+def test_coefficient_agence(moteur):
+    assert moteur.devis_agence(2, '2031-06-01', '2031-06-02') == [
+        {"id_chambre": 3, "type_chambre": "seul", "prix_nuit": 100.0, "total": 150.0, "prix_moyen_nuit": 150.0},
+    ]
+
+
+def test_filtres_libres_et_type(moteur):
+    assert [ligne["id_chambre"] for ligne in moteur.devis_agence(1, '2031-06-01', '2031-06-02', libres=[1, 3])] == [1]
+    assert [ligne["id_chambre"] for ligne in moteur.devis_agence(1, '2031-06-01', '2031-06-02', type_chambre="double")] == [2]
+    assert moteur.devis_agence(1, '2031-06-01', '2031-06-02', type_chambre="penthouse") == []
+    assert moteur.devis_agence(1, '2031-06-01', '2031-06-02', libres=[]) == []
+    assert moteur.devis_agence(9, '2031-06-01', '2031-06-02') == []
+
+
+def test_sejour_vide_refuse(moteur):
+    with pytest.raises(ValueError):
+        moteur.devis_agence(1, '2031-06-02', '2031-06-02')
+
+
+def test_coter_chambre_inconnue(moteur):
+    totaux = moteur.coter([1, 99], ['2031-06-01', '2031-06-01'], [1, 1])
+    assert totaux[0] == 100.0
+    assert totaux[1] != totaux[1]  # NaN
+    assert moteur.ids_agence(1) == [1, 2]
@@ -0,0 +1,277 @@
+"""Traçage commun à la passerelle et aux services.
+
+- identifiant de corrélation (X-Correlation-ID) propagé de app_web aux services
+- spans chronométrés (appel HTTP, requête MySQL, requête Mongo, JSON, template)
+- métriques au format Prometheus servies sur /metrics
+- journal structuré (une ligne JSON par événement), niveau réglé par LOG_LEVEL
+"""
+import contextvars
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+ENTETE_CORRELATION = 'X-Correlation-ID'
+
+CORRELATION = contextvars.ContextVar('correlation_id', default=None)
+SPANS = contextvars.ContextVar('spans', default=None)
+# Nom de l'application qui sert la requête (plusieurs applications peuvent partager un processus)
+SERVICE = contextvars.ContextVar('service', default=None)
+SERVICE_PROCESSUS = {'nom': 'inconnu'}
+
+
+def service_courant():
+    return SERVICE.get() or SERVICE_PROCESSUS['nom']
+
+
+# ---------------------------------------------------------------- journal
+
+class FormatJSON(logging.Formatter):
+    def format(self, record):
+        ligne = {
+            "ts": round(record.created, 3),
+            "niveau": record.levelname,
+            "service": service_courant(),
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        correlation = CORRELATION.get()
+        if correlation:
+            ligne["correlation_id"] = correlation
+        ligne.update(getattr(record, 'champs', {}))
+        if record.exc_info:
+            ligne["exception"] = self.formatException(record.exc_info)
+        return json.dumps(ligne, ensure_ascii=False, default=str)
+
+
+def configurer_journal(nom_service):
+    SERVICE_PROCESSUS['nom'] = nom_service
+    racine = logging.getLogger()
+    if not any(isinstance(h.formatter, FormatJSON) for h in racine.handlers):
+        sortie = logging.StreamHandler(sys.stdout)
+        sortie.setFormatter(FormatJSON())
+        racine.addHandler(sortie)
+    racine.setLevel(os.environ.get('LOG_LEVEL', 'INFO').upper())
+    # Le journal d'accès de Werkzeug fait doublon avec la ligne "requete"
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+
+
+def journal(nom):
+    return logging.getLogger(nom)
+
+
+def evenement(logger, niveau, message, **champs):
+    """Log structuré: les champs deviennent des clés de la ligne JSON"""
+    if logger.isEnabledFor(niveau):
+        logger.log(niveau, message, extra={'champs': champs})
+
+
+# ---------------------------------------------------------------- métriques
+
+BORNES = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Registre:
+    """Compteurs et histogrammes en mémoire, exportés au format texte Prometheus"""
+
+    def __init__(self):
+        self._verrou = threading.Lock()
+        self._compteurs = {}
+        self._histogrammes = {}
+        self._jauges = {}
+        self._aides = {}
+
+    @staticmethod
+    def _cle(nom, etiquettes):
+        return nom, tuple(sorted(etiquettes.items()))
+
+    def incrementer(self, nom, valeur=1, aide="", **etiquettes):
+        cle = self._cle(nom, etiquettes)
+        with self._verrou:
+            self._aides.setdefault(nom, aide)
+            self._compteurs[cle] = self._compteurs.get(cle, 0) + valeur
+
+    def observer(self, nom, valeur, aide="", **etiquettes):
+        cle = self._cle(nom, etiquettes)
+        with self._verrou:
+            self._aides.setdefault(nom, aide)
+            histo = self._histogrammes.get(cle)
+            if histo is None:
+                histo = self._histogrammes[cle] = [[0] * len(BORNES), 0, 0.0]
+            for i, borne in enumerate(BORNES):
+                if valeur <= borne:
+                    histo[0][i] += 1
+            histo[1] += 1
+            histo[2] += valeur
+
+    def jauge(self, nom, fonction, aide=""):
+        """Jauge calculée à la lecture (ex: utilisation du pool MySQL)"""
+        with self._verrou:
+            self._aides.setdefault(nom, aide)
+            self._jauges[nom] = fonction
+
+    @staticmethod
+    def _etiquettes(paires, supplement=()):
+        paires = list(paires) + list(supplement)
+        if not paires:
+            return ""
+        return "{" + ",".join(f'{k}="{str(v)}"' for k, v in paires) + "}"
+
+    def exposer(self):
+        lignes = []
+        with self._verrou:
+            compteurs = dict(self._compteurs)
+            histogrammes = {cle: (list(h[0]), h[1], h[2]) for cle, h in self._histogrammes.items()}
+            jauges = dict(self._jauges)
+            aides = dict(self._aides)
+
+        deja = set()
+
+        def entete(nom, type_metrique):
+            if nom not in deja:
+                deja.add(nom)
+                if aides.get(nom):
+                    lignes.append(f"# HELP {nom} {aides[nom]}")
+                lignes.append(f"# TYPE {nom} {type_metrique}")
+
+        for (nom, paires), valeur in sorted(compteurs.items()):
+            entete(nom, "counter")
+            lignes.append(f"{nom}{self._etiquettes(paires)} {valeur}")
+        for (nom, paires), (seaux, total, somme) in sorted(histogrammes.items()):
+            entete(nom, "histogram")
+            for borne, nombre in zip(BORNES, seaux):
+                lignes.append(f"{nom}_bucket{self._etiquettes(paires, [('le', borne)])} {nombre}")
+            lignes.append(f"{nom}_bucket{self._etiquettes(paires, [('le', '+Inf')])} {total}")
+            lignes.append(f"{nom}_count{self._etiquettes(paires)} {total}")
+            lignes.append(f"{nom}_sum{self._etiquettes(paires)} {somme:.6f}")
+        for nom, fonction in sorted(jauges.items()):
+            try:
+                valeur = float(fonction())
+            except Exception:
+                continue
+            entete(nom, "gauge")
+            lignes.append(f"{nom} {valeur}")
+        return "\n".join(lignes) + "\n"
+
+
+registre = Registre()
+
+
+# ---------------------------------------------------------------- spans
+
+def correlation_courante():
+    return CORRELATION.get()
+
+
+@contextmanager
+def span(type_span, **attributs):
+    """Chronomètre un bloc et l'ajoute aux spans de la requête en cours"""
+    debut = time.perf_counter()
+    try:
+        yield
+    finally:
+        enregistrer_span(type_span, time.perf_counter() - debut, **attributs)
+
+
+def enregistrer_span(type_span, duree, **attributs):
+    registre.observer('span_duree_secondes', duree, "Durée des spans par type",
+                      service=service_courant(), type=type_span)
+    spans = SPANS.get()
+    if spans is not None:
+        spans.append(dict(attributs, type=type_span, ms=round(1000 * duree, 3)))
+
+
+def soumettre(executor, fonction, *args, **kwargs):
+    """executor.submit en conservant la corrélation et les spans du thread appelant"""
+    return executor.submit(contextvars.copy_context().run, fonction, *args, **kwargs)
+
+
+def entetes_propagation():
+    correlation = CORRELATION.get()
+    return {ENTETE_CORRELATION: correlation} if correlation else {}
+
+
+# ---------------------------------------------------------------- intégrations
+
+def instrumenter(app, nom_service):
+    """Corrélation, durée par endpoint, ligne de journal par requête et /metrics"""
+    from flask import Response, g, request
+    from format_echange import FournisseurEchange
+
+    configurer_journal(nom_service)
+    logger = journal('requete')
+
+    class JSONChronometre(FournisseurEchange):
+        def dumps(self, obj, **kwargs):
+            with span('json'):
+                return super().dumps(obj, **kwargs)
+
+        def response(self, *args, **kwargs):
+            with span('json'):
+                return super().response(*args, **kwargs)
+
+    app.json = JSONChronometre(app)
+
+    @app.before_request
+    def _debut_requete():
+        g.debut_requete = time.perf_counter()
+        g.jetons_trace = (
+            CORRELATION.set(request.headers.get(ENTETE_CORRELATION) or uuid.uuid4().hex),
+            SPANS.set([]),
+            SERVICE.set(nom_service),
+        )
+
+    @app.after_request
+    def _fin_requete(response):
+        duree = time.perf_counter() - g.get('debut_requete', time.perf_counter())
+        endpoint = request.url_rule.rule if request.url_rule else 'inconnu'
+        registre.incrementer('http_requetes_total', aide="Requêtes HTTP servies", service=nom_service,
+                             endpoint=endpoint, methode=request.method, statut=response.status_code)
+        registre.observer('http_requete_duree_secondes', duree, "Durée des requêtes HTTP",
+                          service=nom_service, endpoint=endpoint)
+        spans = SPANS.get() or []
+        correlation = CORRELATION.get()
+        if correlation:
+            response.headers[ENTETE_CORRELATION] = correlation
+        response.headers['Server-Timing'] = ", ".join(
+            [f"total;dur={1000 * duree:.1f}"] + [f"{s['type']};dur={s['ms']}" for s in spans[:20]]
+        )
+        evenement(logger, logging.INFO, "requete", methode=request.method, endpoint=endpoint,
+                  statut=response.status_code, ms=round(1000 * duree, 3), spans=spans)
+        return response
+
+    @app.teardown_request
+    def _nettoyage(exc):
+        jetons = g.pop('jetons_trace', None)
+        if jetons:
+            CORRELATION.reset(jetons[0])
+            SPANS.reset(jetons[1])
+            SERVICE.reset(jetons[2])
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        return Response(registre.exposer(), mimetype='text/plain; version=0.0.4')
+
+    return app
+
+
+try:
+    from pymongo import monitoring
+
+    class EcouteurMongo(monitoring.CommandListener):
+        """Span "mongo" pour chaque commande, via le monitoring de PyMongo"""
+
+        def started(self, event):
+            pass
+
+        def succeeded(self, event):
+            enregistrer_span('mongo', event.duration_micros / 1e6, commande=event.command_name)
+
+        def failed(self, event):
+            enregistrer_span('mongo', event.duration_micros / 1e6, commande=event.command_name, echec=True)
+except ImportError:
+    EcouteurMongo = None
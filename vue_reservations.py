@@ -0,0 +1,27 @@
+"""Vue "réservations actives": jointure côté passerelle limitée à la page affichée"""
+
+from passerelle_http import CHAMPS_JOINTURE
+
+TAILLE_PAGE = 50
+
+
+def ids_references(reservations):
+    """IDs clients et chambres référencés par une page de réservations"""
+    clients_ids = sorted({r['client_id'] for r in reservations if r.get('client_id') is not None})
+    chambres_ids = sorted({r['chambre_id'] for r in reservations if r.get('chambre_id') is not None})
+    return clients_ids, chambres_ids
+
+
+def endpoint_jointure(service_name, ids):
+    """Recherche groupée des seuls IDs référencés, avec les colonnes utiles"""
+    return f"{service_name}?ids={','.join(str(i) for i in ids)}&fields={CHAMPS_JOINTURE[service_name]}"
+
+
+def enrichir(reservations, clients, chambres):
+    """Ajoute client_info et chambre_info à chaque réservation de la page"""
+    clients_map = {c.get('id_client'): c for c in clients or []}
+    chambres_map = {ch.get('id_chambre'): ch for ch in chambres or []}
+    for reservation in reservations:
+        reservation['client_info'] = clients_map.get(reservation.get('client_id'))
+        reservation['chambre_info'] = chambres_map.get(reservation.get('chambre_id'))
+    return reservations